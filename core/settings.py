@@ -42,10 +42,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'inventario.middleware.MetricasMiddleware',
+    'inventario.middleware.LentasMiddleware',
+    'inventario.middleware.ReplicaMiddleware',
+    'inventario.middleware.PerfilMiddleware',
+    'inventario.middleware.CompresionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventario.middleware.FotoUsuarioMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,10 +91,30 @@ DATABASES = {
         'PORT': '3306',
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'"
-        }
+        },
+        # Cada hilo de WSGI conserva su conexion hasta 60 segundos y la verifica
+        # antes de reutilizarla. Con ASGI usar el pool de inventario/backends/pool.py:
+        # 'ENGINE': 'inventario.backends.mysql', 'CONN_MAX_AGE': 0,
+        # y en OPTIONS 'pool': {'maximo': 20, 'espera': 5, 'vida': 600}
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Replica de lectura para reportes (opcional). Las vistas con
+# @lectura_replica leen del alias REPLICA_BD si existe en DATABASES, por ejemplo:
+# DATABASES['replica'] = {**DATABASES['default'], 'HOST': '10.0.0.2', 'TEST': {'MIRROR': 'default'}}
+# El usuario de la replica necesita el privilegio REPLICATION CLIENT para leer su atraso.
+DATABASE_ROUTERS = ['inventario.replicas.ReplicaRouter']
+REPLICA_BD = 'replica'
+# Segundos de atraso tolerados antes de volver al principal, y cada cuanto se mide
+REPLICA_RETRASO_MAXIMO = 5
+REPLICA_INTERVALO = 5
+# Segundos para conectar y leer al medir el atraso; si vence, se lee del principal
+REPLICA_TIEMPO_LIMITE = 2
+# Segundos que un usuario lee del principal despues de escribir
+REPLICA_LECTURA_PROPIA = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -131,3 +157,87 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Cache compartido entre procesos: versiones de las respuestas condicionales
+# (ETag / Last-Modified). En produccion puede reemplazarse por memcached o redis.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    'sesiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_sesiones',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Sesiones en el cache 'sesiones' con respaldo en la base de datos: se leen del
+# cache y, si no estan (cache vaciado o lleno), de la tabla de sesiones. El cache
+# debe ser compartido entre procesos: con uno por proceso (locmem) un logout en
+# un worker no cerraria la sesion en los demas.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sesiones'
+
+# El usuario de cada peticion se arma desde una foto firmada en la sesion en
+# lugar de leerse de la base de datos (ver inventario/foto_usuario.py)
+FOTO_USUARIO = True
+
+# Importaciones entre la vista previa y la confirmacion: un archivo por importacion
+# en IMPORTACIONES_DIR (por defecto en el directorio temporal), que se borra al
+# confirmar, al cancelar o despues de IMPORTACIONES_VIGENCIA segundos. Con varios
+# servidores debe ser un directorio compartido.
+IMPORTACIONES_DIR = None
+IMPORTACIONES_VIGENCIA = 3600
+
+# Eventos en vivo de inventario fisico (Server-Sent Events, servir con core/asgi.py)
+# Con varios procesos ASGI usar 'inventario.eventos.BrokerCache' sobre memcached, redis o,
+# si todos corren en el mismo servidor, el cache de archivos (EVENTOS_BROKER_OPCIONES = {'alias': ...})
+EVENTOS_BROKER = 'inventario.eventos.BrokerMemoria'
+EVENTOS_BROKER_OPCIONES = {}
+
+# Las respuestas HTML y JSON menores a este tamano (bytes) no se comprimen.
+# Con el paquete brotli instalado se usa br para los clientes que lo aceptan.
+COMPRESION_MINIMA = 1024
+
+# Perfilado por peticion (consultas, tiempo SQL, N+1) en el log 'inventario.perfil'
+# y el encabezado Server-Timing. Una consulta que se repite PERFILADO_REPETIDAS
+# veces en la misma peticion se marca como probable N+1.
+PERFILADO = False
+PERFILADO_REPETIDAS = 5
+
+# Metricas en /metricas/ (formato de texto de Prometheus). Con varios procesos
+# cada uno vuelca sus valores en METRICAS_DIR cada METRICAS_INTERVALO segundos
+# y la vista los suma; el directorio se vacia al desplegar. El scraper se
+# autentica con 'Authorization: Bearer <METRICAS_TOKEN>'; sin token solo los
+# administradores con sesion iniciada pueden verlas.
+METRICAS = False
+METRICAS_DIR = None
+METRICAS_INTERVALO = 1
+METRICAS_TOKEN = ''
+
+# Consultas y peticiones lentas (pagina /consultas-lentas/, solo administradores).
+# Se guardan las consultas de LENTAS_SQL_MS o mas y las peticiones de
+# LENTAS_PETICION_MS o mas, con EXPLAIN en la fraccion LENTAS_EXPLAIN de las
+# consultas SELECT. Los ultimos LENTAS_CAPACIDAD registros se conservan en el cache.
+LENTAS = False
+LENTAS_SQL_MS = 200
+LENTAS_PETICION_MS = 1000
+LENTAS_EXPLAIN = 0.1
+LENTAS_CAPACIDAD = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'inventario': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class InventarioConfig(AppConfig):
     name = 'inventario'
+
+    def ready(self):
+        # Conecta las senales que cambian las versiones de las respuestas condicionales
+        # y las de las fotos de usuario en la sesion
+        from . import foto_usuario, versiones  # noqa: F401
@@ -0,0 +1,13 @@
+"""Backend MySQL de Django con el pool de conexiones de inventario/backends/pool.py"""
+from django.db.backends.mysql import base
+
+from ..pool import PoolMixin
+
+
+class DatabaseWrapper(PoolMixin, base.DatabaseWrapper):
+    def conexion_sana(self, conexion):
+        try:
+            conexion.ping()
+        except self.Database.Error:
+            return False
+        return True
@@ -0,0 +1,186 @@
+"""
+Pool de conexiones a la base de datos por proceso.
+
+Con WSGI cada hilo conserva su conexion entre peticiones (CONN_MAX_AGE) y
+Django la verifica antes de reutilizarla (CONN_HEALTH_CHECKS). Con ASGI cada
+peticion corre en otro hilo y esas conexiones no se reutilizan: cada peticion
+abriria y autenticaria una conexion nueva. El backend
+inventario.backends.mysql toma las conexiones de un pool acotado del proceso
+y las devuelve al terminar la peticion en lugar de cerrarlas:
+
+    'ENGINE': 'inventario.backends.mysql',
+    'CONN_MAX_AGE': 0,              # la conexion vuelve al pool al terminar cada peticion
+    'CONN_HEALTH_CHECKS': True,     # ping antes de entregar una conexion libre
+    'OPTIONS': {'pool': {'maximo': 20, 'espera': 5, 'vida': 600}},
+
+- maximo: conexiones abiertas del proceso, en uso o libres.
+- espera: segundos que se espera una conexion libre antes de fallar.
+- vida: segundos despues de los que una conexion se cierra en lugar de volver
+  al pool; debe ser menor que wait_timeout de MySQL.
+
+La espera por una conexion y las conexiones descartadas se registran en
+inventario/metricas.py.
+"""
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+
+from .. import metricas
+
+
+class Pool:
+    """Conexiones libres de un alias; la ultima devuelta es la primera en salir"""
+
+    def __init__(self, alias, maximo=10, espera=5, vida=600):
+        self.alias = alias
+        self.maximo = maximo
+        self.espera = espera
+        self.vida = vida
+        self._libres = []
+        self._creadas = {}
+        self._abiertas = 0
+        self._condicion = threading.Condition()
+
+    def tomar(self, conectar, sana=None):
+        """
+        Retorna (conexion, reutilizada). Si las `maximo` conexiones estan en uso
+        espera a que se devuelva una; despues de `espera` segundos falla.
+        """
+        limite = time.monotonic() + self.espera
+        while True:
+            with self._condicion:
+                while not self._libres and self._abiertas >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise OperationalError(
+                            f'No hay conexiones libres en el pool de {self.alias!r} '
+                            f'({self.maximo} en uso) despues de {self.espera} segundos.'
+                        )
+                    self._condicion.wait(restante)
+                if self._libres:
+                    conexion = self._libres.pop()
+                else:
+                    conexion = None
+                    self._abiertas += 1
+
+            if conexion is None:
+                try:
+                    conexion = conectar()
+                except BaseException:
+                    self._liberar()
+                    raise
+                with self._condicion:
+                    self._creadas[id(conexion)] = time.monotonic()
+                return conexion, False
+
+            if self._vencida(conexion):
+                self._descartar(conexion, 'vencida')
+            elif sana is not None and not sana(conexion):
+                self._descartar(conexion, 'caida')
+            else:
+                return conexion, True
+
+    def devolver(self, conexion, descartar=False):
+        """Deja la conexion libre, o la cierra si esta sucia o vencida"""
+        if descartar:
+            self._descartar(conexion, 'sucia')
+        elif self._vencida(conexion):
+            self._descartar(conexion, 'vencida')
+        else:
+            with self._condicion:
+                self._libres.append(conexion)
+                self._condicion.notify()
+
+    def _vencida(self, conexion):
+        creada = self._creadas.get(id(conexion))
+        return creada is None or time.monotonic() - creada >= self.vida
+
+    def _descartar(self, conexion, motivo):
+        with self._condicion:
+            self._creadas.pop(id(conexion), None)
+        try:
+            conexion.close()
+        except Exception:
+            # Una conexion caida puede fallar al cerrarse; igual deja de contarse
+            pass
+        self._liberar()
+        metricas.incrementar('inventario_bd_conexiones_descartadas_total', alias=self.alias, motivo=motivo)
+
+    def _liberar(self):
+        with self._condicion:
+            self._abiertas -= 1
+            self._condicion.notify()
+
+
+class PoolMixin:
+    """
+    Se combina con el DatabaseWrapper de un backend de Django. Sin la opcion
+    'pool' en OPTIONS el backend abre y cierra sus conexiones como siempre.
+    """
+    # Por proceso, alias y base de datos: un worker creado con fork no comparte
+    # los sockets del padre, y las pruebas no reutilizan conexiones a la base real
+    _pools = {}
+    _candado_pools = threading.Lock()
+
+    conexion_reutilizada = False
+
+    @property
+    def pool(self):
+        opciones = self.settings_dict['OPTIONS'].get('pool')
+        if not opciones:
+            return None
+        clave = (os.getpid(), self.alias, self.settings_dict['NAME'])
+        with self._candado_pools:
+            if clave not in self._pools:
+                if self.settings_dict['CONN_MAX_AGE'] != 0:
+                    raise ImproperlyConfigured('El pool de conexiones requiere CONN_MAX_AGE = 0.')
+                self._pools[clave] = Pool(self.alias, **({} if opciones is True else opciones))
+            return self._pools[clave]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            self.conexion_reutilizada = False
+            return super().get_new_connection(conn_params)
+
+        inicio = time.perf_counter()
+        conexion, self.conexion_reutilizada = pool.tomar(
+            lambda: super(PoolMixin, self).get_new_connection(conn_params),
+            self.conexion_sana if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+        )
+        metricas.observar('inventario_bd_espera_segundos', time.perf_counter() - inicio, alias=self.alias)
+        return conexion
+
+    def conexion_sana(self, conexion):
+        try:
+            cursor = conexion.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Una conexion cerrada a mitad de una transaccion, con otro modo de
+        # autocommit o despues de un error no se entrega a otra peticion
+        sucia = (
+            self.in_atomic_block
+            or self.errors_occurred
+            or self.autocommit != self.settings_dict['AUTOCOMMIT']
+        )
+        with self.wrap_database_errors:
+            pool.devolver(self.connection, descartar=sucia)
+        self.connection = None
@@ -0,0 +1,111 @@
+"""
+Formato compacto para las respuestas de los lectores de codigo.
+
+El cliente lo pide con el encabezado Accept:
+
+- application/vnd.inventario.compacto+json: JSON con claves cortas y sin los
+  textos que el lector puede deducir (mensajes de stock, etiquetas).
+- application/x-msgpack: las mismas claves cortas en MessagePack. Requiere
+  el paquete msgpack; si no esta instalado se responde el JSON compacto.
+
+Sin ese encabezado las vistas responden igual que siempre.
+"""
+import json
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import msgpack
+except ImportError:  # msgpack es opcional
+    msgpack = None
+
+TIPO_COMPACTO = 'application/vnd.inventario.compacto+json'
+TIPO_MSGPACK = 'application/x-msgpack'
+
+# Claves cortas del producto en las busquedas por codigo
+CLAVES_PRODUCTO = {
+    'id': 'i',
+    'code': 'c',
+    'name': 'n',
+    'unit': 'u',
+    'category': 'k',
+    'stock_actual': 's',
+    'min_stock': 'm',
+    'location': 'l',
+}
+
+# Claves cortas de un conteo registrado
+CLAVES_CONTEO = {
+    'conteo_id': 'i',
+    'product_code': 'c',
+    'product_name': 'n',
+    'unit': 'u',
+    'stock_sistema': 's',
+    'cantidad_contada': 'q',
+    'diferencia': 'd',
+    'total_productos': 't',
+    'productos_con_diferencia': 'td',
+}
+
+
+def _tipos_aceptados(request):
+    return {
+        tipo.split(';')[0].strip().lower()
+        for tipo in request.headers.get('Accept', '').split(',')
+    }
+
+
+def formato_pedido(request):
+    """Retorna 'msgpack', 'compacto' o None segun el encabezado Accept"""
+    tipos = _tipos_aceptados(request)
+    if TIPO_MSGPACK in tipos and msgpack is not None:
+        return 'msgpack'
+    if TIPO_COMPACTO in tipos or TIPO_MSGPACK in tipos:
+        return 'compacto'
+    return None
+
+
+def _acortar(datos, claves):
+    return {corta: datos[larga] for larga, corta in claves.items() if larga in datos}
+
+
+def busqueda_compacta(datos):
+    """
+    {'f': 1, 'p': {...}} si el producto existe, {'f': 0, 'e': mensaje} si no.
+    La ubicacion sin especificar va como null y el stock bajo como 'b': 1.
+    """
+    if not datos['found']:
+        return {'f': 0, 'e': datos['error']}
+
+    producto = datos['product']
+    compacto = _acortar(producto, CLAVES_PRODUCTO)
+    if compacto['l'] == 'No especificada':
+        compacto['l'] = None
+    compacto['a'] = int(producto['status'] == 'active')
+    compacto['b'] = int(producto['stock_status'] == 'danger')
+    return {'f': 1, 'p': compacto}
+
+
+def conteo_compacto(datos):
+    """{'ok': 1, 'd': {...}} con el conteo registrado, o {'ok': 0, 'e': mensaje}"""
+    if not datos['success']:
+        return {'ok': 0, 'e': datos['error']}
+    return {'ok': 1, 'd': _acortar(datos['data'], CLAVES_CONTEO)}
+
+
+def responder(request, datos, compactar):
+    """
+    Respuesta JSON normal, o la version `compactar(datos)` en el formato que
+    pida el cliente. Varia segun Accept para que los caches no las mezclen.
+    """
+    formato = formato_pedido(request)
+    if formato == 'msgpack':
+        response = HttpResponse(msgpack.packb(compactar(datos)), content_type=TIPO_MSGPACK)
+    elif formato == 'compacto':
+        contenido = json.dumps(compactar(datos), separators=(',', ':'), ensure_ascii=False)
+        response = HttpResponse(contenido.encode(), content_type=TIPO_COMPACTO)
+    else:
+        response = JsonResponse(datos)
+    patch_vary_headers(response, ('Accept',))
+    return response
@@ -0,0 +1,214 @@
+"""
+Publicacion de eventos de las sesiones de inventario fisico.
+
+Las vistas sincronas publican los cambios (conteos registrados o eliminados,
+cambios de estado) y la vista asincrona de eventos los entrega a los
+navegadores como Server-Sent Events. El broker se elige con el setting
+EVENTOS_BROKER:
+
+- BrokerMemoria (por defecto): pub/sub dentro del proceso. Basta cuando la
+  aplicacion corre en un solo proceso ASGI.
+- BrokerCache: usa un cache compartido como buzon de eventos entre procesos:
+  memcached o redis, o el cache de archivos si todos los procesos corren en
+  el mismo servidor. Es un sustituto local de un broker externo; los
+  suscriptores consultan por sondeo a intervalos cortos.
+
+Si EVENTOS_BROKER no se puede usar con el cache configurado (por ejemplo
+BrokerCache sobre el cache en memoria, que no se comparte entre procesos) se
+registra una advertencia y se usa BrokerMemoria.
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos, ver BrokerCache
+    fcntl = None
+
+logger = logging.getLogger('inventario.eventos')
+
+CANAL_SESIONES = 'sesiones'
+
+
+def canal_sesion(sesion_id):
+    return f'sesion:{sesion_id}'
+
+
+class BrokerMemoria:
+    """Pub/sub en memoria. Solo entrega eventos publicados por el mismo proceso."""
+
+    def __init__(self, max_pendientes=1000):
+        self.max_pendientes = max_pendientes
+        self._suscriptores = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publicar(self, canal, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores.get(canal, ()))
+
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._encolar, cola, evento)
+            except RuntimeError:
+                # El loop del suscriptor ya se cerro
+                pass
+
+    @staticmethod
+    def _encolar(cola, evento):
+        if cola.full():
+            # Un cliente lento pierde los eventos mas viejos, no bloquea a los demas
+            cola.get_nowait()
+        cola.put_nowait(evento)
+
+    async def escuchar(self, canal, espera):
+        """Genera los eventos del canal; genera None si pasan `espera` segundos sin eventos"""
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.max_pendientes))
+
+        with self._lock:
+            self._suscriptores[canal].add(suscripcion)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(suscripcion[1].get(), espera)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._suscriptores[canal].discard(suscripcion)
+                if not self._suscriptores[canal]:
+                    del self._suscriptores[canal]
+
+
+def contador_atomico(cache):
+    """
+    True si incr del cache es atomico entre procesos. En el cache de archivos
+    incr lee, suma y escribe: dos procesos pueden obtener el mismo numero. El
+    cache en memoria es atomico, pero solo dentro de un proceso.
+    """
+    return not isinstance(cache, (FileBasedCache, LocMemCache))
+
+
+class BrokerCache:
+    """
+    Buzon de eventos sobre un cache compartido entre procesos.
+
+    Cada canal tiene un contador de secuencia y cada evento se guarda en su
+    propia clave. Los suscriptores leen las claves nuevas por sondeo.
+
+    En memcached y redis el contador es atomico. En el cache de archivos no lo
+    es (ver contador_atomico): el contador se incrementa con un bloqueo sobre
+    un archivo del directorio del cache, asi que todos los procesos deben
+    correr en el mismo servidor y con el cache en un disco local. Sin fcntl
+    (Windows) no hay bloqueo y dos publicaciones simultaneas pueden tomar la
+    misma clave: se pierde uno de los dos eventos. El cache en memoria no se
+    comparte entre procesos y no se acepta.
+    """
+
+    def __init__(self, alias='default', intervalo=0.5, retencion=500, ttl=300):
+        if isinstance(caches[alias], LocMemCache):
+            raise ImproperlyConfigured(
+                f'BrokerCache necesita un cache compartido entre procesos; el cache {alias!r} es LocMemCache.'
+            )
+        self.alias = alias
+        self.intervalo = intervalo
+        self.retencion = retencion
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @contextmanager
+    def _bloqueo(self):
+        if contador_atomico(self.cache) or fcntl is None:
+            yield
+            return
+        ruta = os.path.join(settings.CACHES[self.alias]['LOCATION'], 'eventos.lock')
+        with open(ruta, 'a') as archivo:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    def publicar(self, canal, evento):
+        clave_seq = f'eventos:{canal}:seq'
+        with self._bloqueo():
+            self.cache.add(clave_seq, 0, None)
+            seq = self.cache.incr(clave_seq)
+        self.cache.set(f'eventos:{canal}:{seq}', evento, self.ttl)
+
+    async def escuchar(self, canal, espera):
+        clave_seq = f'eventos:{canal}:seq'
+        ultimo = await self.cache.aget(clave_seq) or 0
+        inactivo = 0.0
+
+        while True:
+            actual = await self.cache.aget(clave_seq) or 0
+            if actual < ultimo:
+                # El contador se perdio (cache reiniciado): empezar de nuevo
+                ultimo = 0
+
+            if actual > ultimo:
+                desde = max(ultimo + 1, actual - self.retencion + 1)
+                claves = [f'eventos:{canal}:{seq}' for seq in range(desde, actual + 1)]
+                eventos = await self.cache.aget_many(claves)
+                for clave in claves:
+                    if clave in eventos:
+                        yield eventos[clave]
+                ultimo = actual
+                inactivo = 0.0
+                continue
+
+            await asyncio.sleep(self.intervalo)
+            inactivo += self.intervalo
+            if inactivo >= espera:
+                inactivo = 0.0
+                yield None
+
+
+@lru_cache(maxsize=None)
+def obtener_broker():
+    clase = import_string(getattr(settings, 'EVENTOS_BROKER', 'inventario.eventos.BrokerMemoria'))
+    try:
+        return clase(**getattr(settings, 'EVENTOS_BROKER_OPCIONES', {}))
+    except ImproperlyConfigured as e:
+        logger.warning('%s Se usa BrokerMemoria: los eventos solo llegan a los suscriptores del mismo proceso.', e)
+        return BrokerMemoria()
+
+
+def publicar_evento(sesion_id, tipo, datos):
+    """
+    Publica un evento de la sesion cuando la transaccion actual se confirma.
+    La lista de sesiones recibe el mismo evento sin el detalle del conteo.
+    """
+    evento = {'tipo': tipo, 'sesion_id': sesion_id, 'datos': datos}
+    resumen = {
+        'tipo': tipo,
+        'sesion_id': sesion_id,
+        'datos': {
+            clave: datos[clave]
+            for clave in ('status', 'total_productos', 'productos_con_diferencia')
+            if clave in datos
+        },
+    }
+
+    def enviar():
+        broker = obtener_broker()
+        broker.publicar(canal_sesion(sesion_id), evento)
+        broker.publicar(CANAL_SESIONES, resumen)
+
+    transaction.on_commit(enviar)
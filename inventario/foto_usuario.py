@@ -0,0 +1,98 @@
+"""
+Foto del usuario en la sesion, para autenticar sin consultar la base de datos.
+
+AuthenticationMiddleware de Django carga el usuario de la base de datos en
+cada peticion. FotoUsuarioMiddleware (inventario/middleware.py) guarda en la
+sesion, la primera vez, una foto firmada con los campos que usan las vistas y
+la plantilla base: id, rol, estado y nombres. Las peticiones siguientes arman
+el usuario desde la foto. Con las sesiones en el cache (SESSION_ENGINE
+cached_db) una peticion autenticada no consulta la base de datos.
+
+La foto vale mientras no cambie la version del usuario (ver versiones.py).
+Guardar o eliminar el usuario la cambia (usuario_edit, usuario_delete,
+perfil_edit) y la siguiente peticion de cada una de sus sesiones lo vuelve a
+cargar de la base de datos, con las verificaciones de Django: usuario activo
+y contrasena sin cambios. Los campos que no estan en la foto (password,
+last_login, date_joined) se cargan al usarlos, como los diferidos de .only().
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from .versiones import aobtener_versiones, invalidar, obtener_versiones
+
+CLAVE_SESION = '_usuario_foto'
+SAL = 'inventario.foto_usuario'
+CAMPOS = (
+    'id', 'username', 'first_name', 'last_name', 'email',
+    'role', 'status', 'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def _recurso(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def _foto(usuario, version):
+    return signing.dumps({'campos': {campo: getattr(usuario, campo) for campo in CAMPOS}, 'version': version}, salt=SAL)
+
+
+def _desde_foto(foto, usuario_id, version):
+    """Usuario armado desde la foto, o None si no hay foto, no es valida o es de otra version"""
+    if not foto:
+        return None
+    try:
+        datos = signing.loads(foto, salt=SAL)
+    except signing.BadSignature:
+        return None
+    campos = datos['campos']
+    if datos['version'] != version or str(campos['id']) != str(usuario_id):
+        return None
+    # from_db recibe los valores en el orden de los campos del modelo
+    nombres = [campo.attname for campo in User._meta.concrete_fields if campo.attname in campos]
+    return User.from_db(DEFAULT_DB_ALIAS, nombres, [campos[nombre] for nombre in nombres])
+
+
+def obtener_usuario(request):
+    """El usuario de la peticion: desde la foto de la sesion o, si no vale, desde la base de datos"""
+    usuario_id = request.session.get(SESSION_KEY)
+    if usuario_id is None or request.session.get(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    # La version se lee antes que el usuario: si cambia en el medio, la foto ya nace vieja
+    [(version, _)] = obtener_versiones(_recurso(usuario_id))
+    usuario = _desde_foto(request.session.get(CLAVE_SESION), usuario_id, version)
+    if usuario is None:
+        usuario = auth.get_user(request)
+        if usuario.is_authenticated:
+            request.session[CLAVE_SESION] = _foto(usuario, version)
+    return usuario
+
+
+async def aobtener_usuario(request):
+    """Version asincrona de `obtener_usuario` para las vistas async"""
+    usuario_id = await request.session.aget(SESSION_KEY)
+    if usuario_id is None or await request.session.aget(BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return await auth.aget_user(request)
+
+    [(version, _)] = await aobtener_versiones(_recurso(usuario_id))
+    usuario = _desde_foto(await request.session.aget(CLAVE_SESION), usuario_id, version)
+    if usuario is None:
+        usuario = await auth.aget_user(request)
+        if usuario.is_authenticated:
+            await request.session.aset(CLAVE_SESION, _foto(usuario, version))
+    return usuario
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidar_foto(sender, instance, update_fields=None, **kwargs):
+    # Al iniciar sesion solo se actualiza last_login, que no esta en la foto
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidar(_recurso(instance.pk))
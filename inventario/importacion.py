@@ -0,0 +1,476 @@
+"""
+Lectura en streaming de archivos CSV/XLSX para las importaciones masivas.
+
+Los archivos se recorren fila por fila (openpyxl en modo read_only para XLSX,
+el modulo csv para CSV) y se procesan en lotes, de modo que la memoria usada
+no depende del tamano del archivo.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+import zipfile
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .models import Category, Product
+from .versiones import invalidar
+
+TAMANO_LOTE = 2000
+
+# Errores por fila que se guardan en el resultado; el total se informa siempre
+MAX_ERRORES = 500
+
+
+class ArchivoInvalido(Exception):
+    pass
+
+
+def leer_filas(archivo, nombre=None):
+    """
+    Genera las filas del archivo como tuplas de valores. `archivo` puede ser
+    un archivo subido o una ruta; el formato se decide por la extension.
+    """
+    nombre = (nombre or getattr(archivo, 'name', None) or str(archivo)).lower()
+
+    if nombre.endswith('.xlsx'):
+        return _filas_xlsx(archivo)
+    if nombre.endswith(('.csv', '.txt')):
+        return _filas_csv(archivo)
+    raise ArchivoInvalido('Formato no soportado. Use un archivo .csv o .xlsx.')
+
+
+def _filas_xlsx(archivo):
+    try:
+        wb = load_workbook(archivo, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError):
+        raise ArchivoInvalido('El archivo no es un libro de Excel (.xlsx) valido.')
+
+    try:
+        for fila in wb.active.iter_rows(values_only=True):
+            yield fila
+    finally:
+        wb.close()
+
+
+def _filas_csv(archivo):
+    if isinstance(archivo, (str, bytes)) or hasattr(archivo, '__fspath__'):
+        binario = open(archivo, 'rb')
+    else:
+        archivo.seek(0)
+        binario = getattr(archivo, 'file', archivo)
+
+    # Excel en espanol suele exportar en cp1252 y separado por punto y coma
+    muestra = binario.read(64 * 1024)
+    binario.seek(0)
+    try:
+        # La muestra puede cortar un caracter de varios bytes al final
+        codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'cp1252'
+
+    texto = io.TextIOWrapper(binario, encoding=encoding, errors='replace', newline='')
+    try:
+        dialecto = csv.Sniffer().sniff(muestra.decode(encoding, errors='replace'), delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+
+    try:
+        for fila in csv.reader(texto, dialecto):
+            yield tuple(fila)
+    finally:
+        texto.detach()
+        if binario is not getattr(archivo, 'file', archivo):
+            binario.close()
+
+
+def filas_con_columnas(filas, columnas):
+    """
+    Asocia cada fila a las columnas esperadas y genera (numero_fila, dict).
+
+    `columnas` es un dict {clave: (nombres aceptados en el encabezado)}. Si la
+    primera fila tiene alguno de esos nombres se usa como encabezado; si no,
+    las columnas se toman en el orden del dict y la primera fila es un dato.
+    """
+    filas = iter(filas)
+    primera = next(filas, None)
+    if primera is None:
+        return
+
+    encabezado = [str(valor or '').strip().lower() for valor in primera]
+    posiciones = {}
+    for clave, nombres in columnas.items():
+        for nombre in nombres:
+            if nombre in encabezado:
+                posiciones[clave] = encabezado.index(nombre)
+                break
+
+    if posiciones:
+        inicio = 2
+    else:
+        posiciones = {clave: i for i, clave in enumerate(columnas)}
+        filas = _anteponer(primera, filas)
+        inicio = 1
+
+    for numero, fila in enumerate(filas, start=inicio):
+        if not any(valor not in (None, '') for valor in fila):
+            continue
+        yield numero, {
+            clave: fila[i] if i < len(fila) else None
+            for clave, i in posiciones.items()
+        }
+
+
+def _anteponer(primera, filas):
+    yield primera
+    yield from filas
+
+
+def en_lotes(iterable, tamano=TAMANO_LOTE):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def normalizar_codigo(valor):
+    """Convierte la celda del codigo a texto (Excel guarda 1234 como 1234.0)"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def normalizar_entero(valor):
+    """Convierte la celda a entero; lanza ValueError si no es un numero entero"""
+    if isinstance(valor, float):
+        if not valor.is_integer():
+            raise ValueError(valor)
+        return int(valor)
+    if isinstance(valor, int):
+        return valor
+    return int(str(valor).strip())
+
+
+def normalizar_decimal(valor, decimales=2):
+    """Convierte la celda a Decimal redondeado; lanza ValueError si no es un numero"""
+    if valor is None or valor == '':
+        return Decimal('0')
+    if isinstance(valor, float):
+        valor = repr(valor)
+    texto = str(valor).strip().replace(' ', '')
+    coma, punto = texto.rfind(','), texto.rfind('.')
+    if coma >= 0 and punto >= 0:
+        # 1.234,56 (formato local) o 1,234.56 (Excel en ingles): el ultimo separador es el decimal
+        miles, decimal = ('.', ',') if coma > punto else (',', '.')
+        texto = texto.replace(miles, '').replace(decimal, '.')
+    elif texto.count(',') > 1 or texto.count('.') > 1:
+        # 1.234.567 o 1,234,567: un separador repetido solo puede ser de miles
+        texto = texto.replace(',', '').replace('.', '')
+    else:
+        # 1234,5 o 1234.5
+        texto = texto.replace(',', '.')
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(valor)
+    if not numero.is_finite():
+        raise ValueError(valor)
+    return numero.quantize(Decimal(1).scaleb(-decimales))
+
+
+def _ruta_pendiente(token):
+    directorio = getattr(settings, 'IMPORTACIONES_DIR', None) or os.path.join(tempfile.gettempdir(), 'inventario_importaciones')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio, os.path.join(directorio, f'{token}.json')
+
+
+def guardar_pendiente(datos):
+    """
+    Guarda en un archivo los datos de una importacion entre la vista previa y
+    la confirmacion, y retorna el token que la identifica. En la sesion solo
+    va el token: un archivo grande no cabe en el cache de sesiones. Las
+    pendientes de mas de IMPORTACIONES_VIGENCIA segundos se borran.
+    """
+    token = secrets.token_hex(16)
+    directorio, ruta = _ruta_pendiente(token)
+    vencimiento = time.time() - getattr(settings, 'IMPORTACIONES_VIGENCIA', 3600)
+    for entrada in os.scandir(directorio):
+        if entrada.name.endswith('.json') and entrada.stat().st_mtime < vencimiento:
+            descartar_pendiente(entrada.name[:-len('.json')])
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo)
+    return token
+
+
+def tomar_pendiente(token):
+    """Lee y borra la importacion pendiente; None si no existe o ya vencio"""
+    if not token or not re.fullmatch(r'[0-9a-f]{32}', token):
+        return None
+    _, ruta = _ruta_pendiente(token)
+    try:
+        vigente = time.time() - os.path.getmtime(ruta) < getattr(settings, 'IMPORTACIONES_VIGENCIA', 3600)
+        with open(ruta, encoding='utf-8') as archivo:
+            datos = json.load(archivo)
+    except FileNotFoundError:
+        return None
+    finally:
+        descartar_pendiente(token)
+    return datos if vigente else None
+
+
+def descartar_pendiente(token):
+    if not token or not re.fullmatch(r'[0-9a-f]{32}', token):
+        return
+    _, ruta = _ruta_pendiente(token)
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def resolver_productos(codigos, campos=('id', 'code', 'name', 'stock_actual')):
+    """
+    Busca los productos de una lista de codigos con una sola consulta y
+    retorna un dict {codigo en mayusculas: valores}.
+
+    La busqueda por codigo en la aplicacion no distingue mayusculas; ademas
+    del codigo tal cual se buscan sus variantes en mayusculas y minusculas
+    para no depender de la collation de la base de datos.
+    """
+    variantes = set()
+    for codigo in codigos:
+        variantes.update((codigo, codigo.upper(), codigo.lower()))
+
+    if 'code' not in campos:
+        campos = (*campos, 'code')
+
+    return {
+        producto['code'].upper(): producto
+        for producto in Product.objects.filter(code__in=variantes).values(*campos)
+    }
+
+
+COLUMNAS_CATALOGO = {
+    'codigo': ('codigo', 'código', 'code', 'cod', 'sku'),
+    'nombre': ('nombre', 'name', 'producto'),
+    'unidad': ('unidad', 'unit', 'um', 'unidad de medida'),
+    'categoria': ('categoria', 'categoría', 'category'),
+    'stock_minimo': ('stock_minimo', 'stock minimo', 'stock mínimo', 'min_stock'),
+    'ubicacion': ('ubicacion', 'ubicación', 'location'),
+    'descripcion': ('descripcion', 'descripción', 'description'),
+}
+COLUMNAS_CATALOGO_REQUERIDAS = ('codigo', 'nombre', 'unidad', 'categoria')
+
+# Columna del archivo -> campo de Product que actualiza
+CAMPOS_CATALOGO = {
+    'nombre': 'name',
+    'unidad': 'unit',
+    'categoria': 'category',
+    'stock_minimo': 'min_stock',
+    'ubicacion': 'location',
+    'descripcion': 'description',
+}
+
+
+class _Categorias:
+    """Categorias activas cargadas una sola vez, buscadas por nombre o por id"""
+
+    def __init__(self, crear):
+        self.crear = crear
+        self.por_nombre = {}
+        self.ids = set()
+        self.inactivas = set()
+        for pk, nombre, status in Category.objects.order_by('pk').values_list('pk', 'name', 'status'):
+            if status != 'active':
+                self.inactivas.add(nombre.strip().lower())
+                continue
+            self.por_nombre.setdefault(nombre.strip().lower(), pk)
+            self.ids.add(pk)
+
+    def resolver(self, valor):
+        """Retorna el id de la categoria; lanza ValueError con el mensaje del error"""
+        nombre = normalizar_codigo(valor)
+        if not nombre:
+            raise ValueError('La categoria es requerida.')
+
+        clave = nombre.lower()
+        if clave in self.por_nombre:
+            return self.por_nombre[clave]
+        if nombre.isdigit() and int(nombre) in self.ids:
+            return int(nombre)
+        if clave in self.inactivas:
+            raise ValueError(f'La categoria "{nombre}" esta inactiva.')
+        if not self.crear:
+            raise ValueError(f'La categoria "{nombre}" no existe.')
+        if len(nombre) > 100:
+            raise ValueError('El nombre de la categoria no puede exceder 100 caracteres.')
+
+        categoria = Category.objects.create(name=nombre)
+        self.por_nombre[clave] = categoria.pk
+        self.ids.add(categoria.pk)
+        return categoria.pk
+
+
+def _validar_producto(fila, categorias):
+    """
+    Valida una fila del catalogo con las mismas reglas que el formulario de
+    productos y retorna los valores de los campos presentes en el archivo.
+    """
+    valores = {}
+
+    nombre = normalizar_codigo(fila['nombre'])
+    if not nombre:
+        raise ValueError('El nombre del producto es requerido.')
+    if len(nombre) > 200:
+        raise ValueError('El nombre no puede exceder 200 caracteres.')
+    valores['name'] = nombre
+
+    unidad = normalizar_codigo(fila['unidad'])
+    if not unidad:
+        raise ValueError('La unidad de medida es requerida.')
+    if len(unidad) > 20:
+        raise ValueError('La unidad no puede exceder 20 caracteres.')
+    valores['unit'] = unidad
+
+    valores['category_id'] = categorias.resolver(fila['categoria'])
+
+    if 'stock_minimo' in fila:
+        if fila['stock_minimo'] in (None, ''):
+            valores['min_stock'] = 0
+        else:
+            try:
+                valores['min_stock'] = normalizar_entero(fila['stock_minimo'])
+            except (TypeError, ValueError):
+                raise ValueError('El stock minimo debe ser un numero entero.')
+            if valores['min_stock'] < 0:
+                raise ValueError('El stock minimo no puede ser negativo.')
+
+    if 'ubicacion' in fila:
+        ubicacion = normalizar_codigo(fila['ubicacion'])
+        if len(ubicacion) > 100:
+            raise ValueError('La ubicacion no puede exceder 100 caracteres.')
+        valores['location'] = ubicacion
+
+    if 'descripcion' in fila:
+        valores['description'] = normalizar_codigo(fila['descripcion']) or None
+
+    return valores
+
+
+def _guardar_lote_catalogo(lote, campos, solo_nuevos, resultado, error):
+    """Inserta o actualiza un lote de productos validos con una consulta de lectura y un upsert"""
+    existentes = resolver_productos([codigo for _, codigo, _ in lote], campos=('id', 'code'))
+
+    productos = []
+    actualizados = 0
+    ahora = timezone.now()
+    for numero, codigo, valores in lote:
+        existente = existentes.get(codigo.upper())
+        if existente is not None:
+            if solo_nuevos:
+                error(numero, f'Ya existe un producto con el codigo "{codigo}".')
+                continue
+            # Se usa el codigo tal como esta guardado para que el conflicto
+            # se detecte aunque el archivo lo traiga con otras mayusculas
+            codigo = existente['code']
+            actualizados += 1
+        productos.append(Product(code=codigo, created_at=ahora, updated_at=ahora, **valores))
+
+    if not productos:
+        return
+
+    # Los productos nuevos entran con stock 0 y los existentes conservan su
+    # stock y estado: solo se actualizan las columnas que trae el archivo.
+    upsert = {
+        'update_conflicts': True,
+        'update_fields': [*campos, 'updated_at'],
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['code']
+
+    with transaction.atomic():
+        Product.objects.bulk_create(productos, batch_size=500, **upsert)
+        # bulk_create no dispara senales
+        invalidar('productos')
+
+    resultado['creados'] += len(productos) - actualizados
+    resultado['actualizados'] += actualizados
+
+
+def importar_catalogo(archivo, nombre=None, crear_categorias=False, solo_nuevos=False,
+                      tamano_lote=TAMANO_LOTE, max_errores=MAX_ERRORES):
+    """
+    Importa el catalogo de productos de un archivo CSV/XLSX.
+
+    Las filas se validan en memoria contra las categorias (cargadas una vez)
+    y los codigos existentes (una consulta por lote); las validas se guardan
+    con un upsert por lote. Retorna un dict con los totales, los errores por
+    fila y el rendimiento.
+    """
+    resultado = {
+        'filas': 0,
+        'creados': 0,
+        'actualizados': 0,
+        'invalidas': 0,
+        'errores': [],
+    }
+
+    def error(numero, mensaje):
+        resultado['invalidas'] += 1
+        if max_errores is None or len(resultado['errores']) < max_errores:
+            resultado['errores'].append((numero, mensaje))
+
+    inicio = time.perf_counter()
+    categorias = _Categorias(crear_categorias)
+    filas = filas_con_columnas(leer_filas(archivo, nombre), COLUMNAS_CATALOGO)
+
+    primera = next(filas, None)
+    if primera is None:
+        raise ArchivoInvalido('El archivo no tiene filas.')
+    faltantes = [columna for columna in COLUMNAS_CATALOGO_REQUERIDAS if columna not in primera[1]]
+    if faltantes:
+        raise ArchivoInvalido(f'Faltan las columnas: {", ".join(faltantes)}.')
+    campos = [campo for columna, campo in CAMPOS_CATALOGO.items() if columna in primera[1]]
+
+    vistos = {}
+
+    def filas_validas():
+        for numero, fila in _anteponer(primera, filas):
+            resultado['filas'] += 1
+            codigo = normalizar_codigo(fila['codigo'])
+            if not codigo:
+                error(numero, 'El codigo del producto es requerido.')
+                continue
+            if len(codigo) > 50:
+                error(numero, 'El codigo no puede exceder 50 caracteres.')
+                continue
+            if codigo.upper() in vistos:
+                error(numero, f'El codigo "{codigo}" esta repetido en el archivo (fila {vistos[codigo.upper()]}).')
+                continue
+            try:
+                valores = _validar_producto(fila, categorias)
+            except ValueError as e:
+                error(numero, str(e))
+                continue
+            vistos[codigo.upper()] = numero
+            yield numero, codigo, valores
+
+    for lote in en_lotes(filas_validas(), tamano_lote):
+        _guardar_lote_catalogo(lote, campos, solo_nuevos, resultado, error)
+
+    resultado['segundos'] = time.perf_counter() - inicio
+    resultado['filas_por_segundo'] = resultado['filas'] / resultado['segundos'] if resultado['segundos'] else 0
+    return resultado
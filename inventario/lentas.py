@@ -0,0 +1,142 @@
+"""
+Registro de consultas SQL y peticiones lentas.
+
+LentasMiddleware (inventario/middleware.py) mide cada consulta y cada
+peticion. Las que superan LENTAS_SQL_MS o LENTAS_PETICION_MS se guardan con
+sus parametros, la vista y la ruta. A una muestra (LENTAS_EXPLAIN) de las
+consultas SELECT lentas se les agrega el plan de ejecucion (EXPLAIN).
+
+Los registros van a un buffer circular en el cache (LENTAS_CACHE), visible
+desde todos los procesos. Un contador asigna la posicion y el registro numero
+n ocupa la posicion n % LENTAS_CAPACIDAD, asi el buffer nunca crece y los mas
+viejos se reemplazan. Con un cache en archivo el contador no es atomico entre
+procesos (ver eventos.contador_atomico): dos registros simultaneos pueden caer
+en la misma posicion y se pierde uno. Para un registro de diagnostico esa
+perdida se acepta; eventos.BrokerCache, que no debe perder eventos, bloquea un
+archivo al incrementar su contador.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+MAX_PARAMETROS = 20
+MAX_LARGO_PARAMETRO = 100
+MAX_LARGO_PLAN = 4000
+
+
+def _cache():
+    return caches[getattr(settings, 'LENTAS_CACHE', 'default')]
+
+
+def _capacidad():
+    return getattr(settings, 'LENTAS_CAPACIDAD', 500)
+
+
+def _clave(posicion):
+    return f'lentas:{posicion}'
+
+
+def parametros_legibles(params):
+    """Parametros de la consulta como texto corto, sin guardar valores enormes en el cache"""
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        params = [f'{nombre}={valor!r}' for nombre, valor in params.items()]
+    else:
+        params = [repr(valor) for valor in params]
+    recortados = [
+        valor if len(valor) <= MAX_LARGO_PARAMETRO else valor[:MAX_LARGO_PARAMETRO] + '...'
+        for valor in params[:MAX_PARAMETROS]
+    ]
+    if len(params) > MAX_PARAMETROS:
+        recortados.append(f'... {len(params) - MAX_PARAMETROS} mas')
+    return recortados
+
+
+def plan(alias, sql, params):
+    """
+    EXPLAIN de la consulta en la base de datos `alias`, como texto. Solo para
+    SELECT: EXPLAIN no ejecuta la consulta, pero en algunos motores no aplica
+    a escrituras.
+    """
+    if sql.lstrip()[:6].upper() != 'SELECT':
+        return None
+    conexion = connections[alias]
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(f'{conexion.ops.explain_query_prefix()} {sql}', params)
+            filas = cursor.fetchall()
+    except DatabaseError as e:
+        return f'No se pudo obtener el plan: {e}'
+    texto = '\n'.join(' | '.join('' if valor is None else str(valor) for valor in fila) for fila in filas)
+    return texto[:MAX_LARGO_PLAN]
+
+
+def registrar(registros):
+    """Agrega los registros al buffer circular"""
+    if not registros:
+        return
+    cache = _cache()
+    capacidad = _capacidad()
+    cache.add('lentas:seq', 0, None)
+    ultimo = cache.incr('lentas:seq', len(registros))
+    cache.set_many({
+        _clave((ultimo - len(registros) + i) % capacidad): registro
+        for i, registro in enumerate(registros, 1)
+    }, None)
+
+
+def leer():
+    """Registros del buffer, del mas reciente al mas viejo"""
+    cache = _cache()
+    ultimo = cache.get('lentas:seq') or 0
+    capacidad = _capacidad()
+    secuencias = range(ultimo, max(ultimo - capacidad, 0), -1)
+    guardados = cache.get_many([_clave(seq % capacidad) for seq in secuencias])
+    return [guardados[_clave(seq % capacidad)] for seq in secuencias if _clave(seq % capacidad) in guardados]
+
+
+def vaciar():
+    cache = _cache()
+    cache.delete_many([_clave(posicion) for posicion in range(_capacidad())] + ['lentas:seq'])
+
+
+def agrupar(registros):
+    """
+    Consultas lentas agrupadas por huella (la consulta sin sus valores), de la
+    que mas tiempo sumo a la que menos. Cada grupo conserva el ejemplo mas lento
+    y el plan mas reciente.
+    """
+    grupos = {}
+    vistas = defaultdict(set)
+    for registro in registros:
+        if registro['tipo'] != 'sql':
+            continue
+        grupo = grupos.get(registro['huella'])
+        if grupo is None:
+            grupo = grupos[registro['huella']] = {
+                'huella': registro['huella'],
+                'veces': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'ultima': registro['fecha'],
+                'ejemplo': registro,
+                'plan': None,
+            }
+        grupo['veces'] += 1
+        grupo['total_ms'] += registro['ms']
+        if registro['ms'] > grupo['max_ms']:
+            grupo['max_ms'] = registro['ms']
+            grupo['ejemplo'] = registro
+        # Los registros llegan del mas reciente al mas viejo
+        if grupo['plan'] is None and registro.get('plan'):
+            grupo['plan'] = registro['plan']
+        vistas[registro['huella']].add(registro['vista'] or '-')
+
+    resultado = sorted(grupos.values(), key=lambda grupo: grupo['total_ms'], reverse=True)
+    for grupo in resultado:
+        grupo['promedio_ms'] = grupo['total_ms'] / grupo['veces']
+        grupo['vistas'] = sorted(vistas[grupo['huella']])
+    return resultado
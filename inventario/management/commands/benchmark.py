@@ -0,0 +1,277 @@
+import io
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventario.models import User, Product, InventarioSesion, DetalleConteo
+from .benchmark_respuestas import _host
+from .generar_datos import ESCALAS
+
+# Umbrales por defecto: cuanto puede crecer cada medida respecto a la base
+UMBRAL_TIEMPO = 0.20
+UMBRAL_MEMORIA = 0.25
+UMBRAL_BYTES = 0.10
+# Diferencias absolutas por debajo de estas no cuentan: en las vistas pequenas
+# un 20% puede ser ruido de la medicion
+DIFERENCIA_MINIMA = {'mediana_ms': 2, 'memoria_pico_kb': 256, 'bytes': 0}
+
+# El benchmark no debe leer ni dejar datos en el cache compartido
+CACHE_AISLADO = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sesiones'},
+}
+
+
+def _preparar_conciliacion(contexto):
+    """Sesion finalizada con diferencias en el 10% de los productos, lista para conciliar"""
+    usuario = contexto['usuario']
+    sesion = InventarioSesion.objects.create(user=usuario, status='finalizado', finished_at=timezone.now())
+    productos = Product.objects.order_by('pk').values_list('pk', 'stock_actual')[::10]
+    DetalleConteo.objects.bulk_create([
+        DetalleConteo(
+            sesion=sesion,
+            product_id=pk,
+            stock_sistema=stock,
+            cantidad_contada=stock + 1,
+            diferencia=1,
+        )
+        for pk, stock in productos
+    ], batch_size=1000)
+    InventarioSesion.objects.filter(pk=sesion.pk).update(
+        total_productos=len(productos),
+        productos_con_diferencia=len(productos),
+    )
+    return {'url': reverse('inventario_conciliar', args=[sesion.pk])}
+
+
+# (nombre, metodo, url o funcion que la arma con el contexto, preparacion por repeticion)
+CASOS = [
+    ('producto_list', 'get', lambda c: reverse('producto_list'), None),
+    ('producto_list filtrado', 'get', lambda c: reverse('producto_list') + f'?q={c["termino"]}&orden=-stock', None),
+    ('entrada_historial', 'get', lambda c: reverse('entrada_historial'), None),
+    ('entrada_historial filtrado', 'get', lambda c: reverse('entrada_historial') + f'?producto={c["codigo"]}', None),
+    ('salida_historial', 'get', lambda c: reverse('salida_historial'), None),
+    ('buscar_producto', 'get', lambda c: reverse('buscar_producto') + f'?code={c["codigo"]}', None),
+    ('buscar_productos_autocomplete', 'get',
+     lambda c: reverse('buscar_productos_autocomplete') + f'?term={c["termino"]}', None),
+    ('proveedor_analisis', 'get', lambda c: reverse('proveedor_analisis'), None),
+    ('api productos limit=500', 'get', lambda c: reverse('api_recurso', args=['productos']) + '?limit=500', None),
+    ('inventario_conciliar', 'post', None, _preparar_conciliacion),
+    ('exportar_inventario_actual', 'get', lambda c: reverse('exportar_inventario_actual'), None),
+    ('exportar_reporte_salidas', 'get', lambda c: reverse('exportar_reporte_salidas'), None),
+    ('exportar_reporte_auditoria', 'get',
+     lambda c: reverse('exportar_reporte_auditoria', args=[c['sesion_auditoria']]), None),
+]
+
+
+def _tamano(response):
+    if response.streaming:
+        return sum(len(parte) for parte in response.streaming_content)
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide las vistas y exportaciones mas usadas (tiempo, consultas, memoria y tamano de la '
+        'respuesta) sobre datos generados y las compara con una medicion base'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas',
+            nargs='+',
+            choices=ESCALAS,
+            default=['1k', '100k'],
+            help='Escalas de datos a generar, ver generar_datos (por defecto 1k 100k)',
+        )
+        parser.add_argument(
+            '--bd-actual',
+            action='store_true',
+            help='Medir sobre la base de datos configurada en lugar de generar datos',
+        )
+        parser.add_argument('--casos', nargs='+', help='Medir solo los casos cuyo nombre contenga alguno de estos textos')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Mediciones por caso (por defecto 3)')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla de los datos generados (por defecto 42)')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--base', help='Archivo JSON de una medicion anterior con la que comparar')
+        parser.add_argument('--umbral-tiempo', type=float, default=UMBRAL_TIEMPO,
+                            help=f'Aumento de la mediana de tiempo que cuenta como regresion (por defecto {UMBRAL_TIEMPO})')
+        parser.add_argument('--umbral-memoria', type=float, default=UMBRAL_MEMORIA,
+                            help=f'Aumento del pico de memoria que cuenta como regresion (por defecto {UMBRAL_MEMORIA})')
+        parser.add_argument('--umbral-bytes', type=float, default=UMBRAL_BYTES,
+                            help=f'Aumento del tamano de la respuesta que cuenta como regresion (por defecto {UMBRAL_BYTES})')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser mayor a cero.')
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer la medicion base: {e}')
+
+        casos = [
+            caso for caso in CASOS
+            if not options['casos'] or any(texto in caso[0] for texto in options['casos'])
+        ]
+        if not casos:
+            raise CommandError('Ningun caso coincide con --casos.')
+
+        resultados = {
+            'fecha': timezone.now().isoformat(),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_de_datos': connection.vendor,
+            },
+            'repeticiones': options['repeticiones'],
+            'escalas': {},
+        }
+
+        with override_settings(CACHES=CACHE_AISLADO, PERFILADO=False):
+            if options['bd_actual']:
+                resultados['escalas']['actual'] = self._medir(casos, options['repeticiones'])
+            else:
+                for escala in options['escalas']:
+                    resultados['escalas'][escala] = self._con_datos_generados(
+                        escala, options['semilla'], casos, options['repeticiones']
+                    )
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Resultados guardados en {options["salida"]}')
+
+        if base is not None:
+            regresiones = self._comparar(resultados, base, options)
+            if regresiones:
+                raise CommandError(f'{regresiones} regresion(es) respecto a {options["base"]}.')
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto a la medicion base.'))
+
+    def _con_datos_generados(self, escala, semilla, casos, repeticiones):
+        """Crea una base de datos de prueba, la llena con generar_datos y mide; luego la elimina"""
+        nombre_original = connection.settings_dict['NAME']
+        self.stdout.write(f'Generando datos de la escala {escala}...')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            call_command('generar_datos', escala=escala, semilla=semilla, stdout=io.StringIO())
+            return self._medir(casos, repeticiones, escala)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+    def _contexto(self):
+        usuario = User.objects.filter(is_active=True, role='admin').order_by('pk').first()
+        if usuario is None:
+            usuario = User.objects.create_superuser('benchmark', password=None)
+        producto = Product.objects.filter(entrada__isnull=False).order_by('pk').values('code', 'name').first()
+        sesion = InventarioSesion.objects.order_by('-total_productos').values_list('pk', flat=True).first()
+        if producto is None or sesion is None:
+            raise CommandError('La base de datos necesita productos con entradas y al menos una sesion de inventario.')
+        return {
+            'usuario': usuario,
+            'codigo': producto['code'],
+            'termino': producto['name'].split()[0],
+            'sesion_auditoria': sesion,
+        }
+
+    def _medir(self, casos, repeticiones, escala='actual'):
+        contexto = self._contexto()
+        cliente = Client(HTTP_HOST=_host())
+        cliente.force_login(contexto['usuario'])
+
+        self.stdout.write(
+            f'\n[{escala}] {"caso":<32} {"mediana ms":>10} {"min ms":>8} {"consultas":>9} '
+            f'{"memoria KB":>10} {"bytes":>10}'
+        )
+        medidas = {}
+        for nombre, metodo, url, preparar in casos:
+            def pedir(medir_memoria=False):
+                datos = preparar(contexto) if preparar else {'url': url(contexto)}
+                if medir_memoria:
+                    tracemalloc.start()
+                inicio = time.perf_counter()
+                with CaptureQueriesContext(connection) as consultas:
+                    response = getattr(cliente, metodo)(datos['url'])
+                    tamano = _tamano(response)
+                segundos = time.perf_counter() - inicio
+                pico = 0
+                if medir_memoria:
+                    pico = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                if response.status_code >= 400:
+                    raise CommandError(f'{nombre}: {datos["url"]} respondio {response.status_code}.')
+                return segundos, len(consultas), pico, tamano
+
+            pedir()  # calentamiento
+            tiempos = []
+            for _ in range(repeticiones):
+                segundos, cantidad_consultas, _, tamano = pedir()
+                tiempos.append(segundos * 1000)
+            # La memoria se mide aparte: tracemalloc hace mas lenta la peticion
+            _, _, pico, _ = pedir(medir_memoria=True)
+
+            medidas[nombre] = {
+                'mediana_ms': round(statistics.median(tiempos), 2),
+                'min_ms': round(min(tiempos), 2),
+                'max_ms': round(max(tiempos), 2),
+                'consultas': cantidad_consultas,
+                'memoria_pico_kb': round(pico / 1024, 1),
+                'bytes': tamano,
+            }
+            fila = medidas[nombre]
+            self.stdout.write(
+                f'[{escala}] {nombre:<32} {fila["mediana_ms"]:>10.1f} {fila["min_ms"]:>8.1f} '
+                f'{fila["consultas"]:>9} {fila["memoria_pico_kb"]:>10.0f} {fila["bytes"]:>10}'
+            )
+        cliente.logout()
+        return medidas
+
+    def _comparar(self, resultados, base, options):
+        """Muestra la variacion de cada medida y retorna la cantidad de regresiones"""
+        limites = [
+            ('mediana_ms', options['umbral_tiempo']),
+            ('memoria_pico_kb', options['umbral_memoria']),
+            ('bytes', options['umbral_bytes']),
+        ]
+        regresiones = 0
+        self.stdout.write(f'\nComparacion con {options["base"]}:')
+        for escala, medidas in resultados['escalas'].items():
+            anteriores = base.get('escalas', {}).get(escala, {})
+            for nombre, actual in medidas.items():
+                anterior = anteriores.get(nombre)
+                if anterior is None:
+                    continue
+                problemas = []
+                # Las consultas no dependen de la maquina: cualquier aumento es una regresion
+                if actual['consultas'] > anterior['consultas']:
+                    problemas.append(f'consultas {anterior["consultas"]} -> {actual["consultas"]}')
+                for medida, umbral in limites:
+                    if (
+                        anterior[medida]
+                        and actual[medida] > anterior[medida] * (1 + umbral)
+                        and actual[medida] - anterior[medida] > DIFERENCIA_MINIMA[medida]
+                    ):
+                        problemas.append(
+                            f'{medida} {anterior[medida]} -> {actual[medida]} '
+                            f'(+{(actual[medida] / anterior[medida] - 1) * 100:.0f}%)'
+                        )
+                variacion = (actual['mediana_ms'] / anterior['mediana_ms'] - 1) * 100 if anterior['mediana_ms'] else 0
+                if problemas:
+                    regresiones += 1
+                    self.stdout.write(self.style.ERROR(f'[{escala}] {nombre}: ' + '; '.join(problemas)))
+                else:
+                    self.stdout.write(f'[{escala}] {nombre}: ok ({variacion:+.0f}% tiempo)')
+        return regresiones
@@ -0,0 +1,63 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from inventario.models import Product, User
+from inventario.views.api import buscar_productos_lote, MAX_CODIGOS_BUSQUEDA
+
+
+class Command(BaseCommand):
+    help = 'Mide la busqueda de productos por lote (api/buscar-productos/) con la base de datos configurada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codigos', type=int, default=10000, help='Codigos por peticion (por defecto 10000)')
+        parser.add_argument('--faltantes', type=float, default=0.05, help='Proporcion de codigos inexistentes (por defecto 0.05)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Peticiones a medir (por defecto 5)')
+
+    def handle(self, *args, **options):
+        total = options['codigos']
+        if not 1 <= total <= MAX_CODIGOS_BUSQUEDA:
+            raise CommandError(f'--codigos debe estar entre 1 y {MAX_CODIGOS_BUSQUEDA}.')
+
+        usuario = User.objects.filter(is_active=True).order_by('pk').first()
+        if usuario is None:
+            raise CommandError('Se necesita al menos un usuario activo.')
+
+        faltantes = int(total * options['faltantes'])
+        existentes = list(Product.objects.order_by('?').values_list('code', flat=True)[:total - faltantes])
+        if not existentes:
+            raise CommandError('No hay productos en la base de datos.')
+        if len(existentes) < total - faltantes:
+            self.stderr.write(self.style.WARNING(
+                f'Solo hay {len(existentes)} productos; los codigos se repiten para llegar a {total}.'
+            ))
+        codigos = [existentes[i % len(existentes)] for i in range(total - faltantes)]
+        codigos += [f'NO-EXISTE-{i}' for i in range(faltantes)]
+        cuerpo = json.dumps({'codes': codigos})
+
+        factory = RequestFactory()
+        tiempos = []
+        for _ in range(options['repeticiones']):
+            request = factory.post('/api/buscar-productos/', cuerpo, content_type='application/json')
+            request.user = usuario
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                response = buscar_productos_lote(request)
+                tiempos.append(time.perf_counter() - inicio)
+            if response.status_code != 200:
+                raise CommandError(f'La busqueda respondio {response.status_code}: {response.content[:200]!r}')
+
+        datos = json.loads(response.content)
+        self.stdout.write(
+            f'Codigos por peticion: {total} ({datos["found"]} encontrados, {len(datos["missing"])} faltantes)\n'
+            f'Consultas por peticion: {len(consultas.captured_queries)}\n'
+            f'Respuesta: {len(response.content) / 1024:.0f} KB\n'
+            f'Tiempo (ms): media {statistics.mean(tiempos) * 1000:.1f}, '
+            f'min {min(tiempos) * 1000:.1f}, max {max(tiempos) * 1000:.1f}\n'
+            f'Codigos por segundo: {total / statistics.mean(tiempos):.0f}'
+        )
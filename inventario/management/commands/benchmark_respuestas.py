@@ -0,0 +1,120 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from inventario.compacto import TIPO_COMPACTO, TIPO_MSGPACK, conteo_compacto, msgpack
+from inventario.middleware import brotli
+from inventario.models import Product, User
+
+CODIFICACIONES = [
+    ('sin comprimir', 'identity'),
+    ('gzip', 'gzip'),
+]
+if brotli is not None:
+    CODIFICACIONES.append(('brotli', 'br, gzip'))
+
+FORMATOS_BUSQUEDA = [
+    ('json', 'application/json'),
+    ('compacto', TIPO_COMPACTO),
+]
+if msgpack is not None:
+    FORMATOS_BUSQUEDA.append(('msgpack', TIPO_MSGPACK))
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and not host.startswith('.') and host != '*':
+            return host
+    return 'localhost'
+
+
+def _bytes_en_linea(response):
+    """Tamano aproximado de la respuesta HTTP/1.1: linea de estado, encabezados y cuerpo"""
+    if response.streaming:
+        cuerpo = b''.join(response.streaming_content)
+    else:
+        cuerpo = response.content
+    encabezados = sum(len(f'{nombre}: {valor}\r\n') for nombre, valor in response.items())
+    return len(f'HTTP/1.1 {response.status_code} {response.reason_phrase}\r\n\r\n') + encabezados, len(cuerpo)
+
+
+class Command(BaseCommand):
+    help = 'Mide los bytes que viajan por la red por respuesta, con y sin compresion ni formato compacto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--codigos', type=int, default=200, help='Busquedas por codigo a promediar (por defecto 200)')
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(is_active=True).order_by('pk').first()
+        if usuario is None:
+            raise CommandError('Se necesita al menos un usuario activo.')
+        codigos = list(Product.objects.order_by('?').values_list('code', flat=True)[:options['codigos']])
+        if not codigos:
+            raise CommandError('No hay productos en la base de datos.')
+
+        cliente = Client(HTTP_HOST=_host())
+        cliente.force_login(usuario)
+        try:
+            self._tabla()
+            url = reverse('buscar_producto')
+            for formato, tipo in FORMATOS_BUSQUEDA:
+                for nombre, codificacion in CODIFICACIONES:
+                    medidas = [
+                        _bytes_en_linea(cliente.get(
+                            url, {'code': codigo}, HTTP_ACCEPT=tipo, HTTP_ACCEPT_ENCODING=codificacion
+                        ))
+                        for codigo in codigos
+                    ]
+                    encabezados = sum(m[0] for m in medidas) / len(medidas)
+                    cuerpo = sum(m[1] for m in medidas) / len(medidas)
+                    self._fila('buscar_producto (promedio)', formato, nombre, encabezados, cuerpo)
+
+            self._conteo()
+
+            for caso, url in [
+                ('producto_list (HTML)', reverse('producto_list')),
+                ('api/v1/productos limit=500', reverse('api_recurso', args=['productos']) + '?limit=500'),
+            ]:
+                for nombre, codificacion in CODIFICACIONES:
+                    response = cliente.get(url, HTTP_ACCEPT_ENCODING=codificacion)
+                    if response.status_code != 200:
+                        raise CommandError(f'{url} respondio {response.status_code}.')
+                    self._fila(caso, 'json' if 'api' in caso else 'html', nombre, *_bytes_en_linea(response))
+        finally:
+            cliente.logout()
+
+    def _conteo(self):
+        """El registro de conteos escribe en la base de datos: se compara el cuerpo de una respuesta tipica"""
+        producto = Product.objects.values('code', 'name', 'unit', 'stock_actual').first()
+        datos = {
+            'success': True,
+            'message': f'Conteo registrado para "{producto["name"]}"',
+            'data': {
+                'product_name': producto['name'],
+                'product_code': producto['code'],
+                'stock_sistema': producto['stock_actual'],
+                'cantidad_contada': producto['stock_actual'] + 3,
+                'diferencia': 3,
+                'unit': producto['unit'],
+                'conteo_id': 123456,
+                'total_productos': 1500,
+                'productos_con_diferencia': 42,
+            },
+        }
+        self._fila('registrar_conteo (cuerpo)', 'json', 'sin comprimir', 0, len(json.dumps(datos)))
+        compacto = conteo_compacto(datos)
+        self._fila('registrar_conteo (cuerpo)', 'compacto', 'sin comprimir', 0,
+                   len(json.dumps(compacto, separators=(',', ':'), ensure_ascii=False).encode()))
+        if msgpack is not None:
+            self._fila('registrar_conteo (cuerpo)', 'msgpack', 'sin comprimir', 0, len(msgpack.packb(compacto)))
+
+    def _tabla(self):
+        self.stdout.write(f'{"caso":<28} {"formato":<9} {"codificacion":<14} {"encabezados":>11} {"cuerpo":>9} {"total":>9}')
+
+    def _fila(self, caso, formato, codificacion, encabezados, cuerpo):
+        self.stdout.write(
+            f'{caso:<28} {formato:<9} {codificacion:<14} {encabezados:>11.0f} {cuerpo:>9.0f} {encabezados + cuerpo:>9.0f}'
+        )
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+
+from inventario.models import Product, Provider, Entrada, Salida, InventoryAdjustment, InventarioSesion
+
+from .prueba_carga import Conexion, ErrorHTTP, iniciar_sesion, percentiles
+
+OPERACIONES = ('buscar', 'entrada', 'salida', 'conteo')
+MEZCLA = 'buscar=60,entrada=15,salida=15,conteo=10'
+TAMANO_BLOQUE = 500
+
+
+def _mezcla(texto):
+    """'buscar=60,entrada=15' -> {'buscar': 60, 'entrada': 15}"""
+    pesos = {}
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if nombre not in OPERACIONES:
+            raise CommandError(f'Operacion desconocida en --mezcla: "{nombre}". Opciones: {", ".join(OPERACIONES)}.')
+        try:
+            pesos[nombre] = int(peso)
+        except ValueError:
+            raise CommandError(f'El peso de "{nombre}" en --mezcla debe ser un entero.')
+    if sum(pesos.values()) <= 0:
+        raise CommandError('--mezcla debe tener al menos una operacion con peso mayor a cero.')
+    return {nombre: peso for nombre, peso in pesos.items() if peso > 0}
+
+
+def _total(modelo, campo):
+    return Coalesce(
+        Subquery(
+            modelo.objects.filter(product=OuterRef('pk'))
+            .order_by().values('product').annotate(total=Sum(campo)).values('total')
+        ),
+        Value(0),
+    )
+
+
+def descuadres(ids):
+    """{product_id: stock_actual - (entradas - salidas + ajustes)}; cero si el stock cuadra"""
+    resultado = {}
+    for inicio in range(0, len(ids), TAMANO_BLOQUE):
+        filas = Product.objects.filter(pk__in=ids[inicio:inicio + TAMANO_BLOQUE]).annotate(
+            entradas=_total(Entrada, 'quantity'),
+            salidas=_total(Salida, 'quantity'),
+            ajustes=_total(InventoryAdjustment, 'difference'),
+        ).values_list('pk', 'stock_actual', 'entradas', 'salidas', 'ajustes')
+        for pk, stock, entradas, salidas, ajustes in filas:
+            resultado[pk] = stock - (entradas - salidas + ajustes)
+    return resultado
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga mixta de escaneres y almacenistas contra el servidor corriendo: busquedas, entradas, '
+        'salidas y conteos a la vez. Mide latencia y rendimiento y al final verifica que el stock de '
+        'cada producto sea igual a la suma de sus movimientos. Debe usar la misma base de datos que el servidor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--usuario', required=True, help='Usuario para iniciar sesion')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--mezcla', default=MEZCLA, help=f'Peso de cada operacion (por defecto {MEZCLA})')
+        parser.add_argument('--sesion', type=int, help='Sesion de inventario en proceso (requerida si hay conteos)')
+        parser.add_argument('--proveedor', type=int, help='Proveedor de las entradas (por defecto el primero activo)')
+        parser.add_argument('--concurrencia', default='1,10,50', help='Niveles de concurrencia separados por coma')
+        parser.add_argument('--peticiones', type=int, default=2000, help='Peticiones por nivel (por defecto 2000)')
+        parser.add_argument('--codigos', type=int, default=50,
+                            help='Productos distintos (por defecto 50; pocos productos fuerzan escrituras simultaneas)')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            niveles = [int(nivel) for nivel in options['concurrencia'].split(',') if nivel.strip()]
+        except ValueError:
+            raise CommandError('--concurrencia debe ser una lista de enteros, por ejemplo 1,10,50.')
+        if not niveles or min(niveles) < 1:
+            raise CommandError('--concurrencia debe tener niveles mayores a cero.')
+
+        mezcla = _mezcla(options['mezcla'])
+        if 'conteo' in mezcla:
+            if options['sesion'] is None:
+                raise CommandError('--sesion es requerida si la mezcla tiene conteos.')
+            if not InventarioSesion.objects.filter(pk=options['sesion'], status='en_proceso').exists():
+                raise CommandError('La sesion indicada no existe o no esta en proceso.')
+
+        proveedores = Provider.objects.filter(status='active').order_by('pk')
+        if options['proveedor'] is not None:
+            proveedores = proveedores.filter(pk=options['proveedor'])
+        proveedor = proveedores.values_list('pk', flat=True).first()
+        if 'entrada' in mezcla and proveedor is None:
+            raise CommandError('No hay un proveedor activo para las entradas.')
+
+        productos = list(
+            Product.objects.filter(status='active').order_by('?').values_list('pk', 'code')[:options['codigos']]
+        )
+        if not productos:
+            raise CommandError('No hay productos activos en la base de datos.')
+        ids = [pk for pk, _ in productos]
+
+        rutas = {
+            'buscar': reverse('buscar_producto'),
+            'entrada': reverse('entrada_registrar'),
+            'salida': reverse('salida_registrar'),
+        }
+        if 'conteo' in mezcla:
+            rutas['conteo'] = reverse('inventario_registrar_conteo', args=[options['sesion']])
+
+        antes = descuadres(ids)
+        entradas_antes = Entrada.objects.filter(product__in=ids).count()
+        salidas_antes = Salida.objects.filter(product__in=ids).count()
+        aceptadas = Counter()
+
+        self.stdout.write(
+            f'Mezcla: {", ".join(f"{nombre}={peso}" for nombre, peso in mezcla.items())} - '
+            f'{options["peticiones"]} peticiones por nivel sobre {len(productos)} productos'
+        )
+        self.stdout.write(
+            f'{"conc.":>6} {"operacion":<10} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+            f'{"max ms":>8} {"rechazos":>9} {"errores":>8}'
+        )
+        for nivel in niveles:
+            resultado = asyncio.run(self._medir(
+                options, rutas, mezcla, productos, proveedor, nivel, random.Random(options['semilla'] + nivel)
+            ))
+            for operacion in ['total'] + list(mezcla):
+                medida = resultado[operacion]
+                self.stdout.write(
+                    f'{nivel:>6} {operacion:<10} {medida["rps"]:>9.0f} {medida["p50"]:>8.1f} {medida["p95"]:>8.1f} '
+                    f'{medida["p99"]:>8.1f} {medida["max"]:>8.1f} {medida["rechazos"]:>9} {medida["errores"]:>8}'
+                )
+            aceptadas.update(resultado['aceptadas'])
+
+        self._verificar(ids, antes, aceptadas, entradas_antes, salidas_antes)
+
+    def _verificar(self, ids, antes, aceptadas, entradas_antes, salidas_antes):
+        """Compara el stock con los movimientos; falla si la carga dejo algun producto descuadrado"""
+        despues = descuadres(ids)
+        descuadrados = {pk: despues[pk] - antes.get(pk, 0) for pk in despues if despues[pk] != antes.get(pk, 0)}
+        negativos = Product.objects.filter(pk__in=ids, stock_actual__lt=0).count()
+        entradas = Entrada.objects.filter(product__in=ids).count() - entradas_antes
+        salidas = Salida.objects.filter(product__in=ids).count() - salidas_antes
+
+        self.stdout.write('')
+        self.stdout.write(f'Entradas aceptadas: {aceptadas["entrada"]} - registradas: {entradas}')
+        self.stdout.write(f'Salidas aceptadas: {aceptadas["salida"]} - registradas: {salidas}')
+        previos = sum(1 for pk in antes if antes[pk])
+        if previos:
+            self.stdout.write(self.style.WARNING(
+                f'{previos} producto(s) ya estaban descuadrados antes de la prueba; se compara contra ese valor.'
+            ))
+
+        problemas = []
+        if descuadrados:
+            codigos = dict(Product.objects.filter(pk__in=descuadrados).values_list('pk', 'code'))
+            for pk, diferencia in sorted(descuadrados.items())[:20]:
+                self.stdout.write(f'  {codigos[pk]}: el stock difiere de los movimientos en {diferencia:+d}')
+            problemas.append(f'{len(descuadrados)} producto(s) con stock distinto a la suma de sus movimientos')
+        if negativos:
+            problemas.append(f'{negativos} producto(s) con stock negativo')
+        if entradas != aceptadas['entrada'] or salidas != aceptadas['salida']:
+            problemas.append('los movimientos registrados no coinciden con las respuestas aceptadas')
+        if problemas:
+            raise CommandError('Stock incorrecto despues de la carga: ' + '; '.join(problemas) + '.')
+        self.stdout.write(self.style.SUCCESS(f'Stock correcto en los {len(ids)} productos.'))
+
+    async def _medir(self, options, rutas, mezcla, productos, proveedor, concurrencia, aleatorio):
+        partes = urlsplit(options['url'])
+        host, puerto = partes.hostname, partes.port or 80
+        cookies = await iniciar_sesion(host, puerto, options['usuario'], options['password'])
+        cabeceras = {'X-CSRFToken': cookies['csrftoken']}
+
+        operaciones = list(mezcla)
+        pesos = [mezcla[operacion] for operacion in operaciones]
+        pendientes = options['peticiones']
+        tiempos = defaultdict(list)
+        rechazos = Counter()
+        errores = Counter()
+        aceptadas = Counter()
+
+        def peticion():
+            operacion = aleatorio.choices(operaciones, pesos)[0]
+            _, code = aleatorio.choice(productos)
+            if operacion == 'buscar':
+                return operacion, 'GET', f'{rutas[operacion]}?{urlencode({"code": code})}', None
+            if operacion == 'entrada':
+                datos = {
+                    'product_code': code, 'provider': proveedor,
+                    'quantity': aleatorio.randint(1, 10), 'total_cost': '10.00',
+                }
+            elif operacion == 'salida':
+                datos = {
+                    'product_code': code, 'receptor': 'Prueba de carga',
+                    'quantity': aleatorio.randint(1, 5), 'motivo': 'Prueba de carga',
+                }
+            else:
+                datos = {'product_code': code, 'cantidad': aleatorio.randint(0, 50)}
+            return operacion, 'POST', rutas[operacion], datos
+
+        def clasificar(operacion, codigo, contenido):
+            """'ok', 'rechazo' (la vista nego la operacion, p. ej. sin stock) o 'error'"""
+            if operacion in ('entrada', 'salida'):
+                # Exito redirige al historial; el formulario con errores responde 200
+                return {302: 'ok', 200: 'rechazo'}.get(codigo, 'error')
+            if codigo != 200:
+                return 'error'
+            try:
+                datos = json.loads(contenido)
+            except ValueError:
+                return 'error'
+            # La busqueda responde `found`; el conteo, `success`
+            return 'ok' if datos.get('success', datos.get('found')) else 'rechazo'
+
+        async def trabajador():
+            nonlocal pendientes
+            conexion = Conexion(host, puerto, dict(cookies))
+            try:
+                while pendientes > 0:
+                    pendientes -= 1
+                    operacion, metodo, destino, datos = peticion()
+                    inicio = time.perf_counter()
+                    try:
+                        codigo, contenido = await conexion.pedir(metodo, destino, datos, cabeceras)
+                    except (OSError, ErrorHTTP, asyncio.IncompleteReadError):
+                        errores[operacion] += 1
+                        await conexion.cerrar()
+                        continue
+                    tiempos[operacion].append(time.perf_counter() - inicio)
+                    # El navegador leeria el mensaje al seguir la redireccion; si se
+                    # reenvia, la cookie crece con cada peticion
+                    conexion.cookies.pop('messages', None)
+                    estado = clasificar(operacion, codigo, contenido)
+                    if estado == 'ok':
+                        aceptadas[operacion] += 1
+                    elif estado == 'rechazo':
+                        rechazos[operacion] += 1
+                    else:
+                        errores[operacion] += 1
+            finally:
+                await conexion.cerrar()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+        resultado = {'aceptadas': aceptadas}
+        for operacion in operaciones:
+            resultado[operacion] = {
+                'rps': len(tiempos[operacion]) / duracion if duracion else 0,
+                'rechazos': rechazos[operacion],
+                'errores': errores[operacion],
+                **percentiles(tiempos[operacion]),
+            }
+        todos = [tiempo for lista in tiempos.values() for tiempo in lista]
+        resultado['total'] = {
+            'rps': len(todos) / duracion if duracion else 0,
+            'rechazos': sum(rechazos.values()),
+            'errores': sum(errores.values()),
+            **percentiles(todos),
+        }
+        return resultado
@@ -0,0 +1,383 @@
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventario.models import (
+    User,
+    Category,
+    Provider,
+    Product,
+    Entrada,
+    Salida,
+    InventarioSesion,
+    DetalleConteo,
+)
+from inventario.resumen import reconstruir, TAMANO_BLOQUE as BLOQUE_RESUMEN
+from inventario.versiones import invalidar
+
+# Prefijo de los registros generados; sirve para reconocerlos y no mezclarlos
+PREFIJO = 'GEN'
+
+ESCALAS = {
+    '1k': {
+        'movimientos': 1_000,
+        'productos': 200,
+        'categorias': 10,
+        'proveedores': 10,
+        'usuarios': 5,
+        'sesiones': 2,
+    },
+    '100k': {
+        'movimientos': 100_000,
+        'productos': 5_000,
+        'categorias': 30,
+        'proveedores': 50,
+        'usuarios': 20,
+        'sesiones': 10,
+    },
+    '1m': {
+        'movimientos': 1_000_000,
+        'productos': 20_000,
+        'categorias': 60,
+        'proveedores': 200,
+        'usuarios': 50,
+        'sesiones': 30,
+    },
+}
+
+# Fraccion de los movimientos que son entradas; el resto son salidas
+FRACCION_ENTRADAS = 0.6
+LINEAS_POR_ENTREGA = (1, 10)
+# Probabilidad de que el siguiente movimiento sea una entrega: cada entrega
+# trae varias lineas, asi que se elige menos que una salida
+PROBABILIDAD_ENTREGA = FRACCION_ENTRADAS / (
+    FRACCION_ENTRADAS + (1 - FRACCION_ENTRADAS) * sum(LINEAS_POR_ENTREGA) / 2
+)
+
+NOMBRES = (
+    'Tornillo', 'Tuerca', 'Arandela', 'Cable', 'Tubo', 'Valvula', 'Filtro', 'Rodamiento',
+    'Correa', 'Guante', 'Casco', 'Cinta', 'Pintura', 'Brocha', 'Lija', 'Manguera',
+    'Conector', 'Interruptor', 'Bombillo', 'Fusible', 'Sello', 'Empacadura', 'Grasa', 'Aceite',
+)
+VARIANTES = (
+    'galvanizado', 'inoxidable', 'de cobre', 'de PVC', 'reforzado', 'industrial',
+    'de alta presion', 'estandar', 'premium', 'economico',
+)
+MEDIDAS = ('1/4"', '3/8"', '1/2"', '3/4"', '1"', '2"', '10 mm', '20 mm', '1 m', '5 m', '20 L', '1 kg')
+UNIDADES = ('unidad', 'caja', 'paquete', 'metro', 'litro', 'kg', 'rollo', 'par')
+AREAS = ('Mantenimiento', 'Produccion', 'Almacen', 'Calidad', 'Administracion', 'Seguridad', 'Taller')
+MOTIVOS = ('Reposicion de linea', 'Mantenimiento preventivo', 'Reparacion', 'Consumo interno', 'Proyecto')
+ROLES = ('almacen', 'almacen', 'compras', 'ventas', 'admin')
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos de prueba (categorias, proveedores, usuarios, productos, '
+        'historial de entradas y salidas y sesiones de conteo) a una escala fija'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escala',
+            choices=ESCALAS,
+            default='1k',
+            help='Cantidad de movimientos: 1k, 100k o 1m (por defecto 1k)',
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=42,
+            help='Semilla del generador; la misma semilla genera los mismos datos (por defecto 42)',
+        )
+        parser.add_argument(
+            '--anios',
+            type=int,
+            default=3,
+            help='Anios de historial de movimientos (por defecto 3)',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            help='Ultimo dia del historial, AAAA-MM-DD (por defecto hoy)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=5000,
+            help='Filas por bulk_create (por defecto 5000)',
+        )
+
+    def handle(self, *args, **options):
+        if Product.objects.filter(code__startswith=f'{PREFIJO}-').exists():
+            raise CommandError(
+                'La base de datos ya tiene datos generados. Use una base de datos nueva '
+                '(por ejemplo con "python manage.py flush").'
+            )
+        if options['anios'] < 1 or options['lote'] < 1:
+            raise CommandError('--anios y --lote deben ser mayores a cero.')
+
+        self.escala = ESCALAS[options['escala']]
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.hasta = options['hasta'] or timezone.localdate()
+        self.desde = self.hasta - timedelta(days=365 * options['anios'] - 1)
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            categorias = self._categorias()
+            proveedores = self._proveedores()
+            usuarios = self._usuarios()
+            productos = self._productos(categorias)
+        self._paso('Catalogo', inicio)
+
+        paso = time.perf_counter()
+        entradas, salidas = self._movimientos(productos, proveedores, usuarios)
+        self._paso(f'Movimientos ({entradas} entradas, {salidas} salidas)', paso)
+
+        paso = time.perf_counter()
+        self._recalcular_stock()
+        self._paso('Stock', paso)
+
+        paso = time.perf_counter()
+        conteos = self._sesiones(productos, usuarios)
+        self._paso(f'Sesiones de conteo ({conteos} conteos)', paso)
+
+        paso = time.perf_counter()
+        ids = sorted(productos)
+        for i in range(0, len(ids), BLOQUE_RESUMEN):
+            reconstruir(ids[i:i + BLOQUE_RESUMEN])
+        self._paso('Resumenes de productos', paso)
+
+        invalidar('productos', 'categorias', 'proveedores', 'entradas')
+        self.stdout.write(self.style.SUCCESS(
+            f'Datos generados en {time.perf_counter() - inicio:.1f} s '
+            f'(escala {options["escala"]}, semilla {options["semilla"]}).'
+        ))
+
+    def _paso(self, nombre, inicio):
+        self.stdout.write(f'{nombre}: {time.perf_counter() - inicio:.1f} s')
+
+    def _fecha(self, dia, hora=None):
+        """Fecha con hora laboral al azar del dia indicado"""
+        if hora is None:
+            hora = dt_time(self.azar.randint(7, 17), self.azar.randint(0, 59), self.azar.randint(0, 59))
+        return timezone.make_aware(datetime.combine(dia, hora))
+
+    @staticmethod
+    def _ids(registros):
+        # MySQL no devuelve los ids de bulk_create: se leen en el orden de creacion
+        return list(registros.order_by('pk').values_list('pk', flat=True))
+
+    def _categorias(self):
+        Category.objects.bulk_create([
+            Category(
+                name=f'{PREFIJO} {nombre} {numero // len(NOMBRES) + 1}',
+                description='Categoria generada',
+            )
+            for numero, nombre in (
+                (i, NOMBRES[i % len(NOMBRES)]) for i in range(self.escala['categorias'])
+            )
+        ], batch_size=self.lote)
+        return self._ids(Category.objects.filter(name__startswith=f'{PREFIJO} '))
+
+    def _proveedores(self):
+        Provider.objects.bulk_create([
+            Provider(
+                name=f'{PREFIJO} Suministros {i + 1}',
+                rif=f'{PREFIJO}-{i + 1:08d}',
+                phone=f'0212{self.azar.randint(1000000, 9999999)}',
+                email=f'ventas{i + 1}@proveedor.test',
+                contact_name=f'Contacto {i + 1}',
+                status='active' if self.azar.random() < 0.9 else 'inactive',
+            )
+            for i in range(self.escala['proveedores'])
+        ], batch_size=self.lote)
+        return self._ids(Provider.objects.filter(rif__startswith=f'{PREFIJO}-'))
+
+    def _usuarios(self):
+        usuarios = []
+        for i in range(self.escala['usuarios']):
+            usuario = User(
+                username=f'{PREFIJO.lower()}_usuario{i + 1}',
+                first_name='Usuario',
+                last_name=str(i + 1),
+                role=ROLES[i % len(ROLES)],
+            )
+            usuario.set_unusable_password()
+            usuarios.append(usuario)
+        User.objects.bulk_create(usuarios, batch_size=self.lote)
+        return self._ids(User.objects.filter(username__startswith=f'{PREFIJO.lower()}_'))
+
+    def _productos(self, categorias):
+        """Crea los productos; retorna {pk: costo unitario}"""
+        productos = []
+        costos = []
+        for i in range(self.escala['productos']):
+            productos.append(Product(
+                code=f'{PREFIJO}-{i + 1:06d}',
+                name=' '.join((
+                    self.azar.choice(NOMBRES),
+                    self.azar.choice(VARIANTES),
+                    self.azar.choice(MEDIDAS),
+                )),
+                unit=self.azar.choice(UNIDADES),
+                min_stock=self.azar.choice((0, 5, 10, 20, 50)),
+                category_id=self.azar.choice(categorias),
+                location=f'Pasillo {self.azar.randint(1, 20)} - Estante {self.azar.randint(1, 10)}',
+                status='active' if self.azar.random() < 0.95 else 'inactive',
+            ))
+            costos.append(Decimal(self.azar.randint(50, 50000)) / 100)
+        Product.objects.bulk_create(productos, batch_size=self.lote)
+        return dict(zip(self._ids(Product.objects.filter(code__startswith=f'{PREFIJO}-')), costos))
+
+    def _movimientos(self, productos, proveedores, usuarios):
+        """
+        Crea el historial dia por dia, en orden cronologico, con bulk_create:
+        no pasa por Entrada.save ni Salida.save, el stock se recalcula al final.
+        """
+        ids = list(productos)
+        # Stock que se lleva al generar, para que las salidas no lo dejen negativo
+        stock = dict.fromkeys(ids, 0)
+        dias = (self.hasta - self.desde).days + 1
+        total = self.escala['movimientos']
+        entradas, salidas = [], []
+        creadas = {'entradas': 0, 'salidas': 0}
+
+        def guardar(forzar=False):
+            if entradas and (forzar or len(entradas) >= self.lote):
+                Entrada.objects.bulk_create(entradas, batch_size=self.lote)
+                creadas['entradas'] += len(entradas)
+                entradas.clear()
+            if salidas and (forzar or len(salidas) >= self.lote):
+                Salida.objects.bulk_create(salidas, batch_size=self.lote)
+                creadas['salidas'] += len(salidas)
+                salidas.clear()
+
+        generados = 0
+        for numero_dia in range(dias):
+            dia = self.desde + timedelta(days=numero_dia)
+            # Reparte los movimientos en partes iguales por dia
+            del_dia = (total * (numero_dia + 1)) // dias - generados
+            generados += del_dia
+
+            movimientos = []
+            pendientes = del_dia
+            while pendientes > 0:
+                if self.azar.random() < PROBABILIDAD_ENTREGA:
+                    # Una entrega: varias lineas del mismo proveedor con la misma fecha
+                    lineas = min(pendientes, self.azar.randint(*LINEAS_POR_ENTREGA))
+                    fecha = self._fecha(dia)
+                    proveedor = self.azar.choice(proveedores)
+                    usuario = self.azar.choice(usuarios)
+                    for product_id in self.azar.sample(ids, min(lineas, len(ids))):
+                        cantidad = self.azar.randint(10, 200)
+                        stock[product_id] += cantidad
+                        movimientos.append((fecha, Entrada(
+                            product_id=product_id,
+                            provider_id=proveedor,
+                            user_id=usuario,
+                            quantity=cantidad,
+                            total_cost=productos[product_id] * cantidad,
+                            created_at=fecha,
+                            updated_at=fecha,
+                        )))
+                    pendientes -= lineas
+                else:
+                    product_id = self.azar.choice(ids)
+                    cantidad = min(self.azar.randint(1, 40), stock[product_id])
+                    if not cantidad:
+                        continue
+                    stock[product_id] -= cantidad
+                    fecha = self._fecha(dia)
+                    movimientos.append((fecha, Salida(
+                        product_id=product_id,
+                        user_id=self.azar.choice(usuarios),
+                        receptor=self.azar.choice(AREAS),
+                        quantity=cantidad,
+                        motivo=self.azar.choice(MOTIVOS),
+                        created_at=fecha,
+                        updated_at=fecha,
+                    )))
+                    pendientes -= 1
+
+            # Los ids siguen el orden de las fechas, como en el sistema real
+            movimientos.sort(key=lambda movimiento: movimiento[0])
+            for _, movimiento in movimientos:
+                (entradas if isinstance(movimiento, Entrada) else salidas).append(movimiento)
+            guardar()
+
+        guardar(forzar=True)
+        return creadas['entradas'], creadas['salidas']
+
+    def _recalcular_stock(self):
+        """stock_actual = entradas - salidas, con un UPDATE por bloque de productos"""
+        def total(modelo):
+            return Coalesce(
+                Subquery(
+                    modelo.objects.filter(product=OuterRef('pk'))
+                    .order_by().values('product').annotate(total=Sum('quantity')).values('total')
+                ),
+                Value(0),
+            )
+
+        ids = list(
+            Product.objects.filter(code__startswith=f'{PREFIJO}-').order_by('pk').values_list('pk', flat=True)
+        )
+        for i in range(0, len(ids), self.lote):
+            Product.objects.filter(pk__in=ids[i:i + self.lote]).update(
+                stock_actual=total(Entrada) - total(Salida)
+            )
+
+    def _sesiones(self, productos, usuarios):
+        """Sesiones de conteo conciliadas repartidas en el historial, cada una sobre una muestra de productos"""
+        ids = list(productos)
+        dias = (self.hasta - self.desde).days
+        cantidad = self.escala['sesiones']
+        conteos_creados = 0
+
+        for numero in range(cantidad):
+            dia = self.desde + timedelta(days=dias * (numero + 1) // (cantidad + 1))
+            fecha = self._fecha(dia, dt_time(8, 0))
+            muestra = self.azar.sample(ids, max(1, len(ids) // 10))
+
+            with transaction.atomic():
+                sesion = InventarioSesion.objects.create(
+                    user_id=self.azar.choice(usuarios),
+                    status='conciliado',
+                    notas='Sesion generada',
+                    created_at=fecha,
+                    finished_at=fecha + timedelta(hours=6),
+                    conciliated_at=fecha + timedelta(hours=7),
+                )
+                conteos = []
+                con_diferencia = 0
+                for product_id in muestra:
+                    stock_sistema = self.azar.randint(0, 500)
+                    diferencia = 0 if self.azar.random() < 0.8 else self.azar.randint(-5, 5)
+                    cantidad_contada = max(stock_sistema + diferencia, 0)
+                    diferencia = cantidad_contada - stock_sistema
+                    con_diferencia += int(diferencia != 0)
+                    conteos.append(DetalleConteo(
+                        sesion=sesion,
+                        product_id=product_id,
+                        stock_sistema=stock_sistema,
+                        cantidad_contada=cantidad_contada,
+                        diferencia=diferencia,
+                        created_at=fecha,
+                        updated_at=fecha + timedelta(hours=self.azar.randint(0, 5)),
+                    ))
+                DetalleConteo.objects.bulk_create(conteos, batch_size=self.lote)
+                InventarioSesion.objects.filter(pk=sesion.pk).update(
+                    total_productos=len(conteos),
+                    productos_con_diferencia=con_diferencia,
+                )
+            conteos_creados += len(conteos)
+
+        return conteos_creados
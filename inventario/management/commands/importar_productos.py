@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.importacion import importar_catalogo, ArchivoInvalido, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza el catalogo de productos desde un archivo CSV/XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument(
+            '--crear-categorias',
+            action='store_true',
+            help='Crear las categorias que no existan',
+        )
+        parser.add_argument(
+            '--solo-nuevos',
+            action='store_true',
+            help='No actualizar los productos existentes; se reportan como error',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE,
+            help=f'Filas por lote (por defecto {TAMANO_LOTE})',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resultado = importar_catalogo(
+                options['archivo'],
+                crear_categorias=options['crear_categorias'],
+                solo_nuevos=options['solo_nuevos'],
+                tamano_lote=options['lote'],
+                max_errores=None,
+            )
+        except (ArchivoInvalido, OSError) as e:
+            raise CommandError(str(e))
+
+        for numero, mensaje in resultado['errores']:
+            self.stderr.write(f'Fila {numero}: {mensaje}')
+
+        self.stdout.write(
+            f'Filas leidas: {resultado["filas"]}\n'
+            f'Creados: {resultado["creados"]}\n'
+            f'Actualizados: {resultado["actualizados"]}\n'
+            f'Con errores: {resultado["invalidas"]}\n'
+            f'Tiempo: {resultado["segundos"]:.2f} s ({resultado["filas_por_segundo"]:.0f} filas/s)'
+        )
+        estilo = self.style.WARNING if resultado['invalidas'] else self.style.SUCCESS
+        self.stdout.write(estilo('Importacion completada.'))
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.models import Product, InventarioSesion
+
+# Pares (sincrona, asincrona) de cada endpoint; {sesion} se reemplaza por el id
+ENDPOINTS = {
+    'buscar': ('/api/buscar-producto/', '/api/async/buscar-producto/'),
+    'autocompletar': ('/api/buscar-productos-autocomplete/', '/api/async/buscar-productos-autocomplete/'),
+    'conteo': ('/inventario-fisico/{sesion}/registrar/', '/inventario-fisico/{sesion}/registrar-async/'),
+}
+
+
+class ErrorHTTP(Exception):
+    pass
+
+
+class Conexion:
+    """Conexion HTTP/1.1 persistente minima, suficiente para medir las vistas JSON"""
+
+    def __init__(self, host, puerto, cookies):
+        self.host = host
+        self.puerto = puerto
+        self.cookies = cookies
+        self.lector = None
+        self.escritor = None
+
+    async def abrir(self):
+        self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+
+    async def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            try:
+                await self.escritor.wait_closed()
+            except OSError:
+                pass
+            self.escritor = None
+
+    async def pedir(self, metodo, ruta, datos=None, cabeceras=None):
+        if self.escritor is None:
+            await self.abrir()
+
+        cuerpo = urlencode(datos).encode() if datos is not None else b''
+        lineas = [
+            f'{metodo} {ruta} HTTP/1.1',
+            f'Host: {self.host}:{self.puerto}',
+            'Connection: keep-alive',
+            f'Content-Length: {len(cuerpo)}',
+        ]
+        if datos is not None:
+            lineas.append('Content-Type: application/x-www-form-urlencoded')
+        if self.cookies:
+            lineas.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        for nombre, valor in (cabeceras or {}).items():
+            lineas.append(f'{nombre}: {valor}')
+        self.escritor.write(('\r\n'.join(lineas) + '\r\n\r\n').encode() + cuerpo)
+        await self.escritor.drain()
+
+        estado = await self.lector.readline()
+        if not estado:
+            raise ErrorHTTP('El servidor cerro la conexion')
+        codigo = int(estado.split()[1])
+
+        encabezados = []
+        while True:
+            linea = await self.lector.readline()
+            if linea in (b'\r\n', b'\n', b''):
+                break
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            encabezados.append((nombre.strip().lower(), valor.strip()))
+
+        longitud = None
+        fragmentado = False
+        cerrar = False
+        for nombre, valor in encabezados:
+            if nombre == 'content-length':
+                longitud = int(valor)
+            elif nombre == 'transfer-encoding' and 'chunked' in valor.lower():
+                fragmentado = True
+            elif nombre == 'connection' and valor.lower() == 'close':
+                cerrar = True
+            elif nombre == 'set-cookie':
+                galleta = SimpleCookie(valor)
+                for clave, morsel in galleta.items():
+                    self.cookies[clave] = morsel.value
+
+        if fragmentado:
+            partes = []
+            while True:
+                tamano = int((await self.lector.readline()).split(b';')[0], 16)
+                if tamano == 0:
+                    await self.lector.readline()
+                    break
+                partes.append(await self.lector.readexactly(tamano))
+                await self.lector.readline()
+            contenido = b''.join(partes)
+        elif longitud is not None:
+            contenido = await self.lector.readexactly(longitud)
+        else:
+            contenido = await self.lector.read()
+            cerrar = True
+
+        if cerrar:
+            await self.cerrar()
+        return codigo, contenido
+
+
+async def iniciar_sesion(host, puerto, usuario, password):
+    """Inicia sesion como lo haria el navegador y retorna las cookies"""
+    conexion = Conexion(host, puerto, {})
+    try:
+        await conexion.pedir('GET', '/login/')
+        if 'csrftoken' not in conexion.cookies:
+            raise CommandError('El servidor no entrego la cookie csrftoken.')
+        codigo, _ = await conexion.pedir('POST', '/login/', {
+            'csrfmiddlewaretoken': conexion.cookies['csrftoken'],
+            'username': usuario,
+            'password': password,
+        })
+    finally:
+        await conexion.cerrar()
+    if codigo != 302 or 'sessionid' not in conexion.cookies:
+        raise CommandError('No se pudo iniciar sesion con el usuario indicado.')
+    return conexion.cookies
+
+
+def percentiles(tiempos):
+    """p50, p95, p99 y maximo en milisegundos de una lista de segundos"""
+    if len(tiempos) >= 2:
+        cortes = statistics.quantiles(tiempos, n=100, method='inclusive')
+    else:
+        cortes = [tiempos[0] if tiempos else 0.0] * 99
+    return {
+        'p50': cortes[49] * 1000,
+        'p95': cortes[94] * 1000,
+        'p99': cortes[98] * 1000,
+        'max': max(tiempos, default=0) * 1000,
+    }
+
+
+def _variacion(actual, anterior):
+    if not anterior:
+        return '-'
+    return f'{(actual / anterior - 1) * 100:+.0f}%'
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de las vistas de escaneo sincronas contra las asincronas, o de una '
+        'configuracion del servidor contra otra con --salida y --base. '
+        'El servidor debe estar corriendo (por ejemplo uvicorn core.asgi:application).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor de las vistas asincronas')
+        parser.add_argument('--url-sync', help='Servidor de las vistas sincronas (por defecto el mismo de --url)')
+        parser.add_argument('--usuario', required=True, help='Usuario para iniciar sesion')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='buscar')
+        parser.add_argument('--sesion', type=int, help='Sesion de inventario en proceso (requerida para conteo)')
+        parser.add_argument('--concurrencia', default='1,10,50,100', help='Niveles de concurrencia separados por coma')
+        parser.add_argument('--peticiones', type=int, default=2000, help='Peticiones por nivel (por defecto 2000)')
+        parser.add_argument('--codigos', type=int, default=500, help='Codigos distintos a consultar (por defecto 500)')
+        parser.add_argument('--modos', default='sync,async', help='Vistas a medir: sync, async o ambas (por defecto sync,async)')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument(
+            '--base',
+            help='Archivo JSON de una medicion anterior, por ejemplo con otra configuracion de conexiones; '
+                 'muestra la variacion del p50 y p95',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            niveles = [int(nivel) for nivel in options['concurrencia'].split(',') if nivel.strip()]
+        except ValueError:
+            raise CommandError('--concurrencia debe ser una lista de enteros, por ejemplo 1,10,50.')
+        if not niveles or min(niveles) < 1:
+            raise CommandError('--concurrencia debe tener niveles mayores a cero.')
+        modos = [modo.strip() for modo in options['modos'].split(',') if modo.strip()]
+        if not modos or set(modos) - {'sync', 'async'}:
+            raise CommandError('--modos debe ser sync, async o sync,async.')
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer la medicion base: {e}')
+            if base.get('endpoint') != options['endpoint']:
+                raise CommandError(f'La medicion base es del endpoint {base.get("endpoint")!r}.')
+
+        endpoint = options['endpoint']
+        if endpoint == 'conteo':
+            if options['sesion'] is None:
+                raise CommandError('--sesion es requerida para el endpoint conteo.')
+            if not InventarioSesion.objects.filter(pk=options['sesion'], status='en_proceso').exists():
+                raise CommandError('La sesion indicada no existe o no esta en proceso.')
+
+        productos = list(
+            Product.objects.filter(status='active').order_by('?').values_list('code', 'name')[:options['codigos']]
+        )
+        if not productos:
+            raise CommandError('No hay productos activos en la base de datos.')
+
+        servidores = {
+            'sync': options['url_sync'] or options['url'],
+            'async': options['url'],
+        }
+        rutas = dict(zip(('sync', 'async'), ENDPOINTS[endpoint]))
+
+        self.stdout.write(f'Endpoint: {endpoint} - {options["peticiones"]} peticiones por nivel')
+        encabezado = (
+            f'{"modo":<6} {"conc.":>6} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} {"errores":>8}'
+        )
+        if base is not None:
+            encabezado += f' {"p50 base":>9} {"p95 base":>9}'
+        self.stdout.write(encabezado)
+        resultados = {'endpoint': endpoint, 'peticiones': options['peticiones'], 'modos': {}}
+        for nivel in niveles:
+            for modo in modos:
+                ruta = rutas[modo].format(sesion=options['sesion'])
+                resultado = asyncio.run(self._medir(
+                    servidores[modo], ruta, endpoint, productos, nivel, options
+                ))
+                resultados['modos'].setdefault(modo, {})[str(nivel)] = resultado
+                fila = (
+                    f'{modo:<6} {nivel:>6} {resultado["rps"]:>9.0f} {resultado["p50"]:>8.1f} '
+                    f'{resultado["p95"]:>8.1f} {resultado["p99"]:>8.1f} {resultado["max"]:>8.1f} '
+                    f'{resultado["errores"]:>8}'
+                )
+                if base is not None:
+                    anterior = base['modos'].get(modo, {}).get(str(nivel))
+                    fila += ' ' + ' '.join(
+                        f'{_variacion(resultado[medida], anterior[medida]) if anterior else "-":>9}'
+                        for medida in ('p50', 'p95')
+                    )
+                self.stdout.write(fila)
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2)
+            self.stdout.write(f'Resultados guardados en {options["salida"]}')
+
+    async def _medir(self, url, ruta, endpoint, productos, concurrencia, options):
+        partes = urlsplit(url)
+        host, puerto = partes.hostname, partes.port or 80
+        cookies = await iniciar_sesion(host, puerto, options['usuario'], options['password'])
+        cabeceras = {'X-CSRFToken': cookies['csrftoken']}
+
+        pendientes = options['peticiones']
+        tiempos = []
+        errores = 0
+        aleatorio = random.Random(concurrencia)
+
+        def peticion():
+            code, name = aleatorio.choice(productos)
+            if endpoint == 'buscar':
+                return 'GET', f'{ruta}?{urlencode({"code": code})}', None
+            if endpoint == 'autocompletar':
+                return 'GET', f'{ruta}?{urlencode({"term": name[:4]})}', None
+            return 'POST', ruta, {'product_code': code, 'cantidad': aleatorio.randint(0, 50)}
+
+        async def trabajador():
+            nonlocal pendientes, errores
+            conexion = Conexion(host, puerto, dict(cookies))
+            try:
+                while pendientes > 0:
+                    pendientes -= 1
+                    metodo, destino, datos = peticion()
+                    inicio = time.perf_counter()
+                    try:
+                        codigo, _ = await conexion.pedir(metodo, destino, datos, cabeceras)
+                    except (OSError, ErrorHTTP, asyncio.IncompleteReadError):
+                        errores += 1
+                        await conexion.cerrar()
+                        continue
+                    tiempos.append(time.perf_counter() - inicio)
+                    if codigo != 200:
+                        errores += 1
+            finally:
+                await conexion.cerrar()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+
+        return {
+            'rps': len(tiempos) / duracion if duracion else 0,
+            'errores': errores,
+            **percentiles(tiempos),
+        }
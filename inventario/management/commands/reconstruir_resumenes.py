@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from inventario.models import Product
+from inventario.resumen import reconstruir, TAMANO_BLOQUE
+
+
+def _reconstruir_bloque(ids):
+    # Cada hilo usa su propia conexion; se cierra al terminar el bloque
+    try:
+        return reconstruir(ids)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen de movimientos de los productos desde el historial'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=4,
+            help='Bloques que se procesan en paralelo (por defecto 4)',
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Productos por bloque (por defecto {TAMANO_BLOQUE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1 or options['bloque'] < 1:
+            raise CommandError('--hilos y --bloque deben ser mayores a cero.')
+
+        inicio = time.perf_counter()
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        tamano = options['bloque']
+        bloques = [ids[i:i + tamano] for i in range(0, len(ids), tamano)]
+
+        escritos = 0
+        with ThreadPoolExecutor(max_workers=options['hilos']) as ejecutor:
+            pendientes = [
+                ejecutor.submit(_reconstruir_bloque, bloque)
+                for bloque in bloques
+            ]
+            for numero, futuro in enumerate(as_completed(pendientes), 1):
+                escritos += futuro.result()
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Bloque {numero}/{len(bloques)}')
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(
+            f'Productos: {escritos}\n'
+            f'Bloques: {len(bloques)} ({options["hilos"]} en paralelo)\n'
+            f'Tiempo: {segundos:.2f} s'
+        )
+        self.stdout.write(self.style.SUCCESS('Resumenes reconstruidos.'))
@@ -0,0 +1,221 @@
+"""
+Metricas de operacion expuestas en /metricas/ con el formato de texto de
+Prometheus.
+
+Cada proceso acumula sus contadores e histogramas en memoria y los vuelca, a
+lo sumo cada METRICAS_INTERVALO segundos, a un archivo propio en METRICAS_DIR.
+El archivo se escribe completo en un temporal y se reemplaza con os.replace,
+asi nunca se lee a medias. La vista suma los archivos de todos los procesos:
+con varios workers WSGI cada scrape ve el total, atienda quien atienda.
+
+Los archivos de procesos terminados se conservan porque los contadores son
+acumulados y no deben bajar; el directorio se vacia al desplegar. Sin
+METRICAS_DIR la vista muestra solo el proceso que la atiende.
+"""
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+# Limites de los histogramas de duracion, en segundos
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICAS = {
+    'inventario_peticiones_total': (
+        'counter', 'Peticiones atendidas por vista, metodo y estado HTTP.'),
+    'inventario_peticion_segundos': (
+        'histogram', 'Duracion de las peticiones por vista; en los flujos, hasta el primer byte.'),
+    'inventario_bd_segundos': (
+        'histogram', 'Tiempo en la base de datos por peticion y vista.'),
+    'inventario_bd_consultas_total': (
+        'counter', 'Consultas SQL por vista.'),
+    'inventario_bd_conexiones_total': (
+        'counter', 'Peticiones que usaron la base de datos, por alias y origen de la conexion (nueva o reutilizada).'),
+    'inventario_bd_conexiones_descartadas_total': (
+        'counter', 'Conexiones del pool cerradas por alias y motivo (vencida, caida o sucia).'),
+    'inventario_bd_espera_segundos': (
+        'histogram', 'Espera por una conexion del pool, incluida la conexion nueva si hubo que abrirla.'),
+    'inventario_exportacion_filas_total': (
+        'counter', 'Filas exportadas por reporte.'),
+    'inventario_exportacion_segundos': (
+        'histogram', 'Duracion de cada exportacion por reporte.'),
+    'inventario_conteos_total': (
+        'counter', 'Conteos registrados por sesion de inventario fisico.'),
+    'inventario_conciliacion_segundos': (
+        'histogram', 'Duracion de la conciliacion de una sesion.'),
+    'inventario_conciliacion_ajustes_total': (
+        'counter', 'Ajustes de stock aplicados al conciliar.'),
+    'inventario_cache_total': (
+        'counter', 'Lecturas de cache por uso y resultado (acierto o fallo).'),
+}
+
+
+def activas():
+    return getattr(settings, 'METRICAS', False)
+
+
+class Registro:
+    """Valores de un proceso: {(nombre, etiquetas): valor}; en histogramas el valor es [cubetas..., suma, total]"""
+
+    def __init__(self):
+        self.candado = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.pid = os.getpid()
+        # El pid solo puede repetirse tras reiniciar el servidor; el sufijo evita pisar el archivo anterior
+        self.archivo = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.valores = {}
+        self.pendiente = False
+        self.volcado = 0.0
+
+    def _revisar_proceso(self):
+        # Tras un fork el hijo hereda los valores del padre, que ya los cuenta el padre
+        if os.getpid() != self.pid:
+            self._reiniciar()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+        with self.candado:
+            self._revisar_proceso()
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+            self.pendiente = True
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items())))
+        with self.candado:
+            self._revisar_proceso()
+            cubetas = self.valores.get(clave)
+            if cubetas is None:
+                cubetas = self.valores[clave] = [0] * (len(LIMITES_SEGUNDOS) + 2)
+            for i, limite in enumerate(LIMITES_SEGUNDOS):
+                if valor <= limite:
+                    cubetas[i] += 1
+                    break
+            cubetas[-2] += valor
+            cubetas[-1] += 1
+            self.pendiente = True
+
+    def volcar(self, forzar=False):
+        """Escribe los valores del proceso en METRICAS_DIR si cambiaron y paso el intervalo"""
+        directorio = getattr(settings, 'METRICAS_DIR', None)
+        if not directorio:
+            return
+        ahora = time.monotonic()
+        with self.candado:
+            self._revisar_proceso()
+            if not self.pendiente:
+                return
+            if not forzar and ahora - self.volcado < getattr(settings, 'METRICAS_INTERVALO', 1):
+                return
+            datos = [[nombre, etiquetas, valor] for (nombre, etiquetas), valor in self.valores.items()]
+            self.pendiente = False
+            self.volcado = ahora
+            archivo = self.archivo
+
+        os.makedirs(directorio, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as salida:
+            json.dump(datos, salida, separators=(',', ':'))
+        os.replace(temporal, os.path.join(directorio, archivo))
+
+    def instantanea(self):
+        with self.candado:
+            self._revisar_proceso()
+            return [[nombre, etiquetas, valor] for (nombre, etiquetas), valor in self.valores.items()]
+
+
+registro = Registro()
+atexit.register(registro.volcar, forzar=True)
+
+
+def incrementar(nombre, valor=1, **etiquetas):
+    if activas():
+        registro.incrementar(nombre, valor, **etiquetas)
+
+
+def observar(nombre, valor, **etiquetas):
+    if activas():
+        registro.observar(nombre, valor, **etiquetas)
+
+
+def registrar_exportacion(reporte, filas, segundos):
+    """Filas por segundo de un reporte = rate(filas_total) / rate(segundos_sum)"""
+    incrementar('inventario_exportacion_filas_total', filas, reporte=reporte)
+    observar('inventario_exportacion_segundos', segundos, reporte=reporte)
+
+
+def _leer_procesos():
+    """Valores de todos los procesos: los archivos de METRICAS_DIR, o solo este proceso"""
+    directorio = getattr(settings, 'METRICAS_DIR', None)
+    if not directorio:
+        return [registro.instantanea()]
+
+    registro.volcar(forzar=True)
+    procesos = []
+    for nombre in os.listdir(directorio) if os.path.isdir(directorio) else []:
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre)) as entrada:
+                procesos.append(json.load(entrada))
+        except (OSError, ValueError):
+            # Archivo borrado entre listdir y open
+            continue
+    return procesos
+
+
+def _sumar(procesos):
+    total = {}
+    for valores in procesos:
+        for nombre, etiquetas, valor in valores:
+            clave = (nombre, tuple(tuple(par) for par in etiquetas))
+            if isinstance(valor, list):
+                actual = total.setdefault(clave, [0] * len(valor))
+                for i, cantidad in enumerate(valor):
+                    actual[i] += cantidad
+            else:
+                total[clave] = total.get(clave, 0) + valor
+    return total
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    escapar = lambda v: v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        return repr(valor) if math.isfinite(valor) else '+Inf'
+    return str(valor)
+
+
+def texto():
+    """Todas las metricas en el formato de texto de Prometheus (version 0.0.4)"""
+    total = _sumar(_leer_procesos())
+    lineas = []
+    for nombre, (tipo, ayuda) in METRICAS.items():
+        series = sorted((etiquetas, valor) for (serie, etiquetas), valor in total.items() if serie == nombre)
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        for etiquetas, valor in series:
+            if tipo != 'histogram':
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+                continue
+            acumulado = 0
+            for limite, cantidad in zip(LIMITES_SEGUNDOS + (float('inf'),), valor[:-2] + [None]):
+                # La cubeta +Inf es el total de observaciones
+                acumulado = valor[-1] if cantidad is None else acumulado + cantidad
+                le = '+Inf' if math.isinf(limite) else _numero(float(limite))
+                lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas + (("le", le),))} {acumulado}')
+            lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(float(valor[-2]))}')
+            lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {valor[-1]}')
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,456 @@
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.middleware.gzip import GZipMiddleware
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+from . import foto_usuario, lentas, metricas, replicas
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin el modulo se usa solo gzip
+    brotli = None
+
+re_acepta_brotli = re.compile(r'\bbr\b')
+
+# Tipos que vale la pena comprimir; los xlsx ya vienen comprimidos
+TIPOS_COMPRIMIBLES = (
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/x-msgpack',
+)
+
+
+class CompresionMiddleware(GZipMiddleware):
+    """
+    Comprime las respuestas HTML y JSON con brotli (si esta instalado y el
+    cliente lo acepta) o gzip. Las respuestas menores a COMPRESION_MINIMA
+    bytes y los flujos SSE se envian sin comprimir: en los primeros no se
+    gana nada y los segundos deben llegar evento por evento.
+
+    Las respuestas en flujo (exportaciones de la API) se comprimen con gzip
+    por fragmentos.
+    """
+
+    calidad_brotli = 5
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+
+        tipo = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not (tipo in TIPOS_COMPRIMIBLES or tipo.endswith('+json')):
+            return response
+
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESION_MINIMA', 1024):
+            return response
+
+        aceptadas = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or response.streaming or not re_acepta_brotli.search(aceptadas):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        comprimido = brotli.compress(response.content, quality=self.calidad_brotli)
+        if len(comprimido) >= len(response.content):
+            return response
+        response.content = comprimido
+        response.headers['Content-Length'] = str(len(comprimido))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+logger_perfil = logging.getLogger('inventario.perfil')
+
+re_cadenas = re.compile(r"'(?:[^']|'')*'")
+re_numeros = re.compile(r'\b\d+(?:\.\d+)?\b')
+re_listas = re.compile(r'\((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)')
+
+
+def huella_sql(sql):
+    """
+    Forma de una consulta sin sus valores: los literales pasan a ? y las listas
+    de IN a (...), para que la misma consulta con otros valores se agrupe.
+    """
+    sql = re_cadenas.sub('?', sql)
+    sql = re_numeros.sub('?', sql)
+    sql = re_listas.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+# Mediciones activas en la peticion en curso; cada middleware de medicion agrega la suya
+_mediciones = contextvars.ContextVar('mediciones', default=())
+
+
+class Medicion:
+    """
+    Consultas SQL de una peticion, como (alias, sql, params, duracion); params
+    es None en las ejecuciones con executemany. `conexiones` dice por alias
+    usado si la conexion era reutilizada: ya estaba abierta al empezar (con
+    conexiones persistentes) o vino del pool.
+    """
+
+    def __init__(self):
+        self.consultas = []
+        self.conexiones = {}
+        self.abiertas = {conexion.alias for conexion in connections.all() if conexion.connection is not None}
+
+    @property
+    def tiempo_sql(self):
+        return sum(duracion for _, _, _, duracion in self.consultas)
+
+    def anotar(self, conexion, sql, params, duracion):
+        if conexion.alias not in self.conexiones:
+            self.conexiones[conexion.alias] = (
+                conexion.alias in self.abiertas or getattr(conexion, 'conexion_reutilizada', False)
+            )
+        self.consultas.append((conexion.alias, sql, params, duracion))
+
+
+def _medir(execute, sql, params, many, context):
+    mediciones = _mediciones.get()
+    if not mediciones:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        for medicion in mediciones:
+            medicion.anotar(context['connection'], sql, None if many else params, duracion)
+
+
+def _instalar(connection, **kwargs):
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+@contextmanager
+def medir_consultas():
+    """
+    Mide las consultas SQL hechas dentro del bloque, en todas las conexiones.
+
+    La envoltura queda instalada en cada conexion (al crearla, por
+    connection_created) y lee la medicion de una variable de contexto: con
+    ASGI la vista consulta desde el hilo de sync_to_async, con otras
+    conexiones que las del hilo del middleware, y el contexto pasa a ese hilo.
+    """
+    for conexion in connections.all():
+        _instalar(conexion)
+    medicion = Medicion()
+    token = _mediciones.set(_mediciones.get() + (medicion,))
+    try:
+        yield medicion
+    finally:
+        _mediciones.reset(token)
+
+
+class MedicionMiddleware:
+    """
+    Base de los middleware que miden la peticion y sus consultas. Es sincrono
+    y asincrono: con ASGI las vistas async no se pasan a un hilo por estar
+    activo el middleware. Las subclases implementan `medida`, que recibe la
+    respuesta, la Medicion y la duracion total.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        # Las conexiones que se abran desde ahora, y las ya creadas en este hilo
+        connection_created.connect(_instalar, dispatch_uid='inventario.medir_consultas')
+        for conexion in connections.all():
+            _instalar(conexion)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        with medir_consultas() as medicion:
+            response = self.get_response(request)
+        return self.medida(request, response, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        with medir_consultas() as medicion:
+            response = await self.get_response(request)
+        return self.medida(request, response, medicion, time.perf_counter() - inicio)
+
+    def medida(self, request, response, medicion, total):
+        raise NotImplementedError
+
+
+class PerfilMiddleware(MedicionMiddleware):
+    """
+    Mide cada peticion: consultas SQL, tiempo en la base de datos, consultas
+    repetidas y tiempo total. Se activa con PERFILADO = True en settings.
+
+    El resultado se registra en el logger 'inventario.perfil' como JSON y se
+    envia en el encabezado Server-Timing (visible en las herramientas del
+    navegador). Una misma forma de consulta que se repite PERFILADO_REPETIDAS
+    veces o mas en una peticion se marca como probable N+1 y se registra como
+    advertencia.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADO', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.repetidas = getattr(settings, 'PERFILADO_REPETIDAS', 5)
+
+    def medida(self, request, response, medicion, total):
+        consultas = medicion.consultas
+        sql = medicion.tiempo_sql
+        huellas = Counter(huella_sql(consulta) for _, consulta, _, _ in consultas)
+        repetidas = [
+            {'sql': huella, 'veces': veces}
+            for huella, veces in huellas.most_common()
+            if veces >= self.repetidas
+        ]
+
+        datos = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'vista': getattr(request.resolver_match, 'view_name', None),
+            'estado': response.status_code,
+            'consultas': len(consultas),
+            'sql_ms': round(sql * 1000, 2),
+            # Tiempo fuera de la base de datos: vista, plantillas y middleware
+            'app_ms': round((total - sql) * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicadas': sum(veces - 1 for veces in huellas.values()),
+            'n_mas_1': repetidas,
+        }
+        nivel = logging.WARNING if repetidas else logging.INFO
+        logger_perfil.log(nivel, json.dumps(datos, ensure_ascii=False), extra={'perfil': datos})
+
+        response.headers['Server-Timing'] = (
+            f'sql;dur={datos["sql_ms"]};desc="{len(consultas)} consultas", '
+            f'app;dur={datos["app_ms"]}, '
+            f'total;dur={datos["total_ms"]}'
+        )
+        if repetidas:
+            response.headers['X-Perfil-N-Mas-1'] = str(len(repetidas))
+        return response
+
+
+class MetricasMiddleware(MedicionMiddleware):
+    """
+    Registra por vista las peticiones, su duracion y el tiempo y numero de
+    consultas SQL en inventario/metricas.py, y si la conexion a la base de
+    datos fue nueva o reutilizada. Se activa con METRICAS = True en settings.
+    En las respuestas en flujo la duracion llega hasta el primer byte.
+    """
+
+    def __init__(self, get_response):
+        if not metricas.activas():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def medida(self, request, response, medicion, total):
+        consultas = medicion.consultas
+
+        # Sin nombre de ruta (404, estaticos) se agrupan para no crear una serie por URL
+        vista = getattr(request.resolver_match, 'view_name', None) or 'sin_ruta'
+        metricas.incrementar(
+            'inventario_peticiones_total', vista=vista, metodo=request.method, estado=response.status_code
+        )
+        metricas.observar('inventario_peticion_segundos', total, vista=vista)
+        metricas.observar('inventario_bd_segundos', medicion.tiempo_sql, vista=vista)
+        if consultas:
+            metricas.incrementar('inventario_bd_consultas_total', len(consultas), vista=vista)
+        for alias, reutilizada in medicion.conexiones.items():
+            metricas.incrementar(
+                'inventario_bd_conexiones_total', alias=alias, origen='reutilizada' if reutilizada else 'nueva'
+            )
+        metricas.registro.volcar()
+        return response
+
+
+class LentasMiddleware(MedicionMiddleware):
+    """
+    Guarda en inventario/lentas.py las consultas que tardan LENTAS_SQL_MS o
+    mas y las peticiones que tardan LENTAS_PETICION_MS o mas. Se activa con
+    LENTAS = True en settings. El EXPLAIN de la muestra se ejecuta al cerrar
+    la respuesta, despues de enviarla: el cliente no lo espera.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'LENTAS', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.umbral_sql = getattr(settings, 'LENTAS_SQL_MS', 200) / 1000
+        self.umbral_peticion = getattr(settings, 'LENTAS_PETICION_MS', 1000) / 1000
+        self.muestra_explain = getattr(settings, 'LENTAS_EXPLAIN', 0.1)
+
+    def medida(self, request, response, medicion, total):
+        lentas_sql = [consulta for consulta in medicion.consultas if consulta[3] >= self.umbral_sql]
+        if not lentas_sql and total < self.umbral_peticion:
+            return response
+
+        comun = {
+            'fecha': timezone.now(),
+            'vista': getattr(request.resolver_match, 'view_name', None),
+            'metodo': request.method,
+            'ruta': request.get_full_path()[:300],
+        }
+        registros = []
+        sin_plan = []
+        con_plan = set()
+        for alias, sql, params, duracion in lentas_sql:
+            huella = huella_sql(sql)
+            registro = {
+                **comun,
+                'tipo': 'sql',
+                'huella': huella,
+                'sql': sql[:4000],
+                'parametros': lentas.parametros_legibles(params),
+                'ms': round(duracion * 1000, 1),
+                'plan': None,
+            }
+            # Un plan por forma de consulta y peticion basta
+            if params is not None and huella not in con_plan and random.random() < self.muestra_explain:
+                sin_plan.append((registro, alias, sql, params))
+                con_plan.add(huella)
+            registros.append(registro)
+        if total >= self.umbral_peticion:
+            registros.append({
+                **comun,
+                'tipo': 'peticion',
+                'estado': response.status_code,
+                'ms': round(total * 1000, 1),
+                'sql_ms': round(medicion.tiempo_sql * 1000, 1),
+                'consultas': len(medicion.consultas),
+                'lentas': len(lentas_sql),
+            })
+        if not sin_plan:
+            lentas.registrar(registros)
+            return response
+
+        # El servidor cierra la respuesta despues de enviarla. El plan se pide
+        # antes del close() original, que con request_finished cierra las conexiones
+        cerrar = response.close
+
+        def close():
+            try:
+                for registro, alias, sql, params in sin_plan:
+                    registro['plan'] = lentas.plan(alias, sql, params)
+                lentas.registrar(registros)
+            finally:
+                cerrar()
+
+        response.close = close
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Si la peticion escribio en la base de datos, deja una cookie con la hora
+    para que las vistas con @lectura_replica de ese usuario lean del principal
+    durante REPLICA_LECTURA_PROPIA segundos. Sin replica configurada no se usa.
+    Es sincrono y asincrono, como FotoUsuarioMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if replicas.alias_replica() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        token = replicas.marcar_inicio()
+        try:
+            response = self.get_response(request)
+        finally:
+            escribio = replicas.escribio(token)
+        return self._marcar(response, escribio)
+
+    async def __acall__(self, request):
+        token = replicas.marcar_inicio()
+        try:
+            response = await self.get_response(request)
+        finally:
+            escribio = replicas.escribio(token)
+        return self._marcar(response, escribio)
+
+    def _marcar(self, response, escribio):
+        if escribio:
+            response.set_cookie(
+                replicas.COOKIE_ESCRITURA,
+                str(time.time()),
+                max_age=getattr(settings, 'REPLICA_LECTURA_PROPIA', 10),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+async def _ausuario(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await foto_usuario.aobtener_usuario(request)
+    return request._acached_user
+
+
+class FotoUsuarioMiddleware:
+    """
+    Reemplaza el usuario que carga AuthenticationMiddleware por el armado desde
+    la foto de la sesion (inventario/foto_usuario.py), sin consultar la base de
+    datos. Va despues de AuthenticationMiddleware y se activa con
+    FOTO_USUARIO = True en settings. Es sincrono y asincrono, como el de
+    Django: con ASGI las vistas async no ocupan un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FOTO_USUARIO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        self._preparar(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._preparar(request)
+        return await self.get_response(request)
+
+    def _preparar(self, request):
+        request.user = SimpleLazyObject(lambda: foto_usuario.obtener_usuario(request))
+        request.auser = partial(_ausuario, request)
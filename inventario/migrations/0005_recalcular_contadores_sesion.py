@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:12
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def recalcular_contadores(apps, schema_editor):
+    # Los contadores ahora se mantienen de forma incremental; las sesiones
+    # abiertas solo tenian productos_con_diferencia al finalizar.
+    InventarioSesion = apps.get_model('inventario', 'InventarioSesion')
+    sesiones = InventarioSesion.objects.filter(status='en_proceso').annotate(
+        total=Count('detalles'),
+        con_diferencia=Count('detalles', filter=~Q(detalles__diferencia=0)),
+    )
+    for sesion in sesiones:
+        InventarioSesion.objects.filter(pk=sesion.pk).update(
+            total_productos=sesion.total,
+            productos_con_diferencia=sesion.con_diferencia,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_salida'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalcular_contadores, migrations.RunPython.noop),
+    ]
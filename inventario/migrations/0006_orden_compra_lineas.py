@@ -0,0 +1,77 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_recalcular_contadores_sesion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseOrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('quantity_received', models.IntegerField(default=0)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Linea de Orden de Compra',
+                'verbose_name_plural': 'Lineas de Orden de Compra',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='purchaseorder',
+            options={'verbose_name': 'Orden de Compra', 'verbose_name_plural': 'Ordenes de Compra'},
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='cantidad_pedida',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='cantidad_recibida',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='lineas_pendientes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='status',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('parcial', 'Recibida Parcialmente'), ('recibida', 'Recibida'), ('cancelada', 'Cancelada')], default='pendiente', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['status', '-created_at'], name='orden_estado_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorderline',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='inventario.purchaseorder'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorderline',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, to='inventario.product'),
+        ),
+        migrations.AddField(
+            model_name='entrada',
+            name='purchase_order_line',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entradas', to='inventario.purchaseorderline'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='purchaseorderline',
+            unique_together={('order', 'product')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_orden_compra_lineas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['name'], name='categoria_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrada',
+            index=models.Index(fields=['created_at'], name='entrada_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventariosesion',
+            index=models.Index(fields=['created_at'], name='sesion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='producto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='provider',
+            index=models.Index(fields=['name'], name='proveedor_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salida',
+            index=models.Index(fields=['created_at'], name='salida_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_indices_listados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='inventario.product')),
+                ('ultima_entrada', models.DateTimeField(blank=True, null=True)),
+                ('ultima_salida', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_conteo', models.DateTimeField(blank=True, null=True)),
+                ('anio', models.IntegerField(default=0)),
+                ('entradas_anio', models.IntegerField(default=0)),
+                ('salidas_anio', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_proveedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventario.provider')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Producto',
+                'verbose_name_plural': 'Resumenes de Productos',
+            },
+        ),
+    ]
@@ -29,6 +29,11 @@ class Category(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='categoria_nombre_idx'),
+        ]
+
 class Provider(models.Model):
     name = models.CharField(max_length=50)
     rif = models.CharField(max_length=12, unique=True)
@@ -39,6 +44,11 @@ class Provider(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='proveedor_nombre_idx'),
+        ]
+
 class Product(models.Model):
     code = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=200)
@@ -52,29 +62,121 @@ class Product(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    def sumar_stock(self, cantidad):
+        """
+        Suma `cantidad` al stock con un UPDATE sobre el valor guardado; leer,
+        sumar y guardar el producto pierde los movimientos simultaneos.
+        """
+        Product.objects.filter(pk=self.pk).update(stock_actual=models.F('stock_actual') + cantidad)
+        self.refresh_from_db(fields=['stock_actual'])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='producto_nombre_idx'),
+        ]
+
+class ProductSummary(models.Model):
+    # Resumen de movimientos por producto; lo mantiene inventario/resumen.py
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    ultima_entrada = models.DateTimeField(null=True, blank=True)
+    ultima_salida = models.DateTimeField(null=True, blank=True)
+    ultimo_proveedor = models.ForeignKey(Provider, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    ultimo_conteo = models.DateTimeField(null=True, blank=True)
+    # Unidades movidas en el anio `anio`; en un anio nuevo empiezan de cero
+    anio = models.IntegerField(default=0)
+    entradas_anio = models.IntegerField(default=0)
+    salidas_anio = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Resumen de Producto'
+        verbose_name_plural = 'Resumenes de Productos'
+
+    @property
+    def entradas_del_anio(self):
+        return self.entradas_anio if self.anio == timezone.localdate().year else 0
+
+    @property
+    def salidas_del_anio(self):
+        return self.salidas_anio if self.anio == timezone.localdate().year else 0
+
 class PurchaseOrder(models.Model):
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('parcial', 'Recibida Parcialmente'),
+        ('recibida', 'Recibida'),
+        ('cancelada', 'Cancelada'),
+    )
+    ESTADOS_ABIERTOS = ('pendiente', 'parcial')
+
     order_number = models.CharField(max_length=50, unique=True)
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    status = models.CharField(max_length=20, default='pendiente')
+    status = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
     total_cost = models.DecimalField(max_digits=12, decimal_places=2)
+    # Totales de las lineas guardados en la orden para listar sin agregar
+    cantidad_pedida = models.IntegerField(default=0)
+    cantidad_recibida = models.IntegerField(default=0)
+    lineas_pendientes = models.IntegerField(default=0)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        verbose_name = 'Orden de Compra'
+        verbose_name_plural = 'Ordenes de Compra'
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='orden_estado_fecha_idx'),
+        ]
+
+
+class PurchaseOrderLine(models.Model):
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='lineas')
+    product = models.ForeignKey(Product, on_delete=models.RESTRICT)
+    quantity = models.IntegerField()
+    quantity_received = models.IntegerField(default=0)
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Linea de Orden de Compra'
+        verbose_name_plural = 'Lineas de Orden de Compra'
+        unique_together = ['order', 'product']
+
+    @property
+    def pendiente(self):
+        return max(self.quantity - self.quantity_received, 0)
+
+
 class Entrada(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    purchase_order_line = models.ForeignKey(
+        PurchaseOrderLine,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='entradas',
+    )
     quantity = models.IntegerField()
     total_cost = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
     def save(self, *args, **kwargs):
-        self.product.stock_actual += self.quantity
-        self.product.save()
+        # Sumar al stock solo al crear la entrada, igual que Salida. Guardarla
+        # de nuevo no cambia el stock (antes volvia a sumar la cantidad en cada
+        # save); una correccion de cantidad se registra como ajuste de inventario.
+        if not self.pk:
+            self.product.sumar_stock(self.quantity)
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='entrada_fecha_idx'),
+        ]
+
 class InventoryAdjustment(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -104,6 +206,9 @@ class InventarioSesion(models.Model):
     class Meta:
         verbose_name = 'Sesion de Inventario'
         verbose_name_plural = 'Sesiones de Inventario'
+        indexes = [
+            models.Index(fields=['created_at'], name='sesion_fecha_idx'),
+        ]
 
 
 class DetalleConteo(models.Model):
@@ -133,11 +238,13 @@ class Salida(models.Model):
     def save(self, *args, **kwargs):
         # Restar del stock al crear una salida
         if not self.pk:  # Solo al crear, no al editar
-            self.product.stock_actual -= self.quantity
-            self.product.save()
+            self.product.sumar_stock(-self.quantity)
         super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = 'Salida'
         verbose_name_plural = 'Salidas'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='salida_fecha_idx'),
+        ]
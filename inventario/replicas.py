@@ -0,0 +1,183 @@
+"""
+Lecturas de reportes en una replica de la base de datos.
+
+Las vistas de solo lectura marcadas con @lectura_replica (exportaciones,
+historiales, dashboard, API) leen del alias REPLICA_BD. Las demas vistas y
+todas las escrituras usan 'default'. La vista vuelve al principal:
+
+- si el usuario escribio algo en los ultimos REPLICA_LECTURA_PROPIA
+  segundos, para que vea su propio cambio (cookie de ReplicaMiddleware);
+- si la replica va mas de REPLICA_RETRASO_MAXIMO segundos atrasada, no
+  replica o no responde. El retraso se consulta a lo sumo cada
+  REPLICA_INTERVALO segundos por proceso, en una conexion aparte con
+  REPLICA_TIEMPO_LIMITE segundos para conectar y responder. Mientras un hilo
+  lo consulta, los demas usan el ultimo valor medido sin esperar.
+
+Sin el alias REPLICA_BD en DATABASES todo se lee del principal.
+"""
+import contextvars
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger('inventario.replicas')
+
+COOKIE_ESCRITURA = 'bd_escritura'
+
+# Alias de lectura de la vista en curso; None lee del principal
+_alias_lectura = contextvars.ContextVar('alias_lectura', default=None)
+# La peticion en curso escribio en la base de datos
+_escribio = contextvars.ContextVar('escribio', default=False)
+
+_retraso = {'valor': None, 'medido': 0.0, 'midiendo': False}
+_candado = threading.Lock()
+
+
+def alias_replica():
+    alias = getattr(settings, 'REPLICA_BD', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def retraso(alias):
+    """
+    Segundos de atraso de la replica, o None si no se sabe (la replicacion
+    esta detenida, el servidor no es replica o no responde). Solo MySQL informa
+    el atraso; en otros motores la replica se considera al dia.
+    """
+    if connections[alias].vendor != 'mysql':
+        return 0
+    conexion = _conexion_estado(alias)
+    try:
+        with conexion.cursor() as cursor:
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+            except DatabaseError:
+                # MySQL anterior a 8.0.22
+                cursor.execute('SHOW SLAVE STATUS')
+            fila = cursor.fetchone()
+            columnas = [columna[0] for columna in cursor.description or ()]
+    except DatabaseError:
+        logger.warning('No se pudo consultar el estado de la replica %s', alias, exc_info=True)
+        return None
+    finally:
+        conexion.close()
+    if fila is None:
+        return None
+    estado = dict(zip(columnas, fila))
+    return estado.get('Seconds_Behind_Source', estado.get('Seconds_Behind_Master'))
+
+
+def _conexion_estado(alias):
+    """
+    Conexion nueva a la replica para medir el atraso, fuera del pool y con
+    tiempo limite: una replica que no responde no deja la peticion esperando
+    los tiempos del sistema operativo.
+    """
+    base = connections[alias]
+    limite = getattr(settings, 'REPLICA_TIEMPO_LIMITE', 2)
+    opciones = {nombre: valor for nombre, valor in base.settings_dict['OPTIONS'].items() if nombre != 'pool'}
+    opciones.update(connect_timeout=limite, read_timeout=limite)
+    return type(base)({**base.settings_dict, 'OPTIONS': opciones}, alias)
+
+
+def replica_al_dia(alias):
+    ahora = time.monotonic()
+    with _candado:
+        medir = not _retraso['midiendo'] and ahora - _retraso['medido'] >= getattr(settings, 'REPLICA_INTERVALO', 5)
+        if medir:
+            _retraso['midiendo'] = True
+        valor = _retraso['valor']
+
+    if medir:
+        # Solo este hilo mide; el candado no se retiene durante la consulta
+        valor = None
+        try:
+            valor = retraso(alias)
+        finally:
+            with _candado:
+                _retraso.update(valor=valor, medido=time.monotonic(), midiendo=False)
+    return valor is not None and valor <= getattr(settings, 'REPLICA_RETRASO_MAXIMO', 5)
+
+
+def escritura_reciente(request):
+    try:
+        momento = float(request.COOKIES.get(COOKIE_ESCRITURA, ''))
+    except ValueError:
+        return False
+    return time.time() - momento < getattr(settings, 'REPLICA_LECTURA_PROPIA', 10)
+
+
+def lectura_replica(view_func):
+    """La vista lee de la replica si esta al dia y el usuario no acaba de escribir"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        alias = alias_replica()
+        if alias is None or escritura_reciente(request) or not replica_al_dia(alias):
+            return view_func(request, *args, **kwargs)
+
+        token = _alias_lectura.set(alias)
+        try:
+            response = view_func(request, *args, **kwargs)
+            if response.streaming:
+                # El contenido se genera despues de salir de la vista
+                response.streaming_content = _con_alias(alias, response.streaming_content)
+            return response
+        finally:
+            _alias_lectura.reset(token)
+    return wrapper
+
+
+def _con_alias(alias, contenido):
+    # El alias se fija en cada paso: con ASGI cada fragmento puede generarse en otro contexto
+    iterador = iter(contenido)
+    while True:
+        token = _alias_lectura.set(alias)
+        try:
+            parte = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _alias_lectura.reset(token)
+        yield parte
+
+
+def marcar_inicio():
+    return _escribio.set(False)
+
+
+def escribio(token):
+    """True si la peticion escribio; restaura el estado anterior"""
+    valor = _escribio.get()
+    _escribio.reset(token)
+    return valor
+
+
+class ReplicaRouter:
+    """Lee de la replica solo dentro de las vistas con @lectura_replica; escribe siempre en el principal"""
+
+    def db_for_read(self, model, **hints):
+        return _alias_lectura.get()
+
+    def db_for_write(self, model, **hints):
+        # La sesion (cached_db, foto del usuario) se guarda en casi cada peticion
+        # y no se lee de la replica: no cuenta como escritura del usuario
+        if model._meta.app_label != 'sessions':
+            _escribio.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = alias_replica()
+        bases = {DEFAULT_DB_ALIAS, alias}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La replica recibe el esquema por la replicacion, no por migrate
+        if db == alias_replica():
+            return False
+        return None
@@ -0,0 +1,174 @@
+"""
+Resumen de movimientos por producto (ProductSummary).
+
+Guarda por producto la ultima entrada y salida, el ultimo proveedor, la fecha
+del ultimo conteo y las unidades que entraron y salieron en el anio, para que
+el listado de productos los muestre sin agregar Entrada ni Salida por fila.
+
+Las vistas que registran movimientos o conteos llaman a `registrar_entradas`,
+`registrar_salidas` o `registrar_conteos` dentro de su transaccion: son un
+UPDATE por bloque de productos con F(), igual que `stock.sumar_stock`.
+`reconstruir` recalcula los resumenes desde el historial (comando
+reconstruir_resumenes).
+"""
+from datetime import datetime
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ProductSummary, Product, Entrada, Salida, DetalleConteo
+from .versiones import invalidar
+
+TAMANO_BLOQUE = 500
+
+
+def _asegurar(ids):
+    """Crea los resumenes que falten, sin tocar los existentes"""
+    ProductSummary.objects.bulk_create(
+        [ProductSummary(product_id=pk) for pk in ids],
+        batch_size=TAMANO_BLOQUE,
+        ignore_conflicts=True,
+    )
+
+
+def _por_producto(bloque, cantidades):
+    return Case(
+        *[When(product_id=pk, then=Value(cantidades[pk])) for pk in bloque],
+        output_field=IntegerField(),
+    )
+
+
+def _registrar_movimientos(cantidades, fecha, campo, otro, **valores):
+    """
+    Suma {product_id: cantidad} al acumulado del anio `campo` y guarda los
+    `valores` fijos. Si el resumen es de un anio anterior los acumulados
+    (`campo` y `otro`) empiezan de cero.
+    """
+    ids = [pk for pk, cantidad in cantidades.items() if cantidad]
+    if not ids:
+        return
+    anio = timezone.localtime(fecha).year
+    _asegurar(ids)
+    for inicio in range(0, len(ids), TAMANO_BLOQUE):
+        bloque = ids[inicio:inicio + TAMANO_BLOQUE]
+        cantidad = _por_producto(bloque, cantidades)
+        ProductSummary.objects.filter(product_id__in=bloque).update(
+            **valores,
+            **{
+                campo: Case(When(anio=anio, then=F(campo) + cantidad), default=cantidad),
+                otro: Case(When(anio=anio, then=F(otro)), default=Value(0)),
+            },
+            updated_at=timezone.now(),
+            # MySQL asigna de izquierda a derecha: `anio` va al final para
+            # que las condiciones de arriba comparen con el anio guardado
+            anio=anio,
+        )
+    invalidar('productos')
+
+
+def registrar_entradas(cantidades, proveedor_id, fecha=None):
+    """Registra en el resumen las entradas {product_id: cantidad} de un proveedor"""
+    fecha = fecha or timezone.now()
+    _registrar_movimientos(
+        cantidades, fecha, 'entradas_anio', 'salidas_anio',
+        ultima_entrada=fecha,
+        ultimo_proveedor_id=proveedor_id,
+    )
+    # Las importaciones crean las entradas con bulk_create, que no dispara senales
+    invalidar('entradas')
+
+
+def registrar_salidas(cantidades, fecha=None):
+    """Registra en el resumen las salidas {product_id: cantidad}"""
+    fecha = fecha or timezone.now()
+    _registrar_movimientos(
+        cantidades, fecha, 'salidas_anio', 'entradas_anio',
+        ultima_salida=fecha,
+    )
+
+
+def registrar_conteos(ids, fecha=None):
+    """Guarda la fecha del ultimo conteo de los productos"""
+    ids = list(ids)
+    if not ids:
+        return
+    fecha = fecha or timezone.now()
+    _asegurar(ids)
+    for inicio in range(0, len(ids), TAMANO_BLOQUE):
+        ProductSummary.objects.filter(product_id__in=ids[inicio:inicio + TAMANO_BLOQUE]).update(
+            ultimo_conteo=fecha,
+            updated_at=timezone.now(),
+        )
+    invalidar('productos')
+
+
+def _ultimo(modelo, campo, orden='created_at'):
+    return Subquery(
+        modelo.objects.filter(product=OuterRef('pk')).order_by(f'-{orden}', '-pk').values(campo)[:1]
+    )
+
+
+def _total_entre(modelo, desde, hasta):
+    return Coalesce(
+        Subquery(
+            modelo.objects.filter(product=OuterRef('pk'), created_at__gte=desde, created_at__lt=hasta)
+            .order_by().values('product').annotate(total=Sum('quantity')).values('total')
+        ),
+        0,
+    )
+
+
+def reconstruir(ids):
+    """
+    Recalcula desde el historial el resumen de los productos `ids` con una
+    consulta de lectura y un INSERT ... ON CONFLICT/ON DUPLICATE KEY.
+    Retorna la cantidad de resumenes escritos.
+
+    Los acumulados son siempre del anio actual: el resumen guarda un solo anio
+    y `registrar_entradas`/`registrar_salidas` lo reinician si es otro.
+    """
+    anio = timezone.localdate().year
+    desde = timezone.make_aware(datetime(anio, 1, 1))
+    hasta = timezone.make_aware(datetime(anio + 1, 1, 1))
+    filas = Product.objects.filter(pk__in=ids).annotate(
+        r_ultima_entrada=_ultimo(Entrada, 'created_at'),
+        r_ultimo_proveedor=_ultimo(Entrada, 'provider_id'),
+        r_ultima_salida=_ultimo(Salida, 'created_at'),
+        r_ultimo_conteo=_ultimo(DetalleConteo, 'updated_at', orden='updated_at'),
+        r_entradas_anio=_total_entre(Entrada, desde, hasta),
+        r_salidas_anio=_total_entre(Salida, desde, hasta),
+    ).values(
+        'pk', 'r_ultima_entrada', 'r_ultimo_proveedor', 'r_ultima_salida',
+        'r_ultimo_conteo', 'r_entradas_anio', 'r_salidas_anio',
+    )
+
+    ahora = timezone.now()
+    resumenes = [
+        ProductSummary(
+            product_id=fila['pk'],
+            ultima_entrada=fila['r_ultima_entrada'],
+            ultimo_proveedor_id=fila['r_ultimo_proveedor'],
+            ultima_salida=fila['r_ultima_salida'],
+            ultimo_conteo=fila['r_ultimo_conteo'],
+            anio=anio,
+            entradas_anio=fila['r_entradas_anio'],
+            salidas_anio=fila['r_salidas_anio'],
+            updated_at=ahora,
+        )
+        for fila in filas
+    ]
+
+    upsert = {
+        'update_conflicts': True,
+        'update_fields': [
+            'ultima_entrada', 'ultimo_proveedor', 'ultima_salida', 'ultimo_conteo',
+            'anio', 'entradas_anio', 'salidas_anio', 'updated_at',
+        ],
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['product']
+    ProductSummary.objects.bulk_create(resumenes, batch_size=TAMANO_BLOQUE, **upsert)
+    invalidar('productos')
+    return len(resumenes)
@@ -0,0 +1,47 @@
+"""
+Actualizaciones de stock por conjunto para las operaciones masivas.
+
+Entrada.save y Salida.save ajustan el stock producto por producto; las
+importaciones crean sus movimientos con bulk_create y aplican el efecto en
+el stock con un UPDATE por bloque de productos. La conciliacion de inventario
+fija el stock contado de la misma forma.
+"""
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Product
+from .versiones import invalidar
+
+TAMANO_BLOQUE = 500
+
+
+def _por_producto(bloque, valores):
+    return Case(
+        *[When(pk=pk, then=Value(valores[pk])) for pk in bloque],
+        output_field=IntegerField(),
+    )
+
+
+def sumar_stock(deltas, tamano=TAMANO_BLOQUE):
+    """
+    Suma a cada producto la cantidad de {product_id: delta}. Usa F() para
+    que el UPDATE parta del stock guardado y no del leido antes.
+    """
+    ids = [pk for pk, delta in deltas.items() if delta]
+    for inicio in range(0, len(ids), tamano):
+        bloque = ids[inicio:inicio + tamano]
+        Product.objects.filter(pk__in=bloque).update(
+            stock_actual=F('stock_actual') + _por_producto(bloque, deltas)
+        )
+    if ids:
+        # update() no dispara senales
+        invalidar('productos')
+
+
+def fijar_stock(cantidades, tamano=TAMANO_BLOQUE):
+    """Reemplaza el stock de cada producto por la cantidad de {product_id: cantidad}"""
+    ids = list(cantidades)
+    for inicio in range(0, len(ids), tamano):
+        bloque = ids[inicio:inicio + tamano]
+        Product.objects.filter(pk__in=bloque).update(stock_actual=_por_producto(bloque, cantidades))
+    if ids:
+        invalidar('productos')
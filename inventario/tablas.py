@@ -0,0 +1,156 @@
+"""
+Listados paginados del lado del servidor.
+
+Una `Tabla` recibe el queryset base, las columnas por las que se puede ordenar
+(nombre publico -> ruta del ORM) y una funcion de filtros con la misma forma
+que `filtrar_entradas`: recibe el queryset y request.GET y retorna el queryset
+filtrado y los filtros usados.
+
+Las paginas se recorren por cursor sobre (columna de orden, id): cada pagina
+es un WHERE + LIMIT que usa el indice de la columna, sin OFFSET ni COUNT, asi
+que cuesta lo mismo en la primera pagina que en la ultima y no depende del
+tamano de la tabla. Las columnas de orden no deben admitir NULL.
+
+Con ?parcial=1 la vista responde solo el fragmento de la tabla para que el
+listado se actualice en su lugar al ordenar, filtrar o cambiar de pagina
+(ver el script de base.html).
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.shortcuts import render
+
+POR_PAGINA = 50
+
+
+def _serializar(valor):
+    # DjangoJSONEncoder recorta los microsegundos; el cursor necesita el valor exacto
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _valor(fila, ruta):
+    for parte in ruta.split(LOOKUP_SEP):
+        fila = getattr(fila, parte)
+    return fila
+
+
+class Tabla:
+    def __init__(self, queryset, columnas, orden, filtrar=None, por_pagina=POR_PAGINA):
+        self.queryset = queryset
+        self.columnas = columnas
+        self.orden = orden
+        self.filtrar = filtrar
+        self.por_pagina = por_pagina
+
+    def _campo(self, ruta):
+        """Campo del modelo (o anotacion) de una columna, para leer el valor del cursor"""
+        anotaciones = self.queryset.query.annotations
+        if ruta in anotaciones:
+            return anotaciones[ruta].output_field
+        modelo = self.queryset.model
+        *relaciones, nombre = ruta.split(LOOKUP_SEP)
+        for relacion in relaciones:
+            modelo = modelo._meta.get_field(relacion).related_model
+        return modelo._meta.get_field(nombre)
+
+    def _codificar_cursor(self, orden, fila, atras=False):
+        datos = {
+            'o': orden,
+            'v': _serializar(_valor(fila, self.columnas[orden.lstrip('-')])),
+            'id': fila.pk,
+        }
+        if atras:
+            datos['a'] = 1
+        return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip('=')
+
+    def _decodificar_cursor(self, cursor, orden):
+        """Retorna (valor, pk, atras), o None si el cursor no es valido para este orden"""
+        if not cursor:
+            return None
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if datos['o'] != orden:
+                return None
+            valor = self._campo(self.columnas[orden.lstrip('-')]).to_python(datos['v'])
+            return valor, int(datos['id']), bool(datos.get('a'))
+        except (binascii.Error, ValueError, TypeError, KeyError, AttributeError, ValidationError):
+            return None
+
+    def _leer(self, filas, ruta, descendente, cursor):
+        """Lee una pagina a partir del cursor; retorna las filas en orden y si hay mas en esa direccion"""
+        atras = bool(cursor and cursor[2])
+        if cursor:
+            valor, pk, _ = cursor
+            # Hacia adelante en orden ascendente (o hacia atras en descendente) se buscan los mayores
+            operador = 'lt' if descendente != atras else 'gt'
+            filas = filas.filter(
+                Q(**{f'{ruta}__{operador}': valor}) |
+                Q(**{ruta: valor, f'pk__{operador}': pk})
+            )
+
+        signo = '-' if descendente != atras else ''
+        filas = list(filas.order_by(f'{signo}{ruta}', f'{signo}pk')[:self.por_pagina + 1])
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina]
+        if atras:
+            filas.reverse()
+        return filas, hay_mas
+
+    def pagina(self, request):
+        """
+        Lee la pagina pedida en request.GET (orden, cursor y filtros) y retorna
+        el contexto de la tabla: filas, orden, filtros y cursores vecinos.
+        """
+        parametros = request.GET
+        orden = parametros.get('orden', '')
+        if orden.lstrip('-') not in self.columnas:
+            orden = self.orden
+        descendente = orden.startswith('-')
+        ruta = self.columnas[orden.lstrip('-')]
+
+        filas = self.queryset
+        filtros = {}
+        if self.filtrar is not None:
+            try:
+                filas, filtros = self.filtrar(filas, parametros)
+            except (ValidationError, ValueError):
+                messages.error(request, 'Los filtros indicados no son validos.')
+                filas = self.queryset
+
+        cursor = self._decodificar_cursor(parametros.get('cursor', ''), orden)
+        lista, hay_mas = self._leer(filas, ruta, descendente, cursor)
+        atras = bool(cursor and cursor[2])
+        if atras and not hay_mas:
+            # Se volvio al inicio: se muestra la primera pagina completa
+            cursor, atras = None, False
+            lista, hay_mas = self._leer(filas, ruta, descendente, None)
+
+        if atras:
+            hay_anterior, hay_siguiente = hay_mas, True
+        else:
+            hay_anterior, hay_siguiente = cursor is not None, hay_mas
+
+        return {
+            'filas': lista,
+            'orden': orden,
+            'filtros': filtros,
+            'primera': cursor is None,
+            'anterior': self._codificar_cursor(orden, lista[0], atras=True) if lista and hay_anterior else None,
+            'siguiente': self._codificar_cursor(orden, lista[-1]) if lista and hay_siguiente else None,
+        }
+
+
+def render_tabla(request, plantilla, parcial, contexto):
+    """Renderiza la pagina completa, o solo el fragmento `parcial` si se pide con ?parcial=1"""
+    return render(request, parcial if request.GET.get('parcial') else plantilla, contexto)
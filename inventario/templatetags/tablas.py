@@ -0,0 +1,32 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def columna(context, nombre, titulo):
+    """
+    Encabezado ordenable de una tabla: enlace que ordena por la columna (o
+    invierte el orden si ya se ordena por ella) y vuelve a la primera pagina.
+    """
+    request = context['request']
+    orden = context['tabla']['orden']
+
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    parametros.pop('parcial', None)
+    if orden == nombre:
+        parametros['orden'] = f'-{nombre}'
+        icono = 'fa-sort-up'
+    elif orden == f'-{nombre}':
+        parametros['orden'] = nombre
+        icono = 'fa-sort-down'
+    else:
+        parametros['orden'] = nombre
+        icono = 'fa-sort text-muted'
+
+    return format_html(
+        '<a href="?{}" class="js-tabla-enlace text-dark">{} <i class="fas {}"></i></a>',
+        parametros.urlencode(), titulo, icono,
+    )
@@ -1,3 +1,1067 @@
-from django.test import TestCase
+"""
+Pruebas de inventario.
 
-# Create your tests here.
+Presupuesto de consultas por vista: cada vista de inventario/urls.py se ejecuta con datos de dos tamanos
+(PEQUENO y GRANDE registros por tabla). La prueba falla si una vista hace mas
+consultas que su presupuesto, o si hace mas consultas con mas datos (una
+consulta por fila, N+1). El mensaje nombra la vista y las consultas repetidas.
+
+Al agregar una vista a urls.py hay que agregar su caso en CASOS.
+
+Ademas: el stock al guardar entradas y salidas (models.py), la foto del
+usuario en la sesion (foto_usuario.py), las ordenes de
+compra (views/ordenes.py), la importacion y conciliacion de conteos
+(views/inventario_fisico.py), la lectura de
+los archivos importados, sus numeros y el catalogo de productos
+(importacion.py), la reconstruccion del
+resumen de productos (resumen.py), las lecturas en la replica (replicas.py),
+la medicion de consultas de los middleware, el registro de consultas lentas
+(lentas.py), el broker de eventos (eventos.py) y el pool de conexiones
+(backends/pool.py).
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import signing
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteWrapper
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import eventos, foto_usuario, lentas, replicas
+from .backends.pool import Pool, PoolMixin
+from .importacion import ArchivoInvalido, importar_catalogo, leer_filas, normalizar_decimal
+from .resumen import reconstruir, registrar_entradas
+from .middleware import LentasMiddleware, PerfilMiddleware, ReplicaMiddleware, huella_sql
+from .models import (
+    User,
+    Category,
+    Provider,
+    Product,
+    Entrada,
+    Salida,
+    InventarioSesion,
+    DetalleConteo,
+    InventoryAdjustment,
+    PurchaseOrder,
+    PurchaseOrderLine,
+    ProductSummary,
+)
+from .urls import urlpatterns
+from .views import inventario_fisico, ordenes
+from .views.entradas import CLAVE_IMPORTACION_ENTRADAS
+from .versiones import obtener_versiones
+
+PEQUENO = 3
+GRANDE = 30
+
+# Caches en memoria, aislados del cache de archivos del proyecto
+CACHES_PRUEBA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sesiones'},
+}
+
+# Flujos SSE: la respuesta no termina, no se puede contar sus consultas
+SIN_PRESUPUESTO = {'inventario_eventos', 'inventario_sesiones_eventos'}
+
+
+def crear_datos(n, sufijo):
+    """Crea n registros de cada tabla con codigos unicos por `sufijo`; retorna los objetos de referencia"""
+    ahora = timezone.now()
+    categoria = Category.objects.create(name=f'Categoria {sufijo}')
+    proveedor = Provider.objects.create(name=f'Proveedor {sufijo}', rif=f'J{sufijo}')
+    usuario = User.objects.create_user(f'usuario{sufijo}', password='clave-segura-1', first_name='Otro')
+
+    Product.objects.bulk_create([
+        Product(code=f'{sufijo}-{i}', name=f'Producto {sufijo} {i}', unit='unidad',
+                category=categoria, stock_actual=100, min_stock=5)
+        for i in range(n)
+    ])
+    productos = list(Product.objects.filter(code__startswith=f'{sufijo}-').order_by('pk'))
+
+    Entrada.objects.bulk_create([
+        Entrada(product=producto, provider=proveedor, user=usuario, quantity=10,
+                total_cost=100, created_at=ahora, updated_at=ahora)
+        for producto in productos
+    ])
+    Salida.objects.bulk_create([
+        Salida(product=producto, user=usuario, receptor='Taller', quantity=1, motivo='Uso')
+        for producto in productos
+    ])
+
+    sesiones = {}
+    for estado in ('finalizado', 'en_proceso'):
+        sesion = InventarioSesion.objects.create(
+            user=usuario, status=estado, total_productos=n, productos_con_diferencia=n
+        )
+        DetalleConteo.objects.bulk_create([
+            DetalleConteo(sesion=sesion, product=producto, stock_sistema=100,
+                          cantidad_contada=99, diferencia=-1)
+            for producto in productos
+        ])
+        sesiones[estado] = sesion
+
+    orden = PurchaseOrder.objects.create(
+        order_number=f'OC-{sufijo}', provider=proveedor, user=usuario,
+        total_cost=10 * n, cantidad_pedida=5 * n, lineas_pendientes=n,
+    )
+    PurchaseOrderLine.objects.bulk_create([
+        PurchaseOrderLine(order=orden, product=producto, quantity=5, unit_cost=2)
+        for producto in productos
+    ])
+
+    return {
+        'n': n,
+        'sufijo': sufijo,
+        'categoria': categoria,
+        'categoria_vacia': Category.objects.create(name=f'Vacia {sufijo}'),
+        'proveedor': proveedor,
+        'proveedor_vacio': Provider.objects.create(name=f'Sin entradas {sufijo}', rif=f'V{sufijo}'),
+        'usuario': usuario,
+        'productos': productos,
+        'producto_libre': Product.objects.create(
+            code=f'{sufijo}-libre', name='Sin movimientos', unit='unidad', category=categoria
+        ),
+        'entrada': Entrada.objects.filter(product__in=productos).first(),
+        'salida': Salida.objects.filter(product__in=productos).first(),
+        'sesion': sesiones['finalizado'],
+        'sesion_abierta': sesiones['en_proceso'],
+        'conteo': sesiones['en_proceso'].detalles.first(),
+        'orden': orden,
+    }
+
+
+def archivo_csv(encabezado, filas):
+    contenido = '\n'.join([encabezado] + [','.join(map(str, fila)) for fila in filas])
+    return SimpleUploadedFile('datos.csv', contenido.encode(), content_type='text/csv')
+
+
+def _importar_factura(client, d):
+    """Deja la vista previa de la factura en la sesion para medir la confirmacion"""
+    client.post(reverse('entrada_importar'), {
+        'provider': d['proveedor'].pk,
+        'archivo': archivo_csv('codigo,cantidad,costo', [(p.code, 2, 10) for p in d['productos']]),
+    })
+
+
+def caso(presupuesto, metodo='get', url=None, args=None, datos=None, preparar=None, anonimo=False, **extra):
+    """
+    Peticion de una vista. `args`, `datos` y `url` reciben los datos creados
+    por crear_datos; `preparar` se ejecuta antes sin contar sus consultas.
+    """
+    return {
+        'presupuesto': presupuesto,
+        'metodo': metodo,
+        'url': url,
+        'args': args,
+        'datos': datos,
+        'preparar': preparar,
+        'anonimo': anonimo,
+        'extra': extra,
+    }
+
+
+CASOS = {
+    'login': caso(9, 'post', anonimo=True, datos=lambda d: {'username': d['usuario'].username, 'password': 'clave-segura-1'}),
+    'logout': caso(2),
+    'dashboard': caso(5),
+
+    'entrada_historial': caso(2),
+    'entrada_registrar': caso(9, 'post', datos=lambda d: {
+        'product_code': d['productos'][0].code, 'provider': d['proveedor'].pk, 'quantity': 3, 'total_cost': 9,
+    }),
+    'entrada_importar': caso(11, 'post', datos=lambda d: {'accion': 'confirmar'}, preparar=_importar_factura),
+    'entrada_detalle': caso(2, args=lambda d: [d['entrada'].pk]),
+    'buscar_producto': caso(1, datos=lambda d: {'code': d['productos'][0].code}),
+    'buscar_productos_lote': caso(1, 'post', content_type='application/json', datos=lambda d: json.dumps({
+        'codes': [p.code for p in d['productos']] + ['NO-EXISTE'],
+    })),
+    'buscar_productos_autocomplete': caso(1, datos=lambda d: {'term': d['sufijo']}),
+    'buscar_producto_async': caso(1, datos=lambda d: {'code': d['productos'][0].code}),
+    'buscar_productos_autocomplete_async': caso(1, datos=lambda d: {'term': d['sufijo']}),
+
+    'orden_list': caso(1),
+    'orden_create': caso(7, 'post', datos=lambda d: {
+        'order_number': f'OC-NUEVA-{d["sufijo"]}',
+        'provider': d['proveedor'].pk,
+        'codigo': [p.code for p in d['productos']],
+        'cantidad': ['4'] * d['n'],
+        'costo': ['1.50'] * d['n'],
+    }),
+    'orden_detalle': caso(3, args=lambda d: [d['orden'].pk]),
+    'orden_recibir': caso(12, 'post', args=lambda d: [d['orden'].pk], datos=lambda d: {
+        f'recibir_{linea.pk}': 5 for linea in d['orden'].lineas.all()
+    }),
+    'orden_cancelar': caso(4, 'post', args=lambda d: [d['orden'].pk]),
+
+    'api_indice': caso(0),
+    'api_recurso': caso(1, args=lambda d: ['entradas'], datos=lambda d: {'limit': 1000}),
+
+    'inventario_sesiones': caso(1),
+    'inventario_iniciar': caso(2, 'post', datos=lambda d: {'notas': 'Conteo'}),
+    'inventario_conteo': caso(3, args=lambda d: [d['sesion_abierta'].pk]),
+    'inventario_registrar_conteo': caso(11, 'post', args=lambda d: [d['sesion_abierta'].pk], datos=lambda d: {
+        'product_code': d['producto_libre'].code, 'cantidad': 7,
+    }),
+    'inventario_registrar_conteo_async': caso(11, 'post', args=lambda d: [d['sesion_abierta'].pk], datos=lambda d: {
+        'product_code': d['producto_libre'].code, 'cantidad': 7,
+    }),
+    'inventario_finalizar': caso(5, 'post', args=lambda d: [d['sesion_abierta'].pk]),
+    'inventario_resultados': caso(4, args=lambda d: [d['sesion'].pk]),
+    'inventario_conciliar': caso(7, 'post', args=lambda d: [d['sesion'].pk]),
+    'inventario_cancelar': caso(2, 'post', args=lambda d: [d['sesion_abierta'].pk]),
+    'inventario_eliminar_conteo': caso(9, 'post', args=lambda d: [d['sesion_abierta'].pk, d['conteo'].pk]),
+    'inventario_importar_conteo': caso(11, 'post', args=lambda d: [d['sesion_abierta'].pk], datos=lambda d: {
+        'archivo': archivo_csv('codigo,cantidad', [(p.code, 50) for p in d['productos']]),
+    }),
+    'exportar_reporte_auditoria': caso(2, args=lambda d: [d['sesion'].pk]),
+
+    'categoria_list': caso(1),
+    'categoria_create': caso(2, 'post', datos=lambda d: {'name': f'Nueva {d["sufijo"]}'}),
+    'categoria_edit': caso(3, 'post', args=lambda d: [d['categoria'].pk], datos=lambda d: {'name': 'Editada'}),
+    'categoria_delete': caso(4, 'post', args=lambda d: [d['categoria_vacia'].pk]),
+
+    'proveedor_list': caso(1),
+    'proveedor_analisis': caso(1),
+    'proveedor_create': caso(2, 'post', datos=lambda d: {'name': 'Nuevo', 'rif': f'N{d["sufijo"]}'}),
+    'proveedor_edit': caso(3, 'post', args=lambda d: [d['proveedor'].pk], datos=lambda d: {
+        'name': 'Editado', 'rif': d['proveedor'].rif,
+    }),
+    'proveedor_delete': caso(7, 'post', args=lambda d: [d['proveedor_vacio'].pk]),
+
+    'producto_list': caso(2),
+    'producto_create': caso(3, 'post', datos=lambda d: {
+        'code': f'NUEVO-{d["sufijo"]}', 'name': 'Nuevo', 'unit': 'unidad', 'category': d['categoria'].pk,
+    }),
+    'producto_edit': caso(4, 'post', args=lambda d: [d['productos'][0].pk], datos=lambda d: {
+        'code': d['productos'][0].code, 'name': 'Editado', 'unit': 'caja', 'category': d['categoria'].pk,
+    }),
+    'producto_delete': caso(10, 'post', args=lambda d: [d['producto_libre'].pk]),
+    'producto_importar': caso(5, 'post', datos=lambda d: {
+        'archivo': archivo_csv('codigo,nombre,unidad,categoria', [
+            (p.code, f'Importado {i}', 'unidad', d['categoria'].name) for i, p in enumerate(d['productos'])
+        ]),
+    }),
+    'exportar_inventario_actual': caso(1),
+
+    'salida_historial': caso(1),
+    'salida_registrar': caso(9, 'post', datos=lambda d: {
+        'product_code': d['productos'][0].code, 'receptor': 'Taller', 'quantity': 1, 'motivo': 'Uso',
+    }),
+    'salida_detalle': caso(2, args=lambda d: [d['salida'].pk]),
+    'exportar_reporte_salidas': caso(1),
+
+    'usuario_list': caso(1),
+    'usuario_create': caso(2, 'post', datos=lambda d: {
+        'username': f'nuevo{d["sufijo"]}', 'first_name': 'Nuevo', 'last_name': 'Usuario',
+        'password': 'clave-segura-1', 'password_confirm': 'clave-segura-1', 'role': 'almacen',
+    }),
+    'usuario_edit': caso(3, 'post', args=lambda d: [d['usuario'].pk], datos=lambda d: {
+        'username': d['usuario'].username, 'first_name': 'Editado', 'last_name': 'Usuario', 'role': 'ventas',
+    }),
+    'usuario_delete': caso(19, 'post', args=lambda d: [d['usuario'].pk]),
+
+    'exportar_metricas': caso(0),
+    'consultas_lentas': caso(0),
+    'consultas_lentas_vaciar': caso(0, 'post'),
+
+    'perfil_edit': caso(1, 'post', datos=lambda d: {'first_name': 'Admin', 'last_name': 'Prueba', 'email': 'a@b.test'}),
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+# Las consultas se cuentan en 'default': las vistas de reportes no se envian a la replica
+@override_settings(REPLICA_BD=None)
+class PresupuestoConsultasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='clave-segura-1', role='admin')
+
+    def medir(self, nombre, datos_caso, n, sufijo):
+        """Ejecuta la vista sobre datos nuevos de tamano n; retorna las consultas y descarta los datos"""
+        with transaction.atomic():
+            d = crear_datos(n, sufijo)
+            self.client.logout()
+            if not datos_caso['anonimo']:
+                self.client.force_login(self.admin)
+            if datos_caso['preparar']:
+                datos_caso['preparar'](self.client, d)
+            # Sin cache: se mide la consulta, no el acierto del cache
+            cache.clear()
+            if not datos_caso['anonimo']:
+                # La primera peticion de la sesion guarda la foto del usuario (foto_usuario.py);
+                # se mide una peticion de una sesion ya en uso
+                self.client.get(reverse('api_indice'))
+
+            args = datos_caso['args'](d) if datos_caso['args'] else []
+            url = datos_caso['url'](d) if datos_caso['url'] else reverse(nombre, args=args)
+            datos = datos_caso['datos'](d) if datos_caso['datos'] else {}
+            with CaptureQueriesContext(connection) as consultas:
+                response = getattr(self.client, datos_caso['metodo'])(url, datos, **datos_caso['extra'])
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, f'{nombre} respondio {response.status_code}')
+            transaction.set_rollback(True)
+        return [consulta['sql'] for consulta in consultas.captured_queries]
+
+    def test_todas_las_vistas_tienen_presupuesto(self):
+        nombres = {patron.name for patron in urlpatterns} - SIN_PRESUPUESTO
+        self.assertEqual(sorted(nombres - set(CASOS)), [], 'Vistas sin presupuesto de consultas en CASOS')
+
+    def test_presupuesto_de_consultas(self):
+        for numero, (nombre, datos_caso) in enumerate(sorted(CASOS.items())):
+            with self.subTest(vista=nombre):
+                pocas = self.medir(nombre, datos_caso, PEQUENO, f'p{numero}')
+                muchas = self.medir(nombre, datos_caso, GRANDE, f'g{numero}')
+
+                repetidas = '\n'.join(
+                    f'  {veces}x {huella}'
+                    for huella, veces in Counter(map(huella_sql, muchas)).most_common()
+                    if veces > 1
+                )
+                self.assertLessEqual(
+                    len(muchas), len(pocas),
+                    f'{nombre} hace {len(pocas)} consultas con {PEQUENO} registros y {len(muchas)} '
+                    f'con {GRANDE}. Consultas repetidas:\n{repetidas}'
+                )
+                self.assertLessEqual(
+                    len(muchas), datos_caso['presupuesto'],
+                    f'{nombre} hace {len(muchas)} consultas; el presupuesto es {datos_caso["presupuesto"]}. '
+                    f'Consultas repetidas:\n{repetidas}'
+                )
+
+
+@override_settings(CACHES=CACHES_PRUEBA, FOTO_USUARIO=True)
+class FotoUsuarioTests(TestCase):
+    """El usuario se arma desde la foto de la sesion hasta que cambia en la base de datos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='clave-segura-1', role='admin', first_name='Admin')
+        cls.empleado = User.objects.create_user('empleado', password='clave-segura-2', role='admin', first_name='Emp')
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='admin', password='clave-segura-1')
+        self.cliente_empleado = self.client_class()
+        self.cliente_empleado.login(username='empleado', password='clave-segura-2')
+        # La primera peticion de cada sesion guarda la foto
+        self.client.get(reverse('api_indice'))
+        self.cliente_empleado.get(reverse('api_indice'))
+
+    def consultas_de_usuario(self, cliente, nombre='api_indice'):
+        """Pide la vista; retorna la respuesta y las consultas a la tabla de usuarios"""
+        with CaptureQueriesContext(connection) as consultas:
+            response = cliente.get(reverse(nombre))
+        tabla = User._meta.db_table
+        return response, [consulta['sql'] for consulta in consultas.captured_queries if tabla in consulta['sql']]
+
+    def foto(self, cliente):
+        return signing.loads(cliente.session[foto_usuario.CLAVE_SESION], salt=foto_usuario.SAL)['campos']
+
+    def guardar_en_sesion(self, cliente, valor):
+        sesion = cliente.session
+        sesion[foto_usuario.CLAVE_SESION] = valor
+        sesion.save()
+
+    def test_con_foto_no_se_consulta_el_usuario(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.cliente_empleado.get(reverse('api_indice'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(consultas), 0)
+
+    def test_usuario_edit_recarga_el_usuario(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('usuario_edit', args=[self.empleado.pk]), {
+                'username': 'empleado', 'first_name': 'Emp', 'last_name': '',
+                'role': 'almacen', 'status': 'inactive',
+            })
+        response, consultas = self.consultas_de_usuario(self.cliente_empleado, 'usuario_list')
+        self.assertTrue(consultas)
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.foto(self.cliente_empleado)['role'], 'almacen')
+        self.assertEqual(self.foto(self.cliente_empleado)['status'], 'inactive')
+
+    def test_perfil_edit_recarga_el_usuario_sin_tocar_la_contrasena(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente_empleado.post(reverse('perfil_edit'), {
+                'first_name': 'Empleada', 'last_name': 'Nueva', 'email': 'e@b.test',
+            })
+        response, consultas = self.consultas_de_usuario(self.cliente_empleado)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(consultas)
+        self.assertEqual(self.foto(self.cliente_empleado)['first_name'], 'Empleada')
+        self.assertTrue(User.objects.get(pk=self.empleado.pk).check_password('clave-segura-2'))
+
+    def test_cambio_de_contrasena_cierra_la_sesion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente_empleado.post(reverse('perfil_edit'), {
+                'first_name': 'Emp', 'last_name': '', 'email': '',
+                'password': 'clave-nueva-3', 'password_confirm': 'clave-nueva-3',
+            })
+        self.assertEqual(self.cliente_empleado.get(reverse('api_indice')).status_code, 401)
+
+    def test_usuario_inactivo_cierra_la_sesion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            empleado = User.objects.get(pk=self.empleado.pk)
+            empleado.is_active = False
+            empleado.save()
+        self.assertEqual(self.cliente_empleado.get(reverse('api_indice')).status_code, 401)
+
+    def test_usuario_delete_cierra_la_sesion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('usuario_delete', args=[self.empleado.pk]))
+        self.assertFalse(User.objects.filter(pk=self.empleado.pk).exists())
+        self.assertEqual(self.cliente_empleado.get(reverse('api_indice')).status_code, 401)
+
+    def test_last_login_no_invalida_la_foto(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username='empleado', password='clave-segura-2')
+        _, consultas = self.consultas_de_usuario(self.cliente_empleado)
+        self.assertEqual(consultas, [])
+
+    def test_foto_de_otra_version_se_descarta(self):
+        campos = self.foto(self.cliente_empleado)
+        self.guardar_en_sesion(self.cliente_empleado, signing.dumps(
+            {'campos': campos, 'version': 'vieja'}, salt=foto_usuario.SAL
+        ))
+        response, consultas = self.consultas_de_usuario(self.cliente_empleado)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(consultas)
+
+    def test_foto_falsificada_se_descarta(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.empleado.pk).update(role='almacen')
+            foto_usuario.invalidar(foto_usuario._recurso(self.empleado.pk))
+        self.cliente_empleado.get(reverse('api_indice'))
+        campos = {**self.foto(self.cliente_empleado), 'role': 'admin'}
+        [(version, _)] = obtener_versiones(foto_usuario._recurso(self.empleado.pk))
+        # Sin la clave del proyecto la firma no coincide
+        self.guardar_en_sesion(self.cliente_empleado, signing.dumps(
+            {'campos': campos, 'version': version}, key='otra-clave', salt=foto_usuario.SAL
+        ))
+        response, consultas = self.consultas_de_usuario(self.cliente_empleado, 'usuario_list')
+        self.assertTrue(consultas)
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.foto(self.cliente_empleado)['role'], 'almacen')
+
+
+class MovimientosStockTests(TestCase):
+    def test_stock_cambia_solo_al_crear(self):
+        d = crear_datos(1, 'm')
+        producto = d['productos'][0]
+        entrada = Entrada.objects.create(
+            product=producto, provider=d['proveedor'], user=d['usuario'], quantity=7, total_cost=0
+        )
+        salida = Salida.objects.create(product=producto, user=d['usuario'], receptor='Taller', quantity=2, motivo='Uso')
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 105)
+
+        # Guardar de nuevo un movimiento, aun con otra cantidad, no mueve el stock
+        entrada.quantity = 9
+        entrada.save()
+        salida.save()
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, 105)
+
+
+class OrdenesTests(TestCase):
+    def setUp(self):
+        self.d = crear_datos(2, 'o')
+        self.orden = self.d['orden']
+        self.lineas = list(self.orden.lineas.order_by('pk'))
+        self.client.force_login(self.d['usuario'])
+
+    def crear(self, numero):
+        return self.client.post(reverse('orden_create'), {
+            'order_number': numero,
+            'provider': self.d['proveedor'].pk,
+            'codigo': [p.code for p in self.d['productos']],
+            'cantidad': ['3', '4'],
+            'costo': ['2.50', ''],
+        })
+
+    def recibir(self, *cantidades):
+        datos = {f'recibir_{linea.pk}': cantidad for linea, cantidad in zip(self.lineas, cantidades)}
+        return self.client.post(reverse('orden_recibir', args=[self.orden.pk]), datos)
+
+    def test_crear(self):
+        self.crear('OC-nueva')
+        orden = PurchaseOrder.objects.get(order_number='OC-nueva')
+        self.assertEqual(orden.total_cost, Decimal('7.50'))
+        self.assertEqual((orden.cantidad_pedida, orden.lineas_pendientes, orden.status), (7, 2, 'pendiente'))
+        self.assertEqual(sorted(orden.lineas.values_list('quantity', flat=True)), [3, 4])
+
+    def test_crear_con_numero_tomado_despues_de_validar(self):
+        resolver = ordenes.resolver_productos
+
+        def otra_peticion(*args, **kwargs):
+            PurchaseOrder.objects.create(
+                order_number='OC-carrera', provider=self.d['proveedor'], user=self.d['usuario'], total_cost=0
+            )
+            return resolver(*args, **kwargs)
+
+        with mock.patch.object(ordenes, 'resolver_productos', otra_peticion):
+            response = self.crear('OC-carrera')
+        self.assertContains(response, 'Ya existe una orden con ese numero.')
+        self.assertFalse(PurchaseOrderLine.objects.filter(order__order_number='OC-carrera').exists())
+
+    def test_recibir_parcial_y_completar(self):
+        self.recibir(5, 2)
+        self.orden.refresh_from_db()
+        self.assertEqual((self.orden.status, self.orden.cantidad_recibida, self.orden.lineas_pendientes), ('parcial', 7, 1))
+        self.assertEqual(Product.objects.get(pk=self.lineas[1].product_id).stock_actual, 102)
+
+        # La linea completa ya no aparece en el formulario
+        self.recibir(3)
+        self.lineas = self.lineas[1:]
+        self.recibir(3)
+        self.orden.refresh_from_db()
+        self.assertEqual((self.orden.status, self.orden.cantidad_recibida, self.orden.lineas_pendientes), ('recibida', 10, 0))
+        self.assertEqual(Entrada.objects.filter(purchase_order_line__order=self.orden).count(), 3)
+
+    def test_cancelar(self):
+        self.client.post(reverse('orden_cancelar', args=[self.orden.pk]))
+        self.orden.refresh_from_db()
+        self.assertEqual(self.orden.status, 'cancelada')
+
+        # Una orden cancelada no se recibe
+        self.recibir(5, 5)
+        self.assertFalse(Entrada.objects.filter(purchase_order_line__order=self.orden).exists())
+
+    def test_actualizar_estado(self):
+        # Lo recibido de mas no cuenta sobre lo pedido
+        PurchaseOrderLine.objects.filter(pk=self.lineas[0].pk).update(quantity_received=8)
+        ordenes._actualizar_estado(self.orden)
+        self.orden.refresh_from_db()
+        self.assertEqual((self.orden.cantidad_pedida, self.orden.cantidad_recibida), (10, 5))
+        self.assertEqual((self.orden.status, self.orden.lineas_pendientes), ('parcial', 1))
+
+        PurchaseOrderLine.objects.filter(pk=self.lineas[1].pk).update(quantity_received=5)
+        ordenes._actualizar_estado(self.orden)
+        self.assertEqual((self.orden.status, self.orden.lineas_pendientes), ('recibida', 0))
+
+        # Los totales de una orden cancelada se recalculan, el estado no cambia
+        self.orden.status = 'cancelada'
+        PurchaseOrderLine.objects.filter(pk=self.lineas[1].pk).update(quantity_received=0)
+        ordenes._actualizar_estado(self.orden)
+        self.orden.refresh_from_db()
+        self.assertEqual((self.orden.status, self.orden.cantidad_recibida), ('cancelada', 5))
+
+
+class InventarioFisicoTests(TestCase):
+    """La sesion abierta de crear_datos tiene los dos productos contados en 99 con stock 100"""
+
+    def setUp(self):
+        self.d = crear_datos(2, 'i')
+        self.sesion = self.d['sesion_abierta']
+        self.client.force_login(self.d['usuario'])
+
+    def contadores(self, sesion):
+        sesion.refresh_from_db()
+        return sesion.total_productos, sesion.productos_con_diferencia
+
+    def test_importar_actualiza_y_crea_conteos(self):
+        primero, segundo = self.d['productos']
+        libre = self.d['producto_libre']
+        filas = [(primero.code, 100), (segundo.code, 7), (segundo.code, 100), (libre.code, 5), ('NO-EXISTE', 1)]
+        self.client.post(reverse('inventario_importar_conteo', args=[self.sesion.pk]), {
+            'archivo': archivo_csv('codigo,cantidad', filas),
+        })
+
+        conteos = {c.product_id: c for c in self.sesion.detalles.all()}
+        self.assertEqual(len(conteos), 3)
+        # Los conteos existentes conservan su stock_sistema; gana la ultima lectura del codigo repetido
+        self.assertEqual((conteos[primero.pk].stock_sistema, conteos[primero.pk].diferencia), (100, 0))
+        self.assertEqual(conteos[segundo.pk].cantidad_contada, 100)
+        self.assertEqual(conteos[libre.pk].diferencia, 5)
+        self.assertEqual(self.contadores(self.sesion), (3, 1))
+
+    def test_importar_en_sesion_cerrada_no_escribe(self):
+        InventarioSesion.objects.filter(pk=self.sesion.pk).update(status='finalizado')
+        resultado = {'creados': 0, 'actualizados': 0, 'desconocidos': 0, 'codigos_desconocidos': []}
+        lote = [(1, self.d['producto_libre'].code, 5)]
+        # self.sesion todavia dice en_proceso: el estado se vuelve a leer con la fila bloqueada
+        self.assertFalse(inventario_fisico._importar_lote_conteos(self.sesion, lote, resultado))
+        self.assertEqual(self.sesion.detalles.count(), 2)
+
+    def test_ajustar_contadores(self):
+        self.assertEqual(
+            inventario_fisico._ajustar_contadores(self.sesion.pk, 1, 1),
+            {'total_productos': 3, 'productos_con_diferencia': 3},
+        )
+        inventario_fisico._ajustar_contadores(self.sesion.pk, -1, -2)
+        self.assertEqual(self.contadores(self.sesion), (2, 1))
+
+        cerrada = self.d['sesion']
+        self.assertIsNone(inventario_fisico._ajustar_contadores(cerrada.pk, 1, 1))
+        self.assertEqual(self.contadores(cerrada), (2, 2))
+
+    def test_conciliar_una_sola_vez(self):
+        sesion = self.d['sesion']
+        url = reverse('inventario_conciliar', args=[sesion.pk])
+        self.client.post(url)
+        self.client.post(url)
+
+        sesion.refresh_from_db()
+        self.assertEqual(sesion.status, 'conciliado')
+        self.assertEqual(InventoryAdjustment.objects.count(), 2)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.d['productos']]).values_list('stock_actual', flat=True)),
+            [99, 99],
+        )
+
+
+class LeerFilasTests(SimpleTestCase):
+    def test_utf8_con_caracter_cortado_por_la_muestra(self):
+        # La 'e' acentuada ocupa los bytes 65535 y 65536: la muestra de 64 KiB la corta
+        relleno = 'x' * (64 * 1024 - len('codigo,nombre\n') - len('A1,') - 1)
+        contenido = f'codigo,nombre\nA1,{relleno}\u00e9\n'.encode()
+        self.assertEqual(contenido.index('\u00e9'.encode()), 64 * 1024 - 1)
+
+        filas = list(leer_filas(SimpleUploadedFile('datos.csv', contenido)))
+        self.assertEqual(filas[1], ('A1', relleno + '\u00e9'))
+
+
+def archivo_catalogo(lineas, encoding='utf-8'):
+    return SimpleUploadedFile('catalogo.csv', '\r\n'.join(lineas).encode(encoding), content_type='text/csv')
+
+
+class ImportarCatalogoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Category.objects.create(name='Tuberias')
+        Category.objects.create(name='Descontinuados', status='inactive')
+        cls.existente = Product.objects.create(
+            code='TUB-1', name='Tubo viejo', unit='metro', category=cls.categoria,
+            stock_actual=40, min_stock=2, location='A1',
+        )
+
+    def test_crea_y_actualiza(self):
+        resultado = importar_catalogo(archivo_catalogo([
+            'codigo,nombre,unidad,categoria,stock_minimo',
+            'tub-1,Tubo PVC,unidad,tuberias,5',
+            'TUB-2,Codo PVC,unidad,Tuberias,',
+        ]))
+        self.assertEqual((resultado['filas'], resultado['creados'], resultado['actualizados']), (2, 1, 1))
+
+        # El existente conserva su codigo, su stock y las columnas que no trae el archivo
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.code, 'TUB-1')
+        self.assertEqual((self.existente.name, self.existente.min_stock), ('Tubo PVC', 5))
+        self.assertEqual((self.existente.stock_actual, self.existente.location), (40, 'A1'))
+
+        nuevo = Product.objects.get(code='TUB-2')
+        self.assertEqual((nuevo.category, nuevo.stock_actual, nuevo.min_stock), (self.categoria, 0, 0))
+
+    def test_codificacion_y_separador(self):
+        archivos = {
+            'utf-8 con coma': archivo_catalogo(['código,nombre,unidad,categoría', 'TUB-3,Tubería ½",unidad,Tuberias']),
+            'cp1252 con punto y coma': archivo_catalogo(
+                ['Código;Nombre;Unidad;Categoría', 'TUB-3;Tubería ½";unidad;Tuberias'], 'cp1252'
+            ),
+        }
+        for caso, archivo in archivos.items():
+            with self.subTest(caso):
+                resultado = importar_catalogo(archivo)
+                self.assertEqual(resultado['invalidas'], 0, resultado['errores'])
+                self.assertEqual(Product.objects.get(code='TUB-3').name, 'Tubería ½"')
+
+    def test_filas_invalidas(self):
+        resultado = importar_catalogo(archivo_catalogo([
+            'codigo,nombre,unidad,categoria,stock_minimo',
+            ',Sin codigo,unidad,Tuberias,',
+            'TUB-4,,unidad,Tuberias,',
+            'TUB-5,Valvula,unidad,Griferia,',
+            'TUB-6,Llave,unidad,Descontinuados,',
+            'TUB-7,Tapon,unidad,Tuberias,-1',
+            'TUB-8,Union,unidad,Tuberias,',
+            'tub-8,Union repetida,unidad,Tuberias,',
+        ]))
+        self.assertEqual((resultado['filas'], resultado['invalidas'], resultado['creados']), (7, 6, 1))
+        self.assertEqual(resultado['errores'], [
+            (2, 'El codigo del producto es requerido.'),
+            (3, 'El nombre del producto es requerido.'),
+            (4, 'La categoria "Griferia" no existe.'),
+            (5, 'La categoria "Descontinuados" esta inactiva.'),
+            (6, 'El stock minimo no puede ser negativo.'),
+            (8, 'El codigo "tub-8" esta repetido en el archivo (fila 7).'),
+        ])
+
+    def test_opciones_y_limite_de_errores(self):
+        lineas = ['codigo,nombre,unidad,categoria', 'TUB-1,Tubo,unidad,Tuberias', 'TUB-9,Reduccion,unidad,Accesorios']
+        resultado = importar_catalogo(archivo_catalogo(lineas), solo_nuevos=True, max_errores=0)
+        # Sin crear_categorias la fila nueva tambien falla; los errores se cuentan aunque no se listen
+        self.assertEqual((resultado['invalidas'], resultado['errores']), (2, []))
+        self.assertEqual(Product.objects.get(code='TUB-1').name, 'Tubo viejo')
+
+        resultado = importar_catalogo(archivo_catalogo(lineas), solo_nuevos=True, crear_categorias=True)
+        self.assertEqual(resultado['errores'], [(2, 'Ya existe un producto con el codigo "TUB-1".')])
+        self.assertEqual(Product.objects.get(code='TUB-9').category.name, 'Accesorios')
+
+    def test_archivo_sin_columnas_requeridas(self):
+        with self.assertRaisesMessage(ArchivoInvalido, 'Faltan las columnas: unidad, categoria.'):
+            importar_catalogo(archivo_catalogo(['codigo,nombre', 'TUB-1,Tubo']))
+        with self.assertRaisesMessage(ArchivoInvalido, 'El archivo no tiene filas.'):
+            importar_catalogo(archivo_catalogo([]))
+
+
+class ImportarFacturaTests(TestCase):
+    def test_vista_previa_fuera_de_la_sesion(self):
+        d = crear_datos(2, 'f')
+        self.client.force_login(d['usuario'])
+        with self.settings(IMPORTACIONES_DIR=self.enterContext(tempfile.TemporaryDirectory())):
+            _importar_factura(self.client, d)
+            # La sesion guarda solo el token; las lineas quedan en un archivo
+            token = self.client.session[CLAVE_IMPORTACION_ENTRADAS]
+            self.assertRegex(token, r'^[0-9a-f]{32}$')
+            self.assertEqual(len(os.listdir(settings.IMPORTACIONES_DIR)), 1)
+
+            antes = Entrada.objects.count()
+            self.client.post(reverse('entrada_importar'), {'accion': 'confirmar'})
+            self.assertEqual(Entrada.objects.count(), antes + 2)
+            self.assertEqual(os.listdir(settings.IMPORTACIONES_DIR), [])
+
+            # El token ya se uso: una segunda confirmacion no registra nada
+            self.client.post(reverse('entrada_importar'), {'accion': 'confirmar'})
+            self.assertEqual(Entrada.objects.count(), antes + 2)
+
+
+class NormalizarDecimalTests(SimpleTestCase):
+    def test_separador_decimal_es_el_ultimo(self):
+        casos = {
+            '1.234,56': Decimal('1234.56'),
+            '1,234.56': Decimal('1234.56'),
+            '1234,5': Decimal('1234.50'),
+            '1234.5': Decimal('1234.50'),
+            '1.234.567': Decimal('1234567.00'),
+            '1,234,567.8': Decimal('1234567.80'),
+            ' 12 ': Decimal('12.00'),
+            '': Decimal('0'),
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(normalizar_decimal(texto), esperado)
+
+    def test_numero_mal_formado(self):
+        for texto in ('1.234,5,6', '1,2.3.4', 'abc', 'NaN'):
+            with self.subTest(texto=texto):
+                with self.assertRaises(ValueError):
+                    normalizar_decimal(texto)
+
+
+
+class ReconstruirResumenTests(TestCase):
+    def test_acumulados_del_anio_actual(self):
+        d = crear_datos(1, 'r')
+        producto = d['productos'][0]
+        anio = timezone.localdate().year
+        Entrada.objects.create(
+            product=producto, provider=d['proveedor'], user=d['usuario'], quantity=7, total_cost=1,
+            created_at=timezone.make_aware(datetime(anio - 1, 12, 31, 23, 59)),
+        )
+
+        reconstruir([producto.pk])
+        resumen = ProductSummary.objects.get(product=producto)
+        self.assertEqual((resumen.anio, resumen.entradas_anio, resumen.salidas_anio), (anio, 10, 1))
+
+        # Los movimientos siguientes suman sobre el acumulado reconstruido
+        registrar_entradas({producto.pk: 5}, d['proveedor'].pk)
+        resumen.refresh_from_db()
+        self.assertEqual((resumen.anio, resumen.entradas_anio, resumen.salidas_anio), (anio, 15, 1))
+
+
+
+REPLICA_PRUEBA = 'replica_prueba'
+
+
+@replicas.lectura_replica
+def _vista_categorias(request):
+    return JsonResponse(list(Category.objects.order_by('name').values_list('name', flat=True)), safe=False)
+
+
+@override_settings(REPLICA_BD=REPLICA_PRUEBA, REPLICA_INTERVALO=0)
+class ReplicaTests(TestCase):
+    """
+    La replica es una segunda base SQLite en memoria con otros datos: la
+    respuesta de la vista dice de que base leyo.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # connections lee sus alias del mismo diccionario que settings.DATABASES;
+        # el alias tiene que existir antes de que TestCase abra sus transacciones
+        replica = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        # configure_settings completa las claves por defecto, como al iniciar
+        replica = connections.configure_settings({'default': {}, REPLICA_PRUEBA: replica})[REPLICA_PRUEBA]
+        parche = mock.patch.dict(settings.DATABASES, {REPLICA_PRUEBA: replica})
+        parche.start()
+        cls.addClassCleanup(parche.stop)
+        cls.addClassCleanup(connections.__delitem__, REPLICA_PRUEBA)
+        cls.addClassCleanup(connections[REPLICA_PRUEBA].close)
+        with connections[REPLICA_PRUEBA].schema_editor() as editor:
+            editor.create_model(Category)
+        # El alias no existia cuando el runner preparo las bases de prueba
+        cls.databases = {'default', REPLICA_PRUEBA}
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.using(REPLICA_PRUEBA).create(name='En replica')
+        Category.objects.create(name='En principal')
+
+    def setUp(self):
+        replicas._retraso.update(valor=None, medido=0.0, midiendo=False)
+        self.factory = RequestFactory()
+
+    def leer(self, **cookies):
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        return json.loads(_vista_categorias(request).content)
+
+    def test_vista_marcada_lee_de_la_replica(self):
+        self.assertEqual(self.leer(), ['En replica'])
+        # Fuera de la vista marcada se lee del principal
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['En principal'])
+
+    def test_escritura_reciente_lee_del_principal(self):
+        def escribir(request):
+            Category.objects.create(name='Nueva')
+            return HttpResponse()
+
+        response = ReplicaMiddleware(escribir)(self.factory.post('/'))
+        self.assertEqual(Category.objects.using(REPLICA_PRUEBA).count(), 1)
+        cookie = response.cookies[replicas.COOKIE_ESCRITURA].value
+        self.assertEqual(self.leer(**{replicas.COOKIE_ESCRITURA: cookie}), ['En principal', 'Nueva'])
+        # Una escritura de hace mas de REPLICA_LECTURA_PROPIA segundos ya no cuenta
+        self.assertEqual(self.leer(**{replicas.COOKIE_ESCRITURA: str(float(cookie) - 60)}), ['En replica'])
+
+    def test_peticion_sin_escrituras_no_deja_cookie(self):
+        response = ReplicaMiddleware(lambda request: HttpResponse())(self.factory.get('/'))
+        self.assertNotIn(replicas.COOKIE_ESCRITURA, response.cookies)
+
+    def test_guardar_la_sesion_no_cuenta_como_escritura(self):
+        def vista(request):
+            request.session = SessionStore()
+            request.session['x'] = 1
+            request.session.save()
+            return HttpResponse()
+
+        response = ReplicaMiddleware(vista)(self.factory.get('/'))
+        self.assertTrue(Session.objects.exists())
+        self.assertNotIn(replicas.COOKIE_ESCRITURA, response.cookies)
+
+    def test_middleware_asincrono(self):
+        async def escribir(request):
+            replicas.ReplicaRouter().db_for_write(Category)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(escribir)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(self.factory.post('/')))
+        self.assertIn(replicas.COOKIE_ESCRITURA, response.cookies)
+
+    def test_replica_atrasada_o_sin_respuesta_lee_del_principal(self):
+        for valor in (60, None):
+            with self.subTest(retraso=valor), mock.patch.object(replicas, 'retraso', return_value=valor):
+                self.assertEqual(self.leer(), ['En principal'])
+        with mock.patch.object(replicas, 'retraso', return_value=1):
+            self.assertEqual(self.leer(), ['En replica'])
+
+
+@override_settings(PERFILADO=True)
+class MedicionConsultasTests(TestCase):
+    def test_vista_asincrona_sin_adaptar(self):
+        async def vista(request):
+            await Category.objects.acount()
+            await Category.objects.filter(name='x').aexists()
+            return HttpResponse()
+
+        middleware = PerfilMiddleware(vista)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        # Las consultas corren en el hilo de sync_to_async y se cuentan igual
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('desc="2 consultas"', response.headers['Server-Timing'])
+
+    def test_vista_sincrona(self):
+        def vista(request):
+            list(Category.objects.all())
+            return HttpResponse()
+
+        response = PerfilMiddleware(vista)(RequestFactory().get('/'))
+        self.assertIn('desc="1 consultas"', response.headers['Server-Timing'])
+
+
+@override_settings(CACHES=CACHES_PRUEBA, LENTAS=True, LENTAS_SQL_MS=0, LENTAS_PETICION_MS=10 ** 6, LENTAS_EXPLAIN=1)
+class LentasTests(TestCase):
+    def test_explain_despues_de_enviar_la_respuesta(self):
+        def vista(request):
+            list(Category.objects.filter(name='x'))
+            return HttpResponse()
+
+        lentas.vaciar()
+        with mock.patch.object(lentas, 'plan', return_value='plan') as plan:
+            response = LentasMiddleware(vista)(RequestFactory().get('/'))
+            plan.assert_not_called()
+            self.assertEqual(lentas.leer(), [])
+
+            response.close()
+        plan.assert_called_once()
+        # El close() original de la respuesta tambien corrio
+        self.assertTrue(response.closed)
+        [registro] = lentas.leer()
+        self.assertEqual(registro['plan'], 'plan')
+
+
+class EventosTests(SimpleTestCase):
+    def setUp(self):
+        eventos.obtener_broker.cache_clear()
+        self.addCleanup(eventos.obtener_broker.cache_clear)
+
+    @skipIf(eventos.fcntl is None, 'sin bloqueo de archivos (Windows)')
+    def test_cache_de_archivos_no_repite_secuencia(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio}}
+            with override_settings(CACHES=caches):
+                broker = eventos.BrokerCache()
+                hilos = [
+                    threading.Thread(target=lambda i=i: [broker.publicar('c', (i, j)) for j in range(20)])
+                    for i in range(4)
+                ]
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    hilo.join()
+
+                self.assertEqual(broker.cache.get('eventos:c:seq'), 80)
+                guardados = broker.cache.get_many([f'eventos:c:{seq}' for seq in range(1, 81)])
+                self.assertEqual(len(set(guardados.values())), 80)
+
+    @override_settings(
+        CACHES=CACHES_PRUEBA,
+        EVENTOS_BROKER='inventario.eventos.BrokerCache',
+        EVENTOS_BROKER_OPCIONES={},
+    )
+    def test_cache_en_memoria_usa_broker_memoria(self):
+        with self.assertLogs('inventario.eventos', 'WARNING'):
+            self.assertIsInstance(eventos.obtener_broker(), eventos.BrokerMemoria)
+
+
+class ConexionFalsa:
+    def __init__(self):
+        self.cerrada = False
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolTests(SimpleTestCase):
+    def setUp(self):
+        self.creadas = []
+
+    def conectar(self):
+        conexion = ConexionFalsa()
+        self.creadas.append(conexion)
+        return conexion
+
+    def test_limite_y_espera(self):
+        pool = Pool('prueba', maximo=2, espera=0.05)
+        primera, _ = pool.tomar(self.conectar)
+        pool.tomar(self.conectar)
+        with self.assertRaises(OperationalError):
+            pool.tomar(self.conectar)
+        self.assertEqual(len(self.creadas), 2)
+
+        # Una conexion devuelta mientras se espera se entrega sin abrir otra
+        pool.espera = 5
+        threading.Timer(0.05, pool.devolver, [primera]).start()
+        self.assertEqual(pool.tomar(self.conectar), (primera, True))
+        self.assertEqual(len(self.creadas), 2)
+
+    def test_devuelta_se_reutiliza(self):
+        pool = Pool('prueba', maximo=1)
+        conexion, reutilizada = pool.tomar(self.conectar)
+        self.assertFalse(reutilizada)
+        pool.devolver(conexion)
+        self.assertEqual(pool.tomar(self.conectar), (conexion, True))
+        self.assertFalse(conexion.cerrada)
+
+    def test_descarta_sucias_caidas_y_vencidas(self):
+        pool = Pool('prueba', maximo=1)
+        sucia, _ = pool.tomar(self.conectar)
+        pool.devolver(sucia, descartar=True)
+        self.assertTrue(sucia.cerrada)
+
+        caida, _ = pool.tomar(self.conectar)
+        pool.devolver(caida)
+        nueva, reutilizada = pool.tomar(self.conectar, sana=lambda conexion: False)
+        self.assertTrue(caida.cerrada)
+        self.assertIsNot(nueva, caida)
+        self.assertFalse(reutilizada)
+
+        pool.vida = 0
+        pool.devolver(nueva)
+        self.assertTrue(nueva.cerrada)
+        # Cada conexion descartada libera su lugar en el pool
+        self.assertEqual(pool._abiertas, 0)
+
+    def test_error_al_conectar_libera_el_lugar(self):
+        pool = Pool('prueba', maximo=1, espera=0.05)
+        with self.assertRaises(OperationalError):
+            pool.tomar(mock.Mock(side_effect=OperationalError))
+        pool.tomar(self.conectar)
+
+
+class ConPool(PoolMixin, SQLiteWrapper):
+    pass
+
+
+class PoolMixinTests(SimpleTestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        # Archivo y no :memory:, que SQLite nunca cierra
+        datos = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directorio.name, 'pool.sqlite3'),
+            'OPTIONS': {'pool': {'maximo': 1}},
+        }
+        datos = connections.configure_settings({'default': {}, 'pool': datos})['pool']
+        self.conexion = ConPool(datos, 'pool')
+        self.addCleanup(lambda: [c.close() for c in self.conexion.pool._libres])
+        self.addCleanup(PoolMixin._pools.clear)
+
+    def test_cerrar_devuelve_al_pool(self):
+        self.conexion.connect()
+        anterior = self.conexion.connection
+        self.conexion.close()
+        self.conexion.connect()
+        self.assertIs(self.conexion.connection, anterior)
+        self.assertTrue(self.conexion.conexion_reutilizada)
+        self.conexion.close()
+
+    def test_conexion_con_errores_se_descarta(self):
+        self.conexion.connect()
+        anterior = self.conexion.connection
+        self.conexion.errors_occurred = True
+        self.conexion.close()
+        self.conexion.connect()
+        self.assertIsNot(self.conexion.connection, anterior)
+        self.assertFalse(self.conexion.conexion_reutilizada)
+        self.conexion.close()
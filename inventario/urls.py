@@ -10,20 +10,37 @@ urlpatterns = [
 
     path('entradas/', views.entrada_historial, name='entrada_historial'),
     path('entradas/registrar/', views.entrada_registrar, name='entrada_registrar'),
+    path('entradas/importar/', views.entrada_importar, name='entrada_importar'),
     path('entradas/<int:pk>/', views.entrada_detalle, name='entrada_detalle'),
     path('api/buscar-producto/', views.buscar_producto, name='buscar_producto'),
+    path('api/buscar-productos/', views.buscar_productos_lote, name='buscar_productos_lote'),
     path('api/buscar-productos-autocomplete/', views.buscar_productos_autocomplete, name='buscar_productos_autocomplete'),
+    path('api/async/buscar-producto/', views.buscar_producto_async, name='buscar_producto_async'),
+    path('api/async/buscar-productos-autocomplete/', views.buscar_productos_autocomplete_async, name='buscar_productos_autocomplete_async'),
+
+    path('ordenes/', views.orden_list, name='orden_list'),
+    path('ordenes/crear/', views.orden_create, name='orden_create'),
+    path('ordenes/<int:pk>/', views.orden_detalle, name='orden_detalle'),
+    path('ordenes/<int:pk>/recibir/', views.orden_recibir, name='orden_recibir'),
+    path('ordenes/<int:pk>/cancelar/', views.orden_cancelar, name='orden_cancelar'),
+
+    path('api/v1/', views.api_indice, name='api_indice'),
+    path('api/v1/<str:recurso>/', views.api_recurso, name='api_recurso'),
 
     path('inventario-fisico/', views.inventario_sesiones, name='inventario_sesiones'),
+    path('inventario-fisico/eventos/', views.inventario_sesiones_eventos, name='inventario_sesiones_eventos'),
     path('inventario-fisico/iniciar/', views.inventario_iniciar, name='inventario_iniciar'),
     path('inventario-fisico/<int:sesion_id>/conteo/', views.inventario_conteo, name='inventario_conteo'),
     path('inventario-fisico/<int:sesion_id>/registrar/', views.inventario_registrar_conteo, name='inventario_registrar_conteo'),
+    path('inventario-fisico/<int:sesion_id>/registrar-async/', views.inventario_registrar_conteo_async, name='inventario_registrar_conteo_async'),
     path('inventario-fisico/<int:sesion_id>/finalizar/', views.inventario_finalizar, name='inventario_finalizar'),
     path('inventario-fisico/<int:sesion_id>/resultados/', views.inventario_resultados, name='inventario_resultados'),
     path('inventario-fisico/<int:sesion_id>/conciliar/', views.inventario_conciliar, name='inventario_conciliar'),
     path('inventario-fisico/<int:sesion_id>/cancelar/', views.inventario_cancelar, name='inventario_cancelar'),
     path('inventario-fisico/<int:sesion_id>/eliminar-conteo/<int:conteo_id>/', views.inventario_eliminar_conteo, name='inventario_eliminar_conteo'),
+    path('inventario-fisico/<int:sesion_id>/importar/', views.inventario_importar_conteo, name='inventario_importar_conteo'),
     path('inventario-fisico/<int:sesion_id>/exportar-auditoria/', views.exportar_reporte_auditoria, name='exportar_reporte_auditoria'),
+    path('inventario-fisico/<int:sesion_id>/eventos/', views.inventario_eventos, name='inventario_eventos'),
 
     path('categorias/', views.categoria_list, name='categoria_list'),
     path('categorias/crear/', views.categoria_create, name='categoria_create'),
@@ -31,6 +48,7 @@ urlpatterns = [
     path('categorias/<int:pk>/eliminar/', views.categoria_delete, name='categoria_delete'),
 
     path('proveedores/', views.proveedor_list, name='proveedor_list'),
+    path('proveedores/analisis/', views.proveedor_analisis, name='proveedor_analisis'),
     path('proveedores/crear/', views.proveedor_create, name='proveedor_create'),
     path('proveedores/<int:pk>/editar/', views.proveedor_edit, name='proveedor_edit'),
     path('proveedores/<int:pk>/eliminar/', views.proveedor_delete, name='proveedor_delete'),
@@ -39,6 +57,7 @@ urlpatterns = [
     path('productos/crear/', views.producto_create, name='producto_create'),
     path('productos/<int:pk>/editar/', views.producto_edit, name='producto_edit'),
     path('productos/<int:pk>/eliminar/', views.producto_delete, name='producto_delete'),
+    path('productos/importar/', views.producto_importar, name='producto_importar'),
     path('productos/exportar-inventario/', views.exportar_inventario_actual, name='exportar_inventario_actual'),
 
     path('salidas/', views.salida_historial, name='salida_historial'),
@@ -52,4 +71,8 @@ urlpatterns = [
     path('usuarios/<int:pk>/eliminar/', views.usuario_delete, name='usuario_delete'),
 
     path('perfil/', views.perfil_edit, name='perfil_edit'),
+
+    path('metricas/', views.exportar_metricas, name='exportar_metricas'),
+    path('consultas-lentas/', views.consultas_lentas, name='consultas_lentas'),
+    path('consultas-lentas/vaciar/', views.consultas_lentas_vaciar, name='consultas_lentas_vaciar'),
 ]
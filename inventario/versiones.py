@@ -0,0 +1,130 @@
+"""
+Versiones de cambio por recurso para las respuestas condicionales.
+
+Cada recurso (productos, categorias, proveedores, entradas) tiene en el cache
+una version (token aleatorio y fecha) que cambia cada vez que se guarda o
+elimina uno de sus registros. Las vistas decoradas con `condicional` derivan de esas
+versiones el ETag y el Last-Modified, de modo que un cliente que ya tiene la
+pagina recibe un 304 sin que se ejecute la consulta ni la plantilla.
+
+El cache debe ser compartido entre procesos (ver CACHES en settings); las
+operaciones masivas que no disparan senales llaman a `invalidar` directamente.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import metricas
+from .models import Product, Category, Provider, Entrada
+
+# Recursos cuya version cambia al modificar cada modelo. La categoria se
+# muestra junto a los productos, asi que tambien invalida a los productos.
+RECURSOS_POR_MODELO = {
+    Product: ('productos',),
+    Category: ('categorias', 'productos'),
+    Provider: ('proveedores',),
+    Entrada: ('entradas',),
+}
+
+
+def _clave(recurso):
+    return f'version:{recurso}'
+
+
+def _nueva_version():
+    return (uuid.uuid4().hex, time.time())
+
+
+def obtener_versiones(*recursos):
+    """Retorna la version (token, timestamp) de cada recurso, creandola si no existe"""
+    claves = [_clave(recurso) for recurso in recursos]
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            cache.add(clave, _nueva_version(), None)
+            versiones[clave] = cache.get(clave) or _nueva_version()
+    return [versiones[clave] for clave in claves]
+
+
+async def aobtener_versiones(*recursos):
+    """Version asincrona de `obtener_versiones` para las vistas async"""
+    claves = [_clave(recurso) for recurso in recursos]
+    versiones = await cache.aget_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            await cache.aadd(clave, _nueva_version(), None)
+            versiones[clave] = await cache.aget(clave) or _nueva_version()
+    return [versiones[clave] for clave in claves]
+
+
+def invalidar(*recursos):
+    """
+    Cambia la version de los recursos cuando se confirma la transaccion
+    actual, para que ninguna respuesta con la version nueva lea datos viejos.
+    """
+    def cambiar():
+        cache.set_many({_clave(recurso): _nueva_version() for recurso in recursos}, None)
+
+    transaction.on_commit(cambiar)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def _invalidar_por_modelo(sender, **kwargs):
+    recursos = RECURSOS_POR_MODELO.get(sender)
+    if recursos:
+        invalidar(*recursos)
+
+
+def condicional(*recursos):
+    """
+    Responde 304 si el cliente ya tiene la version actual de la pagina.
+
+    El ETag combina las versiones de los recursos con lo que cambia por
+    usuario en la plantilla base (usuario, nombre, rol), el formato pedido
+    (Accept) y la URL completa.
+    Si hay mensajes pendientes la vista se ejecuta siempre, porque la pagina
+    debe mostrarlos.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if len(get_messages(request)):
+                return view_func(request, *args, **kwargs)
+
+            versiones = obtener_versiones(*recursos)
+            user = request.user
+            partes = [token for token, _ in versiones] + [
+                str(user.pk),
+                user.get_full_name(),
+                getattr(user, 'role', ''),
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+                request.headers.get('Accept', ''),
+                request.get_full_path(),
+            ]
+            etag = hashlib.sha1('|'.join(partes).encode()).hexdigest()
+            modificado = datetime.fromtimestamp(max(fecha for _, fecha in versiones), tz=dt_timezone.utc)
+
+            response = condition(
+                etag_func=lambda *a, **k: etag,
+                last_modified_func=lambda *a, **k: modificado,
+            )(view_func)(request, *args, **kwargs)
+            metricas.incrementar(
+                'inventario_cache_total', uso='pagina', resultado='acierto' if response.status_code == 304 else 'fallo'
+            )
+            # El navegador puede guardar la pagina, pero debe revalidarla siempre
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
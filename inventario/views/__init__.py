@@ -8,6 +8,7 @@ from .categorias import (
 )
 from .proveedores import (
     proveedor_list,
+    proveedor_analisis,
     proveedor_create,
     proveedor_edit,
     proveedor_delete,
@@ -17,15 +18,24 @@ from .productos import (
     producto_create,
     producto_edit,
     producto_delete,
+    producto_importar,
     exportar_inventario_actual,
 )
 from .entradas import (
     entrada_registrar,
     entrada_historial,
     entrada_detalle,
+    entrada_importar,
     buscar_producto,
     buscar_productos_autocomplete,
 )
+from .ordenes import (
+    orden_list,
+    orden_create,
+    orden_detalle,
+    orden_recibir,
+    orden_cancelar,
+)
 from .usuarios import (
     usuario_list,
     usuario_create,
@@ -42,8 +52,15 @@ from .inventario_fisico import (
     inventario_conciliar,
     inventario_cancelar,
     inventario_eliminar_conteo,
+    inventario_importar_conteo,
     exportar_reporte_auditoria,
 )
+from .eventos import inventario_eventos, inventario_sesiones_eventos
+from .escaneo import (
+    buscar_producto_async,
+    buscar_productos_autocomplete_async,
+    inventario_registrar_conteo_async,
+)
 from .salidas import (
     salida_registrar,
     salida_historial,
@@ -51,3 +68,6 @@ from .salidas import (
     exportar_reporte_salidas,
 )
 from .perfil import perfil_edit
+from .api import api_indice, api_recurso, buscar_productos_lote
+from .metricas import exportar_metricas
+from .lentas import consultas_lentas, consultas_lentas_vaciar
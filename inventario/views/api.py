@@ -0,0 +1,350 @@
+"""
+API JSON de solo lectura (v1) para herramientas de reportes.
+
+Cada recurso se pagina por cursor sobre la clave primaria (sin OFFSET), acepta
+`fields=` para elegir las columnas y los mismos filtros de las pantallas
+HTML. Las filas se leen con values().iterator() y se escriben en la
+respuesta a medida que llegan, sin crear instancias de los modelos.
+"""
+import base64
+import binascii
+import json
+import time
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+
+from .. import metricas
+from ..importacion import en_lotes, resolver_productos
+from ..models import Product, Category, Provider, Entrada, Salida, InventarioSesion
+from ..replicas import lectura_replica
+from .categorias import filtrar_categorias
+from .entradas import filtrar_entradas, CAMPOS_BUSQUEDA, datos_producto
+from .inventario_fisico import filtrar_sesiones
+from .productos import filtrar_productos
+from .proveedores import filtrar_proveedores
+from .salidas import filtrar_salidas
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+# Filas que se serializan juntas antes de escribirlas en la respuesta
+FILAS_POR_FRAGMENTO = 200
+
+# Busqueda por lote: codigos por peticion y por consulta
+MAX_CODIGOS_BUSQUEDA = 10000
+CODIGOS_POR_CONSULTA = 1000
+
+
+def api_login_required(view_func):
+    """Como login_required, pero responde 401 en JSON en lugar de redirigir al login"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Autenticacion requerida.'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+# Por recurso: modelo, columnas publicadas {nombre: ruta ORM}, columnas por
+# defecto, filtro y orden del cursor ('id' ascendente o '-id' descendente)
+RECURSOS = {
+    'productos': {
+        'modelo': Product,
+        'campos': {
+            'id': 'id',
+            'code': 'code',
+            'name': 'name',
+            'description': 'description',
+            'unit': 'unit',
+            'min_stock': 'min_stock',
+            'stock_actual': 'stock_actual',
+            'category_id': 'category_id',
+            'category_name': 'category__name',
+            'location': 'location',
+            'status': 'status',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        'por_defecto': ['id', 'code', 'name', 'unit', 'stock_actual', 'min_stock', 'category_id', 'status'],
+        'filtrar': lambda productos, parametros: filtrar_productos(productos, parametros)[0],
+        'orden': 'id',
+    },
+    'categorias': {
+        'modelo': Category,
+        'campos': {
+            'id': 'id',
+            'name': 'name',
+            'description': 'description',
+            'status': 'status',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        'por_defecto': ['id', 'name', 'status'],
+        'filtrar': lambda categorias, parametros: filtrar_categorias(categorias, parametros)[0],
+        'orden': 'id',
+    },
+    'proveedores': {
+        'modelo': Provider,
+        'campos': {
+            'id': 'id',
+            'name': 'name',
+            'rif': 'rif',
+            'phone': 'phone',
+            'email': 'email',
+            'contact_name': 'contact_name',
+            'status': 'status',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        'por_defecto': ['id', 'name', 'rif', 'status'],
+        'filtrar': lambda proveedores, parametros: filtrar_proveedores(proveedores, parametros)[0],
+        'orden': 'id',
+    },
+    'entradas': {
+        'modelo': Entrada,
+        'campos': {
+            'id': 'id',
+            'product_id': 'product_id',
+            'product_code': 'product__code',
+            'product_name': 'product__name',
+            'provider_id': 'provider_id',
+            'provider_name': 'provider__name',
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'purchase_order_line_id': 'purchase_order_line_id',
+            'quantity': 'quantity',
+            'total_cost': 'total_cost',
+            'created_at': 'created_at',
+        },
+        'por_defecto': ['id', 'product_id', 'provider_id', 'quantity', 'total_cost', 'created_at'],
+        'filtrar': lambda entradas, parametros: filtrar_entradas(entradas, parametros)[0],
+        'orden': '-id',
+    },
+    'salidas': {
+        'modelo': Salida,
+        'campos': {
+            'id': 'id',
+            'product_id': 'product_id',
+            'product_code': 'product__code',
+            'product_name': 'product__name',
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'receptor': 'receptor',
+            'quantity': 'quantity',
+            'motivo': 'motivo',
+            'created_at': 'created_at',
+        },
+        'por_defecto': ['id', 'product_id', 'receptor', 'quantity', 'created_at'],
+        'filtrar': lambda salidas, parametros: filtrar_salidas(salidas, parametros)[0],
+        'orden': '-id',
+    },
+    'sesiones': {
+        'modelo': InventarioSesion,
+        'campos': {
+            'id': 'id',
+            'user_id': 'user_id',
+            'username': 'user__username',
+            'status': 'status',
+            'notas': 'notas',
+            'total_productos': 'total_productos',
+            'productos_con_diferencia': 'productos_con_diferencia',
+            'created_at': 'created_at',
+            'finished_at': 'finished_at',
+            'conciliated_at': 'conciliated_at',
+        },
+        'por_defecto': ['id', 'user_id', 'status', 'total_productos', 'productos_con_diferencia', 'created_at'],
+        'filtrar': lambda sesiones, parametros: filtrar_sesiones(sesiones, parametros)[0],
+        'orden': '-id',
+    },
+}
+
+
+def _codificar_cursor(pk):
+    return base64.urlsafe_b64encode(json.dumps({'id': pk}).encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(datos['id'])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError('Cursor invalido.')
+
+
+def _parametros_con_cursor(parametros, cursor):
+    parametros = parametros.copy()
+    parametros['cursor'] = cursor
+    return parametros.urlencode()
+
+
+def _columnas(recurso, parametro):
+    """Traduce `fields=` a los argumentos de values(); el id siempre se incluye para el cursor"""
+    nombres = [nombre.strip() for nombre in parametro.split(',') if nombre.strip()] if parametro else recurso['por_defecto']
+    desconocidos = [nombre for nombre in nombres if nombre not in recurso['campos']]
+    if desconocidos:
+        raise ValueError(
+            f'Campos desconocidos: {", ".join(desconocidos)}. '
+            f'Disponibles: {", ".join(recurso["campos"])}.'
+        )
+    if 'id' not in nombres:
+        nombres = ['id', *nombres]
+
+    # Las columnas propias van por nombre; las de otras tablas con alias
+    directas = [nombre for nombre in dict.fromkeys(nombres) if recurso['campos'][nombre] == nombre]
+    alias = {
+        nombre: F(recurso['campos'][nombre])
+        for nombre in dict.fromkeys(nombres)
+        if recurso['campos'][nombre] != nombre
+    }
+    return nombres, directas, alias
+
+
+def _flujo_json(filas, limite, url_siguiente, reporte):
+    """Escribe la pagina como JSON por fragmentos y agrega el cursor siguiente al final"""
+    inicio = time.perf_counter()
+    codificador = DjangoJSONEncoder(separators=(',', ':'))
+    yield '{"results":['
+
+    fragmento = []
+    enviadas = 0
+    ultimo = None
+    for fila in filas:
+        if enviadas == limite:
+            # Se leyo una fila extra: hay otra pagina
+            break
+        fragmento.append(codificador.encode(fila))
+        enviadas += 1
+        ultimo = fila['id']
+        if len(fragmento) == FILAS_POR_FRAGMENTO:
+            yield (',' if enviadas > FILAS_POR_FRAGMENTO else '') + ','.join(fragmento)
+            fragmento = []
+    else:
+        ultimo = None
+
+    if fragmento:
+        yield (',' if enviadas > len(fragmento) else '') + ','.join(fragmento)
+
+    siguiente = url_siguiente(_codificar_cursor(ultimo)) if ultimo is not None else None
+    yield '],"count":' + str(enviadas) + ',"next":' + json.dumps(siguiente) + '}'
+    metricas.registrar_exportacion(reporte, enviadas, time.perf_counter() - inicio)
+
+
+@api_login_required
+def api_indice(request):
+    """Lista los recursos de la API con sus campos y filtros"""
+    return JsonResponse({
+        nombre: {
+            'url': request.build_absolute_uri(reverse('api_recurso', args=[nombre])),
+            'campos': list(recurso['campos']),
+            'por_defecto': recurso['por_defecto'],
+        }
+        for nombre, recurso in RECURSOS.items()
+    })
+
+
+@api_login_required
+@lectura_replica
+def api_recurso(request, recurso):
+    """Pagina de un recurso: ?fields=a,b&limit=100&cursor=...&<filtros>"""
+    if recurso not in RECURSOS:
+        return JsonResponse({'error': f'Recurso desconocido: {recurso}.'}, status=404)
+    definicion = RECURSOS[recurso]
+
+    try:
+        nombres, directas, alias = _columnas(definicion, request.GET.get('fields', ''))
+        limite = int(request.GET.get('limit') or LIMITE_POR_DEFECTO)
+        if not 1 <= limite <= LIMITE_MAXIMO:
+            raise ValueError(f'limit debe estar entre 1 y {LIMITE_MAXIMO}.')
+        cursor = request.GET.get('cursor')
+        desde = _decodificar_cursor(cursor) if cursor else None
+        filas = definicion['filtrar'](definicion['modelo'].objects.all(), request.GET)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if desde is not None:
+        filas = filas.filter(pk__lt=desde) if definicion['orden'] == '-id' else filas.filter(pk__gt=desde)
+    filas = filas.order_by(definicion['orden']).values(*directas, **alias)
+
+    # values() ordena las columnas con alias al final; se respeta el orden pedido
+    filas = ({nombre: fila[nombre] for nombre in nombres} for fila in filas[:limite + 1].iterator(chunk_size=FILAS_POR_FRAGMENTO * 5))
+
+    def url_siguiente(cursor):
+        return request.build_absolute_uri('?' + _parametros_con_cursor(request.GET, cursor))
+
+    return StreamingHttpResponse(
+        _flujo_json(filas, limite, url_siguiente, f'api_{recurso}'),
+        content_type='application/json',
+    )
+
+
+def buscar_codigos(codigos):
+    """
+    Resuelve una lista de codigos con una consulta por bloque (categoria
+    incluida) y retorna un resultado por codigo, en el mismo orden, con el
+    payload de buscar_producto.
+    """
+    unicos = list({codigo.upper(): codigo for codigo in codigos}.values())
+    productos = {}
+    for bloque in en_lotes(unicos, CODIGOS_POR_CONSULTA):
+        productos.update(resolver_productos(bloque, campos=CAMPOS_BUSQUEDA))
+
+    resultados = []
+    faltantes = []
+    for codigo in codigos:
+        producto = productos.get(codigo.upper())
+        if producto is None:
+            faltantes.append(codigo)
+            resultados.append({
+                'code': codigo,
+                'found': False,
+                'error': f'No existe producto con codigo "{codigo}"',
+            })
+        else:
+            resultados.append({'code': codigo, 'found': True, 'product': datos_producto(producto)})
+    return resultados, faltantes
+
+
+@api_login_required
+@require_POST
+def buscar_productos_lote(request):
+    """
+    Busca varios codigos en una peticion. Recibe JSON {"codes": [...]} o el
+    campo de formulario `codes` repetido o separado por lineas.
+    """
+    if request.content_type == 'application/json':
+        try:
+            codigos = json.loads(request.body).get('codes')
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'JSON invalido.'}, status=400)
+        if not isinstance(codigos, list) or not all(isinstance(codigo, (str, int)) for codigo in codigos):
+            return JsonResponse({'error': '"codes" debe ser una lista de codigos.'}, status=400)
+    else:
+        codigos = [
+            linea
+            for valor in request.POST.getlist('codes')
+            for linea in valor.splitlines()
+        ]
+
+    codigos = [str(codigo).strip() for codigo in codigos if str(codigo).strip()]
+    if not codigos:
+        return JsonResponse({'error': 'Codigos no proporcionados.'}, status=400)
+    if len(codigos) > MAX_CODIGOS_BUSQUEDA:
+        return JsonResponse(
+            {'error': f'Se pueden buscar hasta {MAX_CODIGOS_BUSQUEDA} codigos por peticion.'},
+            status=400
+        )
+
+    resultados, faltantes = buscar_codigos(codigos)
+    return JsonResponse({
+        'count': len(resultados),
+        'found': len(resultados) - len(faltantes),
+        'missing': faltantes,
+        'results': resultados,
+    })
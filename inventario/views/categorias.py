@@ -1,14 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count
 
 from ..models import Category, Product
+from ..tablas import Tabla, render_tabla
+from ..versiones import condicional
+
+
+def filtrar_categorias(categorias, parametros):
+    """Aplica los filtros del listado de categorias; retorna el queryset y los filtros usados"""
+    filtros = {clave: parametros.get(clave, '') for clave in ('q', 'status')}
+
+    if filtros['q']:
+        categorias = categorias.filter(name__icontains=filtros['q'])
+
+    if filtros['status']:
+        categorias = categorias.filter(status=filtros['status'])
+
+    return categorias, filtros
+
+
+TABLA_CATEGORIAS = Tabla(
+    Category.objects.annotate(productos=Count('product')),
+    columnas={
+        'id': 'id',
+        'nombre': 'name',
+        'estado': 'status',
+        'productos': 'productos',
+    },
+    orden='nombre',
+    filtrar=filtrar_categorias,
+)
 
 
 @login_required
+@condicional('categorias', 'productos')
 def categoria_list(request):
-    categorias = Category.objects.all().order_by('name')
-    return render(request, 'categorias/list.html', {'categorias': categorias})
+    return render_tabla(request, 'categorias/list.html', 'categorias/tabla.html', {
+        'tabla': TABLA_CATEGORIAS.pagina(request),
+    })
 
 
 @login_required
@@ -4,9 +4,11 @@ from django.db.models import F
 from django.utils import timezone
 
 from ..models import Product, Entrada, Provider
+from ..replicas import lectura_replica
 
 
 @login_required
+@lectura_replica
 def admin_dashboard(request):
     alertas = Product.objects.filter(stock_actual__lt=F('min_stock'))
     total_productos = Product.objects.filter(status='active').count()
@@ -2,10 +2,33 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
+from collections import Counter
 from decimal import Decimal, InvalidOperation
 
+from ..compacto import responder, busqueda_compacta
+from ..importacion import (
+    ArchivoInvalido,
+    MAX_ERRORES,
+    descartar_pendiente,
+    en_lotes,
+    filas_con_columnas,
+    guardar_pendiente,
+    leer_filas,
+    normalizar_codigo,
+    normalizar_decimal,
+    normalizar_entero,
+    resolver_productos,
+    tomar_pendiente,
+)
 from ..models import Entrada, Product, Provider
+from ..replicas import lectura_replica
+from ..resumen import registrar_entradas
+from ..stock import sumar_stock
+from ..tablas import Tabla, render_tabla
+from ..versiones import condicional
 
 
 @login_required
@@ -77,13 +100,15 @@ def entrada_registrar(request):
                 'product': product if 'product' in dir() and product else None,
             })
 
-        entrada = Entrada.objects.create(
-            product=product,
-            provider=provider,
-            user=request.user,
-            quantity=quantity_int,
-            total_cost=total_cost_decimal
-        )
+        with transaction.atomic():
+            entrada = Entrada.objects.create(
+                product=product,
+                provider=provider,
+                user=request.user,
+                quantity=quantity_int,
+                total_cost=total_cost_decimal
+            )
+            registrar_entradas({product.pk: quantity_int}, provider.pk, entrada.created_at)
 
         stock_msg = ''
         if product.stock_actual > product.min_stock:
@@ -106,87 +131,335 @@ def entrada_registrar(request):
     })
 
 
+COLUMNAS_FACTURA = {
+    'codigo': ('codigo', 'código', 'code', 'cod', 'sku'),
+    'cantidad': ('cantidad', 'cant', 'qty', 'quantity'),
+    'costo': ('costo', 'costo_total', 'costo total', 'total', 'total_cost', 'monto'),
+}
+
+# Clave de la sesion con el token de las lineas validas (importacion.guardar_pendiente)
+# entre la vista previa y la confirmacion
+CLAVE_IMPORTACION_ENTRADAS = 'importacion_entradas'
+# Lineas que se muestran en la vista previa; los totales cubren todo el archivo
+MAX_LINEAS_VISTA = 500
+COSTO_MAXIMO = Decimal('9999999999.99')
+
+
+def _leer_factura(archivo):
+    """
+    Lee las lineas (codigo, cantidad, costo total) de la nota de entrega del
+    proveedor y resuelve los productos con una consulta por lote.
+    """
+    resultado = {
+        'filas': 0,
+        'lineas': [],
+        'vista': [],
+        'unidades': 0,
+        'costo_total': Decimal('0'),
+        'invalidas': 0,
+        'errores': [],
+    }
+
+    def error(numero, mensaje):
+        resultado['invalidas'] += 1
+        if len(resultado['errores']) < MAX_ERRORES:
+            resultado['errores'].append((numero, mensaje))
+
+    def filas_validas():
+        for numero, fila in filas_con_columnas(leer_filas(archivo), COLUMNAS_FACTURA):
+            resultado['filas'] += 1
+            codigo = normalizar_codigo(fila['codigo'])
+            if not codigo:
+                error(numero, 'El codigo del producto es requerido.')
+                continue
+            try:
+                cantidad = normalizar_entero(fila['cantidad'])
+            except (TypeError, ValueError):
+                error(numero, f'La cantidad de "{codigo}" debe ser un numero entero.')
+                continue
+            if cantidad <= 0:
+                error(numero, f'La cantidad de "{codigo}" debe ser mayor a cero.')
+                continue
+            try:
+                costo = normalizar_decimal(fila.get('costo'))
+            except ValueError:
+                error(numero, f'El costo total de "{codigo}" debe ser un numero valido.')
+                continue
+            if costo < 0:
+                error(numero, f'El costo total de "{codigo}" no puede ser negativo.')
+                continue
+            if costo > COSTO_MAXIMO:
+                error(numero, f'El costo total de "{codigo}" es demasiado grande.')
+                continue
+            yield numero, codigo, cantidad, costo
+
+    for lote in en_lotes(filas_validas()):
+        productos = resolver_productos(
+            [codigo for _, codigo, _, _ in lote],
+            campos=('id', 'code', 'name', 'unit', 'stock_actual', 'status'),
+        )
+        for numero, codigo, cantidad, costo in lote:
+            producto = productos.get(codigo.upper())
+            if producto is None:
+                error(numero, f'No existe un producto con el codigo "{codigo}".')
+                continue
+            if producto['status'] != 'active':
+                error(numero, f'El producto "{producto["code"]}" no esta activo.')
+                continue
+
+            resultado['lineas'].append([numero, producto['id'], cantidad, str(costo)])
+            resultado['unidades'] += cantidad
+            resultado['costo_total'] += costo
+            if len(resultado['vista']) < MAX_LINEAS_VISTA:
+                resultado['vista'].append({
+                    'numero': numero,
+                    'producto': producto,
+                    'cantidad': cantidad,
+                    'costo': costo,
+                })
+
+    resultado['productos'] = len({linea[1] for linea in resultado['lineas']})
+    return resultado
+
+
+def _registrar_factura(request, datos):
+    """Crea todas las entradas de la importacion y suma el stock en una sola transaccion"""
+    provider = Provider.objects.filter(pk=datos['provider_id'], status='active').first()
+    if provider is None:
+        messages.error(request, 'El proveedor seleccionado no es valido.')
+        return None
+
+    deltas = Counter()
+    for _, product_id, cantidad, _ in datos['lineas']:
+        deltas[product_id] += cantidad
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        # Los productos pudieron desactivarse o eliminarse despues de la vista previa
+        activos = set()
+        for bloque in en_lotes(deltas, 1000):
+            activos.update(
+                Product.objects.filter(pk__in=bloque, status='active').values_list('pk', flat=True)
+            )
+        if len(activos) != len(deltas):
+            messages.error(
+                request,
+                f'{len(deltas) - len(activos)} producto(s) del archivo ya no estan activos. '
+                'Vuelva a cargar el archivo.'
+            )
+            return None
+
+        # bulk_create no pasa por Entrada.save: el stock se suma aparte con un
+        # UPDATE por bloque en lugar de un save por linea
+        Entrada.objects.bulk_create([
+            Entrada(
+                product_id=product_id,
+                provider=provider,
+                user=request.user,
+                quantity=cantidad,
+                total_cost=Decimal(costo),
+                created_at=ahora,
+                updated_at=ahora,
+            )
+            for _, product_id, cantidad, costo in datos['lineas']
+        ], batch_size=1000)
+        sumar_stock(deltas)
+        registrar_entradas(deltas, provider.pk, ahora)
+
+    return provider, sum(deltas.values())
+
+
 @login_required
-def entrada_historial(request):
-    entradas = Entrada.objects.select_related(
-        'product', 'provider', 'user'
-    ).order_by('-created_at')
+def entrada_importar(request):
+    """Importar las lineas de una nota de entrega del proveedor como entradas"""
+    proveedores = Provider.objects.filter(status='active').order_by('name')
+    provider_id = ''
+    resultado = None
+
+    if request.method == 'POST':
+        accion = request.POST.get('accion', 'previsualizar')
+
+        if accion == 'cancelar':
+            descartar_pendiente(request.session.pop(CLAVE_IMPORTACION_ENTRADAS, None))
+            messages.info(request, 'Importacion cancelada.')
+            return redirect('entrada_importar')
+
+        if accion == 'confirmar':
+            datos = tomar_pendiente(request.session.pop(CLAVE_IMPORTACION_ENTRADAS, None))
+            if not datos or not datos['lineas']:
+                messages.error(request, 'No hay una importacion pendiente de confirmar.')
+                return redirect('entrada_importar')
+
+            registrado = _registrar_factura(request, datos)
+            if registrado is None:
+                return redirect('entrada_importar')
+
+            provider, unidades = registrado
+            messages.success(
+                request,
+                f'Se registraron {len(datos["lineas"])} entrada(s) de "{provider.name}" '
+                f'con {unidades} unidades en total.'
+            )
+            return redirect('entrada_historial')
+
+        provider_id = request.POST.get('provider', '')
+        archivo = request.FILES.get('archivo')
+
+        if not provider_id.isdigit() or not proveedores.filter(pk=provider_id).exists():
+            messages.error(request, 'El proveedor seleccionado no es valido.')
+        elif not archivo:
+            messages.error(request, 'Seleccione el archivo a importar.')
+        else:
+            try:
+                resultado = _leer_factura(archivo)
+            except ArchivoInvalido as e:
+                messages.error(request, str(e))
+            else:
+                descartar_pendiente(request.session.get(CLAVE_IMPORTACION_ENTRADAS))
+                request.session[CLAVE_IMPORTACION_ENTRADAS] = guardar_pendiente({
+                    'provider_id': int(provider_id),
+                    'lineas': resultado['lineas'],
+                })
+                resultado['proveedor'] = proveedores.get(pk=provider_id)
+                if not resultado['lineas']:
+                    messages.error(request, 'El archivo no tiene lineas validas para importar.')
+
+    return render(request, 'entradas/importar.html', {
+        'proveedores': proveedores,
+        'provider_id': provider_id,
+        'resultado': resultado,
+    })
+
 
-    fecha_desde = request.GET.get('fecha_desde', '')
-    fecha_hasta = request.GET.get('fecha_hasta', '')
-    producto = request.GET.get('producto', '')
-    proveedor = request.GET.get('proveedor', '')
+def filtrar_entradas(entradas, parametros):
+    """Aplica los filtros del historial de entradas; retorna el queryset y los filtros usados"""
+    filtros = {
+        clave: parametros.get(clave, '')
+        for clave in ('fecha_desde', 'fecha_hasta', 'producto', 'proveedor')
+    }
 
-    if fecha_desde:
-        entradas = entradas.filter(created_at__date__gte=fecha_desde)
+    if filtros['fecha_desde']:
+        entradas = entradas.filter(created_at__date__gte=filtros['fecha_desde'])
 
-    if fecha_hasta:
-        entradas = entradas.filter(created_at__date__lte=fecha_hasta)
+    if filtros['fecha_hasta']:
+        entradas = entradas.filter(created_at__date__lte=filtros['fecha_hasta'])
 
-    if producto:
+    if filtros['producto']:
         entradas = entradas.filter(
-            Q(product__code__icontains=producto) |
-            Q(product__name__icontains=producto)
+            Q(product__code__icontains=filtros['producto']) |
+            Q(product__name__icontains=filtros['producto'])
         )
 
-    if proveedor:
-        entradas = entradas.filter(provider_id=proveedor)
+    if filtros['proveedor']:
+        entradas = entradas.filter(provider_id=filtros['proveedor'])
 
-    proveedores = Provider.objects.all().order_by('name')
+    return entradas, filtros
 
-    return render(request, 'entradas/historial.html', {
-        'entradas': entradas,
-        'proveedores': proveedores,
-        'filtros': {
-            'fecha_desde': fecha_desde,
-            'fecha_hasta': fecha_hasta,
-            'producto': producto,
-            'proveedor': proveedor,
-        }
+
+TABLA_ENTRADAS = Tabla(
+    Entrada.objects.select_related('product', 'provider', 'user'),
+    columnas={
+        'id': 'id',
+        'fecha': 'created_at',
+        'cantidad': 'quantity',
+        'costo': 'total_cost',
+    },
+    orden='-fecha',
+    filtrar=filtrar_entradas,
+)
+
+
+@login_required
+@lectura_replica
+def entrada_historial(request):
+    tabla = TABLA_ENTRADAS.pagina(request)
+
+    return render_tabla(request, 'entradas/historial.html', 'entradas/historial_tabla.html', {
+        'tabla': tabla,
+        'proveedores': Provider.objects.all().order_by('name'),
+        'filtros': tabla['filtros'],
     })
 
 
+# Columnas que necesita el payload de busqueda de productos
+CAMPOS_BUSQUEDA = (
+    'id', 'code', 'name', 'unit', 'category__name',
+    'stock_actual', 'min_stock', 'location', 'status',
+)
+
+
+def datos_producto(producto):
+    """Payload de un producto para las busquedas por codigo, a partir de values(*CAMPOS_BUSQUEDA)"""
+    if producto['stock_actual'] <= producto['min_stock']:
+        stock_status = 'danger'
+        stock_message = f'ALERTA: Stock bajo el minimo ({producto["min_stock"]})'
+    else:
+        stock_status = 'success'
+        stock_message = 'Stock normal'
+
+    return {
+        'id': producto['id'],
+        'code': producto['code'],
+        'name': producto['name'],
+        'unit': producto['unit'],
+        'category': producto['category__name'],
+        'stock_actual': producto['stock_actual'],
+        'min_stock': producto['min_stock'],
+        'location': producto['location'] or 'No especificada',
+        'status': producto['status'],
+        'stock_status': stock_status,
+        'stock_message': stock_message,
+    }
+
+
+def buscar_por_termino(term):
+    """Productos activos cuyo codigo o nombre contiene el termino (maximo 15)"""
+    return Product.objects.filter(
+        Q(code__icontains=term) | Q(name__icontains=term),
+        status='active'
+    ).order_by('name')[:15]
+
+
+def datos_autocomplete(producto):
+    """Item del autocompletado a partir de values(*CAMPOS_BUSQUEDA)"""
+    return {
+        'id': producto['id'],
+        'code': producto['code'],
+        'name': producto['name'],
+        'label': f"{producto['code']} - {producto['name']}",
+        'value': producto['code'],
+        'category': producto['category__name'],
+        'unit': producto['unit'],
+        'stock_actual': producto['stock_actual'],
+        'min_stock': producto['min_stock'],
+        'location': producto['location'] or 'No especificada',
+    }
+
+
 @login_required
+@condicional('productos')
 def buscar_producto(request):
     code = request.GET.get('code', '').strip()
 
     if not code:
-        return JsonResponse({'found': False, 'error': 'Codigo no proporcionado'})
+        return responder(request, {'found': False, 'error': 'Codigo no proporcionado'}, busqueda_compacta)
 
     try:
-        product = Product.objects.select_related('category').get(code__iexact=code)
-
-        if product.stock_actual <= product.min_stock:
-            stock_status = 'danger'
-            stock_message = f'ALERTA: Stock bajo el minimo ({product.min_stock})'
-        else:
-            stock_status = 'success'
-            stock_message = 'Stock normal'
+        product = Product.objects.values(*CAMPOS_BUSQUEDA).get(code__iexact=code)
 
-        return JsonResponse({
+        return responder(request, {
             'found': True,
-            'product': {
-                'id': product.id,
-                'code': product.code,
-                'name': product.name,
-                'unit': product.unit,
-                'category': product.category.name,
-                'stock_actual': product.stock_actual,
-                'min_stock': product.min_stock,
-                'location': product.location or 'No especificada',
-                'status': product.status,
-                'stock_status': stock_status,
-                'stock_message': stock_message,
-            }
-        })
+            'product': datos_producto(product),
+        }, busqueda_compacta)
     except Product.DoesNotExist:
-        return JsonResponse({
+        return responder(request, {
             'found': False,
             'error': f'No existe producto con codigo "{code}"'
-        })
+        }, busqueda_compacta)
 
 
 @login_required
+@condicional('productos')
 def buscar_productos_autocomplete(request):
     """
     Endpoint para busqueda asincrona de productos por nombre o codigo.
@@ -197,28 +470,8 @@ def buscar_productos_autocomplete(request):
     if not term or len(term) < 2:
         return JsonResponse([], safe=False)
 
-    # Buscar productos activos por codigo o nombre
-    productos = Product.objects.filter(
-        Q(code__icontains=term) | Q(name__icontains=term),
-        status='active'
-    ).select_related('category').order_by('name')[:15]
-
-    resultados = []
-    for producto in productos:
-        resultados.append({
-            'id': producto.id,
-            'code': producto.code,
-            'name': producto.name,
-            'label': f"{producto.code} - {producto.name}",
-            'value': producto.code,
-            'category': producto.category.name,
-            'unit': producto.unit,
-            'stock_actual': producto.stock_actual,
-            'min_stock': producto.min_stock,
-            'location': producto.location or 'No especificada',
-        })
-
-    return JsonResponse(resultados, safe=False)
+    productos = buscar_por_termino(term).values(*CAMPOS_BUSQUEDA)
+    return JsonResponse([datos_autocomplete(producto) for producto in productos], safe=False)
 
 
 @login_required
@@ -0,0 +1,127 @@
+"""
+Versiones asincronas de las consultas que hacen los lectores de codigo.
+
+Servidas con ASGI (core/asgi.py), una rafaga de escaneos no ocupa un hilo por
+peticion mientras espera al cache o a la base de datos. Las respuestas son las
+mismas que las de las vistas sincronas de entradas.py e inventario_fisico.py.
+
+Las busquedas por codigo se guardan en el cache bajo la version actual de
+los productos (ver versiones.py), asi que cualquier cambio en el catalogo o
+en el stock las invalida sin tener que borrarlas una por una.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+
+from ..compacto import responder, busqueda_compacta, conteo_compacto
+from ..models import Product, InventarioSesion
+from ..versiones import aobtener_versiones
+from .entradas import CAMPOS_BUSQUEDA, datos_producto, buscar_por_termino, datos_autocomplete
+from .inventario_fisico import _guardar_conteo
+
+# Segundos que se guarda una busqueda; la version de productos la invalida antes
+TIEMPO_CACHE_BUSQUEDA = 300
+
+
+async def _clave_busqueda(tipo, texto):
+    [(token, _)] = await aobtener_versiones('productos')
+    resumen = hashlib.sha1(texto.upper().encode()).hexdigest()
+    return f'{tipo}:{token}:{resumen}'
+
+
+@login_required
+async def buscar_producto_async(request):
+    code = request.GET.get('code', '').strip()
+
+    if not code:
+        return responder(request, {'found': False, 'error': 'Codigo no proporcionado'}, busqueda_compacta)
+
+    clave = await _clave_busqueda('busqueda', code)
+    datos = await cache.aget(clave)
+    if datos is None:
+        try:
+            product = await Product.objects.values(*CAMPOS_BUSQUEDA).aget(code__iexact=code)
+            datos = {'found': True, 'product': datos_producto(product)}
+        except Product.DoesNotExist:
+            # Los codigos inexistentes tambien se guardan: el lector suele repetirlos
+            datos = {'found': False, 'error': f'No existe producto con codigo "{code}"'}
+        await cache.aset(clave, datos, TIEMPO_CACHE_BUSQUEDA)
+
+    return responder(request, datos, busqueda_compacta)
+
+
+@login_required
+async def buscar_productos_autocomplete_async(request):
+    term = request.GET.get('term', '').strip()
+
+    if not term or len(term) < 2:
+        return JsonResponse([], safe=False)
+
+    clave = await _clave_busqueda('autocompletar', term)
+    datos = await cache.aget(clave)
+    if datos is None:
+        datos = [
+            datos_autocomplete(producto)
+            async for producto in buscar_por_termino(term).values(*CAMPOS_BUSQUEDA)
+        ]
+        await cache.aset(clave, datos, TIEMPO_CACHE_BUSQUEDA)
+
+    return JsonResponse(datos, safe=False)
+
+
+@login_required
+async def inventario_registrar_conteo_async(request, sesion_id):
+    sesion = await aget_object_or_404(InventarioSesion, pk=sesion_id)
+
+    if sesion.status != 'en_proceso':
+        return responder(request, {
+            'success': False,
+            'error': 'La sesion no esta en proceso.'
+        }, conteo_compacto)
+
+    if request.method != 'POST':
+        return responder(request, {'success': False, 'error': 'Metodo no permitido'}, conteo_compacto)
+
+    product_code = request.POST.get('product_code', '').strip()
+    cantidad = request.POST.get('cantidad', '').strip()
+
+    try:
+        product = await Product.objects.aget(code__iexact=product_code)
+    except Product.DoesNotExist:
+        return responder(request, {
+            'success': False,
+            'error': f'No existe producto con codigo "{product_code}"'
+        }, conteo_compacto)
+
+    try:
+        cantidad_int = int(cantidad)
+        if cantidad_int < 0:
+            return responder(request, {
+                'success': False,
+                'error': 'La cantidad no puede ser negativa.'
+            }, conteo_compacto)
+    except ValueError:
+        return responder(request, {
+            'success': False,
+            'error': 'La cantidad debe ser un numero entero.'
+        }, conteo_compacto)
+
+    # La escritura es transaccional y el ORM asincrono no maneja transacciones:
+    # se ejecuta en un hilo con la misma funcion que usa la vista sincrona
+    registrado = await sync_to_async(_guardar_conteo)(sesion, product, cantidad_int)
+    if registrado is None:
+        return responder(request, {
+            'success': False,
+            'error': 'La sesion no esta en proceso.'
+        }, conteo_compacto)
+
+    mensaje, datos = registrado
+    return responder(request, {
+        'success': True,
+        'message': mensaje,
+        'data': datos,
+    }, conteo_compacto)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse, HttpResponseForbidden
+from django.shortcuts import aget_object_or_404
+
+from ..eventos import obtener_broker, canal_sesion, CANAL_SESIONES
+from ..models import InventarioSesion
+
+# Segundos sin eventos antes de enviar un comentario para mantener viva la conexion
+INTERVALO_PING = 15
+# Las conexiones se cierran cada cierto tiempo; EventSource reconecta solo
+DURACION_MAXIMA = 300
+
+
+def _evento_sse(tipo, datos):
+    return f'event: {tipo}\ndata: {json.dumps(datos)}\n\n'
+
+
+def _respuesta_sse(flujo):
+    response = StreamingHttpResponse(flujo, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _escuchar(request, canal):
+    """Reenvia los eventos del canal como SSE mientras dure la conexion"""
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI no se puede mantener la conexion abierta sin ocupar un
+        # worker: se cierra enseguida y el navegador vuelve a consultar.
+        yield 'retry: 10000\n\n'
+        return
+
+    yield 'retry: 3000\n\n'
+    loop = asyncio.get_running_loop()
+    inicio = loop.time()
+    async for evento in obtener_broker().escuchar(canal, INTERVALO_PING):
+        if evento is None:
+            yield ': ping\n\n'
+        else:
+            yield _evento_sse(evento['tipo'], {'sesion_id': evento['sesion_id'], **evento['datos']})
+
+        if loop.time() - inicio >= DURACION_MAXIMA:
+            break
+
+
+@login_required
+async def inventario_eventos(request, sesion_id):
+    """Flujo SSE con los conteos y contadores de una sesion a medida que se registran"""
+    user = await request.auser()
+    sesion = await aget_object_or_404(InventarioSesion, pk=sesion_id)
+
+    if sesion.user_id != user.pk and user.role != 'admin':
+        return HttpResponseForbidden('No tiene permiso para acceder a esta sesion.')
+
+    async def flujo():
+        yield _evento_sse('resumen', {
+            'sesion_id': sesion.pk,
+            'status': sesion.status,
+            'total_productos': sesion.total_productos,
+            'productos_con_diferencia': sesion.productos_con_diferencia,
+        })
+        async for fragmento in _escuchar(request, canal_sesion(sesion.pk)):
+            yield fragmento
+
+    return _respuesta_sse(flujo())
+
+
+@login_required
+async def inventario_sesiones_eventos(request):
+    """Flujo SSE con los contadores y estados de todas las sesiones"""
+    return _respuesta_sse(_escuchar(request, CANAL_SESIONES))
@@ -3,18 +3,67 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q, Count, Sum
+from django.db.models.functions import Abs, Coalesce
+from django.core.paginator import Paginator
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from datetime import datetime
+import time
 
+from .. import metricas
+from ..compacto import responder, conteo_compacto
 from ..models import Product, InventarioSesion, DetalleConteo, InventoryAdjustment
+from ..replicas import lectura_replica
+from ..eventos import publicar_evento
+from ..resumen import registrar_conteos
+from ..stock import fijar_stock
+from ..importacion import (
+    ArchivoInvalido,
+    leer_filas,
+    filas_con_columnas,
+    en_lotes,
+    normalizar_codigo,
+    normalizar_entero,
+    resolver_productos,
+)
+from ..tablas import Tabla, render_tabla
+
+
+def filtrar_sesiones(sesiones, parametros):
+    """Aplica los filtros del listado de sesiones; retorna el queryset y los filtros usados"""
+    filtros = {clave: parametros.get(clave, '') for clave in ('user', 'status')}
+
+    if filtros['user']:
+        sesiones = sesiones.filter(user_id=filtros['user'])
+
+    if filtros['status']:
+        sesiones = sesiones.filter(status=filtros['status'])
+
+    return sesiones, filtros
+
+
+TABLA_SESIONES = Tabla(
+    InventarioSesion.objects.select_related('user'),
+    columnas={
+        'id': 'id',
+        'fecha': 'created_at',
+        'productos': 'total_productos',
+        'diferencias': 'productos_con_diferencia',
+        'estado': 'status',
+    },
+    orden='-fecha',
+    filtrar=filtrar_sesiones,
+)
 
 
 @login_required
+@lectura_replica
 def inventario_sesiones(request):
-    sesiones = InventarioSesion.objects.select_related('user').order_by('-created_at')
-    return render(request, 'inventario_fisico/sesiones.html', {'sesiones': sesiones})
+    return render_tabla(request, 'inventario_fisico/sesiones.html', 'inventario_fisico/sesiones_tabla.html', {
+        'tabla': TABLA_SESIONES.pagina(request),
+    })
 
 
 @login_required
@@ -36,6 +85,7 @@ def inventario_iniciar(request):
             notas=notas,
             status='en_proceso'
         )
+        _publicar_estado(sesion)
 
         messages.success(request, f'Sesion de inventario #{sesion.pk} iniciada. Puede comenzar a escanear productos.')
         return redirect('inventario_conteo', sesion_id=sesion.pk)
@@ -62,15 +112,99 @@ def inventario_conteo(request, sesion_id):
     })
 
 
+def _ajustar_contadores(sesion_id, total=0, con_diferencia=0):
+    """
+    Aplica los cambios de un conteo a los contadores de la sesion con F(),
+    sin recontar los detalles. Retorna los contadores resultantes, o None si
+    la sesion ya no esta en proceso.
+    """
+    actualizadas = InventarioSesion.objects.filter(pk=sesion_id, status='en_proceso').update(
+        total_productos=F('total_productos') + total,
+        productos_con_diferencia=F('productos_con_diferencia') + con_diferencia,
+    )
+    if not actualizadas:
+        return None
+
+    # La fila queda bloqueada por el UPDATE hasta el commit, los valores son exactos
+    return InventarioSesion.objects.filter(pk=sesion_id).values(
+        'total_productos', 'productos_con_diferencia'
+    ).get()
+
+
+def _publicar_estado(sesion):
+    publicar_evento(sesion.pk, 'estado', {
+        'status': sesion.status,
+        'total_productos': sesion.total_productos,
+        'productos_con_diferencia': sesion.productos_con_diferencia,
+    })
+
+
+def _guardar_conteo(sesion, product, cantidad_int):
+    """
+    Registra o actualiza el conteo de un producto y ajusta los contadores de
+    la sesion. Retorna (mensaje, datos), o None si la sesion ya no esta en proceso.
+    """
+    stock_sistema = product.stock_actual
+    diferencia = cantidad_int - stock_sistema
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                conteo = DetalleConteo.objects.create(
+                    sesion=sesion,
+                    product=product,
+                    stock_sistema=stock_sistema,
+                    cantidad_contada=cantidad_int,
+                    diferencia=diferencia
+                )
+            total = 1
+            con_diferencia = int(diferencia != 0)
+            mensaje = f'Conteo registrado para "{product.name}"'
+        except IntegrityError:
+            # El producto ya fue contado en esta sesion: se actualiza el conteo
+            conteo = DetalleConteo.objects.select_for_update().get(
+                sesion=sesion,
+                product=product
+            )
+            total = 0
+            con_diferencia = int(diferencia != 0) - int(conteo.diferencia != 0)
+            conteo.cantidad_contada = cantidad_int
+            conteo.diferencia = diferencia
+            conteo.updated_at = timezone.now()
+            conteo.save(update_fields=['cantidad_contada', 'diferencia', 'updated_at'])
+            mensaje = f'Conteo actualizado para "{product.name}"'
+
+        contadores = _ajustar_contadores(sesion.pk, total, con_diferencia)
+        if contadores is None:
+            transaction.set_rollback(True)
+            return None
+        registrar_conteos([product.pk], conteo.updated_at)
+
+        datos = {
+            'product_name': product.name,
+            'product_code': product.code,
+            'stock_sistema': stock_sistema,
+            'cantidad_contada': cantidad_int,
+            'diferencia': diferencia,
+            'unit': product.unit,
+            'conteo_id': conteo.pk,
+            **contadores,
+        }
+        publicar_evento(sesion.pk, 'conteo', datos)
+
+    metricas.incrementar('inventario_conteos_total', sesion=sesion.pk)
+    return mensaje, datos
+
+
 @login_required
 def inventario_registrar_conteo(request, sesion_id):
     sesion = get_object_or_404(InventarioSesion, pk=sesion_id)
 
     if sesion.status != 'en_proceso':
-        return JsonResponse({
+        return responder(request, {
             'success': False,
             'error': 'La sesion no esta en proceso.'
-        })
+        }, conteo_compacto)
 
     if request.method == 'POST':
         product_code = request.POST.get('product_code', '').strip()
@@ -79,65 +213,219 @@ def inventario_registrar_conteo(request, sesion_id):
         try:
             product = Product.objects.get(code__iexact=product_code)
         except Product.DoesNotExist:
-            return JsonResponse({
+            return responder(request, {
                 'success': False,
                 'error': f'No existe producto con codigo "{product_code}"'
-            })
+            }, conteo_compacto)
 
         try:
             cantidad_int = int(cantidad)
             if cantidad_int < 0:
-                return JsonResponse({
+                return responder(request, {
                     'success': False,
                     'error': 'La cantidad no puede ser negativa.'
-                })
+                }, conteo_compacto)
         except ValueError:
-            return JsonResponse({
+            return responder(request, {
                 'success': False,
                 'error': 'La cantidad debe ser un numero entero.'
-            })
+            }, conteo_compacto)
+
+        registrado = _guardar_conteo(sesion, product, cantidad_int)
+        if registrado is None:
+            return responder(request, {
+                'success': False,
+                'error': 'La sesion no esta en proceso.'
+            }, conteo_compacto)
+
+        mensaje, datos = registrado
+        return responder(request, {
+            'success': True,
+            'message': mensaje,
+            'data': datos,
+        }, conteo_compacto)
 
-        conteo_existente = DetalleConteo.objects.filter(
-            sesion=sesion,
-            product=product
-        ).first()
+    return responder(request, {'success': False, 'error': 'Metodo no permitido'}, conteo_compacto)
 
-        stock_sistema = product.stock_actual
-        diferencia = cantidad_int - stock_sistema
 
-        if conteo_existente:
-            conteo_existente.cantidad_contada = cantidad_int
-            conteo_existente.diferencia = diferencia
-            conteo_existente.updated_at = timezone.now()
-            conteo_existente.save()
-            mensaje = f'Conteo actualizado para "{product.name}"'
+COLUMNAS_CONTEO = {
+    'codigo': ('codigo', 'código', 'code', 'cod'),
+    'cantidad': ('cantidad', 'cantidad_contada', 'conteo', 'qty', 'quantity'),
+}
+
+# Codigos desconocidos y errores que se muestran en pantalla; los totales se informan siempre
+MAX_DESCONOCIDOS_MOSTRADOS = 500
+
+
+def _importar_lote_conteos(sesion, lote, resultado):
+    """Registra un lote de filas (numero, codigo, cantidad) con consultas por lote, no por fila"""
+    por_codigo = {}
+    for numero, codigo, cantidad in lote:
+        # Si el colector repite un codigo gana la ultima lectura, igual que al re-escanear
+        por_codigo[codigo.upper()] = (numero, codigo, cantidad)
+
+    productos = resolver_productos([codigo for _, codigo, _ in por_codigo.values()])
+
+    cantidades = {}
+    for clave, (numero, codigo, cantidad) in por_codigo.items():
+        producto = productos.get(clave)
+        if producto is None:
+            resultado['desconocidos'] += 1
+            if len(resultado['codigos_desconocidos']) < MAX_DESCONOCIDOS_MOSTRADOS:
+                resultado['codigos_desconocidos'].append((numero, codigo))
         else:
-            DetalleConteo.objects.create(
-                sesion=sesion,
-                product=product,
-                stock_sistema=stock_sistema,
-                cantidad_contada=cantidad_int,
-                diferencia=diferencia
-            )
-            mensaje = f'Conteo registrado para "{product.name}"'
+            cantidades[producto['id']] = cantidad
 
-        sesion.total_productos = sesion.detalles.count()
-        sesion.save()
+    if not cantidades:
+        return True
 
-        return JsonResponse({
-            'success': True,
-            'message': mensaje,
-            'data': {
-                'product_name': product.name,
-                'product_code': product.code,
-                'stock_sistema': stock_sistema,
-                'cantidad_contada': cantidad_int,
-                'diferencia': diferencia,
-                'unit': product.unit,
-            }
+    stock = {producto['id']: producto['stock_actual'] for producto in productos.values()}
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        # La sesion bloqueada no se finaliza ni se cancela mientras se escribe el lote
+        estado = InventarioSesion.objects.select_for_update().filter(
+            pk=sesion.pk
+        ).values_list('status', flat=True).first()
+        if estado != 'en_proceso':
+            return False
+
+        existentes = dict(
+            DetalleConteo.objects.select_for_update().filter(
+                sesion=sesion,
+                product_id__in=cantidades.keys()
+            ).values_list('product_id', 'diferencia')
+        )
+
+        conteos = []
+        con_diferencia = 0
+        for product_id, cantidad in cantidades.items():
+            diferencia = cantidad - stock[product_id]
+            con_diferencia += int(diferencia != 0)
+            if product_id in existentes:
+                con_diferencia -= int(existentes[product_id] != 0)
+            conteos.append(DetalleConteo(
+                sesion=sesion,
+                product_id=product_id,
+                stock_sistema=stock[product_id],
+                cantidad_contada=cantidad,
+                diferencia=diferencia,
+                created_at=ahora,
+                updated_at=ahora,
+            ))
+
+        # Un solo INSERT ... ON CONFLICT/ON DUPLICATE KEY por lote; los conteos
+        # existentes conservan su stock_sistema, igual que al re-escanear.
+        upsert = {
+            'update_conflicts': True,
+            'update_fields': ['cantidad_contada', 'diferencia', 'updated_at'],
+        }
+        if connection.features.supports_update_conflicts_with_target:
+            upsert['unique_fields'] = ['sesion', 'product']
+        DetalleConteo.objects.bulk_create(conteos, batch_size=1000, **upsert)
+
+        nuevos = len(conteos) - len(existentes)
+        contadores = _ajustar_contadores(sesion.pk, nuevos, con_diferencia)
+        if contadores is None:
+            transaction.set_rollback(True)
+            return False
+        registrar_conteos(cantidades.keys(), ahora)
+
+    metricas.incrementar('inventario_conteos_total', len(conteos), sesion=sesion.pk)
+    resultado['creados'] += nuevos
+    resultado['actualizados'] += len(existentes)
+    resultado.update(contadores)
+    return True
+
+
+def _importar_conteos(sesion, archivo):
+    resultado = {
+        'filas': 0,
+        'creados': 0,
+        'actualizados': 0,
+        'desconocidos': 0,
+        'codigos_desconocidos': [],
+        'invalidas': 0,
+        'errores': [],
+    }
+
+    def error(numero, mensaje):
+        resultado['invalidas'] += 1
+        if len(resultado['errores']) < MAX_DESCONOCIDOS_MOSTRADOS:
+            resultado['errores'].append((numero, mensaje))
+
+    def filas_validas():
+        for numero, fila in filas_con_columnas(leer_filas(archivo), COLUMNAS_CONTEO):
+            resultado['filas'] += 1
+            codigo = normalizar_codigo(fila['codigo'])
+            if not codigo:
+                error(numero, 'Codigo vacio.')
+                continue
+            try:
+                cantidad = normalizar_entero(fila['cantidad'])
+            except (TypeError, ValueError):
+                error(numero, f'La cantidad de "{codigo}" debe ser un numero entero.')
+                continue
+            if cantidad < 0:
+                error(numero, f'La cantidad de "{codigo}" no puede ser negativa.')
+                continue
+            yield numero, codigo, cantidad
+
+    inicio = time.perf_counter()
+    for lote in en_lotes(filas_validas()):
+        if not _importar_lote_conteos(sesion, lote, resultado):
+            raise ArchivoInvalido('La sesion dejo de estar en proceso durante la importacion.')
+    resultado['segundos'] = time.perf_counter() - inicio
+
+    if resultado['creados'] or resultado['actualizados']:
+        publicar_evento(sesion.pk, 'importacion', {
+            'creados': resultado['creados'],
+            'actualizados': resultado['actualizados'],
+            'total_productos': resultado['total_productos'],
+            'productos_con_diferencia': resultado['productos_con_diferencia'],
         })
+    return resultado
 
-    return JsonResponse({'success': False, 'error': 'Metodo no permitido'})
+
+@login_required
+def inventario_importar_conteo(request, sesion_id):
+    """Importar conteos desde el archivo CSV/XLSX de un colector de datos"""
+    sesion = get_object_or_404(InventarioSesion, pk=sesion_id)
+
+    if sesion.user_id != request.user.pk and request.user.role != 'admin':
+        messages.error(request, 'No tiene permiso para acceder a esta sesion.')
+        return redirect('inventario_sesiones')
+
+    if sesion.status != 'en_proceso':
+        messages.error(request, 'Solo se pueden importar conteos en sesiones en proceso.')
+        return redirect('inventario_resultados', sesion_id=sesion.pk)
+
+    resultado = None
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            messages.error(request, 'Seleccione el archivo a importar.')
+        else:
+            try:
+                resultado = _importar_conteos(sesion, archivo)
+            except ArchivoInvalido as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(
+                    request,
+                    f'Importacion completada: {resultado["creados"]} conteo(s) nuevo(s) y '
+                    f'{resultado["actualizados"]} actualizado(s) en {resultado["segundos"]:.1f} s.'
+                )
+                if resultado['desconocidos']:
+                    messages.warning(
+                        request,
+                        f'{resultado["desconocidos"]} codigo(s) no existen en el sistema y no se importaron.'
+                    )
+
+    return render(request, 'inventario_fisico/importar.html', {
+        'sesion': sesion,
+        'resultado': resultado,
+    })
 
 
 @login_required
@@ -148,17 +436,20 @@ def inventario_finalizar(request, sesion_id):
         messages.error(request, 'Esta sesion ya fue finalizada.')
         return redirect('inventario_resultados', sesion_id=sesion.pk)
 
-    if sesion.detalles.count() == 0:
+    if sesion.total_productos == 0:
         messages.error(request, 'No puede finalizar una sesion sin conteos.')
         return redirect('inventario_conteo', sesion_id=sesion.pk)
 
     if request.method == 'POST':
-        conteos_con_diferencia = sesion.detalles.exclude(diferencia=0).count()
+        with transaction.atomic():
+            # Bloquear la sesion para que ningun escaneo concurrente altere los contadores
+            sesion = InventarioSesion.objects.select_for_update().get(pk=sesion.pk)
+            conteos_con_diferencia = sesion.productos_con_diferencia
 
-        sesion.status = 'finalizado'
-        sesion.finished_at = timezone.now()
-        sesion.productos_con_diferencia = conteos_con_diferencia
-        sesion.save()
+            sesion.status = 'finalizado'
+            sesion.finished_at = timezone.now()
+            sesion.save(update_fields=['status', 'finished_at'])
+            _publicar_estado(sesion)
 
         if conteos_con_diferencia > 0:
             messages.warning(
@@ -176,56 +467,116 @@ def inventario_finalizar(request, sesion_id):
     return redirect('inventario_conteo', sesion_id=sesion.pk)
 
 
+RESULTADOS_POR_PAGINA = 50
+
+FILTROS_RESULTADOS = {
+    'diferencias': ~Q(diferencia=0),
+    'faltantes': Q(diferencia__lt=0),
+    'sobrantes': Q(diferencia__gt=0),
+    'correctos': Q(diferencia=0),
+    'todos': Q(),
+}
+
+
+def _resumen_sesion(sesion):
+    """Calcula todos los contadores de la sesion en una sola consulta"""
+    return sesion.detalles.aggregate(
+        total=Count('id'),
+        correctos=Count('id', filter=Q(diferencia=0)),
+        faltantes=Count('id', filter=Q(diferencia__lt=0)),
+        sobrantes=Count('id', filter=Q(diferencia__gt=0)),
+        unidades_faltantes=Coalesce(Sum('diferencia', filter=Q(diferencia__lt=0)), 0),
+        unidades_sobrantes=Coalesce(Sum('diferencia', filter=Q(diferencia__gt=0)), 0),
+        varianza_absoluta=Coalesce(Sum(Abs('diferencia')), 0),
+    )
+
+
 @login_required
 def inventario_resultados(request, sesion_id):
-    sesion = get_object_or_404(InventarioSesion, pk=sesion_id)
+    sesion = get_object_or_404(InventarioSesion.objects.select_related('user'), pk=sesion_id)
 
     if sesion.status == 'en_proceso':
         return redirect('inventario_conteo', sesion_id=sesion.pk)
 
-    conteos = sesion.detalles.select_related('product').order_by('product__name')
-    conteos_con_diferencia = conteos.exclude(diferencia=0)
-    conteos_correctos = conteos.filter(diferencia=0)
+    resumen = _resumen_sesion(sesion)
+    resumen['con_diferencia'] = resumen['faltantes'] + resumen['sobrantes']
+
+    # Por defecto se muestran las diferencias, que es lo que hay que revisar
+    estado = request.GET.get('estado', '')
+    if estado not in FILTROS_RESULTADOS:
+        estado = 'diferencias' if resumen['con_diferencia'] else 'todos'
+    busqueda = request.GET.get('q', '').strip()
+
+    conteos = sesion.detalles.filter(FILTROS_RESULTADOS[estado]).select_related('product')
+    if busqueda:
+        conteos = conteos.filter(
+            Q(product__code__icontains=busqueda) |
+            Q(product__name__icontains=busqueda)
+        )
+    conteos = conteos.order_by('product__name', 'pk')
+
+    paginator = Paginator(conteos, RESULTADOS_POR_PAGINA)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     return render(request, 'inventario_fisico/resultados.html', {
         'sesion': sesion,
-        'conteos': conteos,
-        'conteos_con_diferencia': conteos_con_diferencia,
-        'conteos_correctos': conteos_correctos,
+        'resumen': resumen,
+        'page_obj': page_obj,
+        'conteos': page_obj.object_list,
+        'filtros': {
+            'estado': estado,
+            'q': busqueda,
+        },
     })
 
 
 @login_required
 @transaction.atomic
 def inventario_conciliar(request, sesion_id):
-    sesion = get_object_or_404(InventarioSesion, pk=sesion_id)
+    # Bloqueada hasta el final de la vista: dos conciliaciones simultaneas
+    # ajustarian el stock dos veces
+    sesion = get_object_or_404(InventarioSesion.objects.select_for_update(), pk=sesion_id)
 
     if sesion.status != 'finalizado':
         messages.error(request, 'Solo se pueden conciliar sesiones finalizadas.')
         return redirect('inventario_resultados', sesion_id=sesion.pk)
 
     if request.method == 'POST':
-        conteos_con_diferencia = sesion.detalles.exclude(diferencia=0)
-
-        ajustes_realizados = 0
+        inicio = time.perf_counter()
+        conteos_con_diferencia = list(
+            sesion.detalles.exclude(diferencia=0).values_list(
+                'product_id', 'stock_sistema', 'cantidad_contada', 'diferencia'
+            )
+        )
 
-        for conteo in conteos_con_diferencia:
-            InventoryAdjustment.objects.create(
-                product=conteo.product,
+        # Ajustes y stock por lote: antes era un INSERT, un SELECT del producto
+        # y un UPDATE por cada conteo con diferencia
+        ahora = timezone.now()
+        InventoryAdjustment.objects.bulk_create([
+            InventoryAdjustment(
+                product_id=product_id,
                 user=request.user,
-                system_qty=conteo.stock_sistema,
-                physical_qty=conteo.cantidad_contada,
-                difference=conteo.diferencia
+                system_qty=stock_sistema,
+                physical_qty=cantidad_contada,
+                difference=diferencia,
+                created_at=ahora,
+                updated_at=ahora,
             )
+            for product_id, stock_sistema, cantidad_contada, diferencia in conteos_con_diferencia
+        ], batch_size=1000)
+        fijar_stock({
+            product_id: cantidad_contada
+            for product_id, _, cantidad_contada, _ in conteos_con_diferencia
+        })
 
-            conteo.product.stock_actual = conteo.cantidad_contada
-            conteo.product.save()
-
-            ajustes_realizados += 1
+        ajustes_realizados = len(conteos_con_diferencia)
+        metricas.observar('inventario_conciliacion_segundos', time.perf_counter() - inicio)
+        metricas.incrementar('inventario_conciliacion_ajustes_total', ajustes_realizados)
 
         sesion.status = 'conciliado'
         sesion.conciliated_at = timezone.now()
-        sesion.save()
+        sesion.save(update_fields=['status', 'conciliated_at'])
+        _publicar_estado(sesion)
 
         messages.success(
             request,
@@ -247,7 +598,8 @@ def inventario_cancelar(request, sesion_id):
 
     if request.method == 'POST':
         sesion.status = 'cancelado'
-        sesion.save()
+        sesion.save(update_fields=['status'])
+        _publicar_estado(sesion)
         messages.info(request, f'Sesion #{sesion.pk} cancelada.')
         return redirect('inventario_sesiones')
 
@@ -264,23 +616,39 @@ def inventario_eliminar_conteo(request, sesion_id, conteo_id):
             'error': 'No se pueden eliminar conteos de sesiones finalizadas.'
         })
 
-    conteo = get_object_or_404(DetalleConteo, pk=conteo_id, sesion=sesion)
+    conteo = get_object_or_404(DetalleConteo.objects.select_related('product'), pk=conteo_id, sesion=sesion)
 
     product_name = conteo.product.name
-    conteo.delete()
-
-    sesion.total_productos = sesion.detalles.count()
-    sesion.save()
+    contadores = {}
+
+    with transaction.atomic():
+        diferencia = DetalleConteo.objects.select_for_update().filter(
+            pk=conteo.pk
+        ).values_list('diferencia', flat=True).first()
+
+        if diferencia is not None:
+            DetalleConteo.objects.filter(pk=conteo.pk).delete()
+            contadores = _ajustar_contadores(sesion.pk, -1, -int(diferencia != 0))
+            if contadores is None:
+                transaction.set_rollback(True)
+                return JsonResponse({
+                    'success': False,
+                    'error': 'No se pueden eliminar conteos de sesiones finalizadas.'
+                })
+            publicar_evento(sesion.pk, 'conteo_eliminado', {'conteo_id': conteo.pk, **contadores})
 
     return JsonResponse({
         'success': True,
-        'message': f'Conteo de "{product_name}" eliminado.'
+        'message': f'Conteo de "{product_name}" eliminado.',
+        **contadores,
     })
 
 
 @login_required
+@lectura_replica
 def exportar_reporte_auditoria(request, sesion_id):
     """Exportar reporte de auditoría de inventario físico a Excel"""
+    inicio = time.perf_counter()
     sesion = get_object_or_404(InventarioSesion, pk=sesion_id)
 
     if sesion.status == 'en_proceso':
@@ -397,6 +765,7 @@ def exportar_reporte_auditoria(request, sesion_id):
             productos_correctos += 1
 
         row_num += 1
+    filas = row_num - header_row - 1
 
     # Resumen
     row_num += 2
@@ -444,4 +813,5 @@ def exportar_reporte_auditoria(request, sesion_id):
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
     wb.save(response)
+    metricas.registrar_exportacion('auditoria', filas, time.perf_counter() - inicio)
     return response
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import render, redirect
+
+from .. import lentas
+from .usuarios import admin_required
+
+PETICIONES_MOSTRADAS = 50
+
+
+@admin_required
+def consultas_lentas(request):
+    """Consultas lentas agrupadas por forma, y las ultimas peticiones lentas"""
+    registros = lentas.leer()
+    return render(request, 'lentas/lista.html', {
+        'grupos': lentas.agrupar(registros),
+        'peticiones': [registro for registro in registros if registro['tipo'] == 'peticion'][:PETICIONES_MOSTRADAS],
+        'total_registros': len(registros),
+        'capacidad': getattr(settings, 'LENTAS_CAPACIDAD', 500),
+        'activo': getattr(settings, 'LENTAS', False),
+        'umbral_sql': getattr(settings, 'LENTAS_SQL_MS', 200),
+        'umbral_peticion': getattr(settings, 'LENTAS_PETICION_MS', 1000),
+    })
+
+
+@admin_required
+def consultas_lentas_vaciar(request):
+    if request.method == 'POST':
+        lentas.vaciar()
+        messages.success(request, 'Registro de consultas lentas vaciado.')
+    return redirect('consultas_lentas')
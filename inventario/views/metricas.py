@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .. import metricas
+
+
+def exportar_metricas(request):
+    """Metricas de todos los procesos en formato de texto de Prometheus"""
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    autorizacion = request.headers.get('Authorization', '')
+    if token and constant_time_compare(autorizacion, f'Bearer {token}'):
+        pass
+    elif not (request.user.is_authenticated and request.user.role == 'admin'):
+        response = HttpResponse('No autorizado.\n', status=401, content_type='text/plain; charset=utf-8')
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response
+
+    return HttpResponse(metricas.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
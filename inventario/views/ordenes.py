@@ -0,0 +1,351 @@
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import Q, F, Sum, Count, Case, When, Value, IntegerField
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+
+from ..importacion import resolver_productos
+from ..models import PurchaseOrder, PurchaseOrderLine, Entrada, Provider
+from ..resumen import registrar_entradas
+from ..stock import sumar_stock
+from ..tablas import Tabla, render_tabla
+
+FILTROS_ORDENES = {
+    'abiertas': Q(status__in=PurchaseOrder.ESTADOS_ABIERTOS),
+    'pendiente': Q(status='pendiente'),
+    'parcial': Q(status='parcial'),
+    'recibida': Q(status='recibida'),
+    'cancelada': Q(status='cancelada'),
+    'todas': Q(),
+}
+
+
+def _actualizar_estado(orden):
+    """
+    Recalcula los totales de las lineas con una sola consulta y los guarda
+    en la orden junto con el estado que corresponde.
+    """
+    totales = orden.lineas.aggregate(
+        pedida=Coalesce(Sum('quantity'), 0),
+        recibida=Coalesce(Sum(Least('quantity_received', 'quantity')), 0),
+        pendientes=Count('pk', filter=Q(quantity_received__lt=F('quantity'))),
+    )
+
+    orden.cantidad_pedida = totales['pedida']
+    orden.cantidad_recibida = totales['recibida']
+    orden.lineas_pendientes = totales['pendientes']
+    if orden.status != 'cancelada':
+        if totales['pendientes'] == 0:
+            orden.status = 'recibida'
+        elif totales['recibida'] > 0:
+            orden.status = 'parcial'
+        else:
+            orden.status = 'pendiente'
+    orden.updated_at = timezone.now()
+    orden.save(update_fields=[
+        'cantidad_pedida', 'cantidad_recibida', 'lineas_pendientes', 'status', 'updated_at'
+    ])
+
+
+def filtrar_ordenes(ordenes, parametros):
+    """Aplica los filtros del listado de ordenes; retorna el queryset y los filtros usados"""
+    estado = parametros.get('estado', '')
+    if estado not in FILTROS_ORDENES:
+        estado = 'abiertas'
+    busqueda = parametros.get('q', '').strip()
+
+    ordenes = ordenes.filter(FILTROS_ORDENES[estado])
+    if busqueda:
+        ordenes = ordenes.filter(
+            Q(order_number__icontains=busqueda) |
+            Q(provider__name__icontains=busqueda)
+        )
+
+    return ordenes, {'estado': estado, 'q': busqueda}
+
+
+TABLA_ORDENES = Tabla(
+    PurchaseOrder.objects.select_related('provider', 'user'),
+    columnas={
+        'fecha': 'created_at',
+        'numero': 'order_number',
+        'proveedor': 'provider__name',
+        'costo': 'total_cost',
+    },
+    orden='-fecha',
+    filtrar=filtrar_ordenes,
+)
+
+
+@login_required
+def orden_list(request):
+    tabla = TABLA_ORDENES.pagina(request)
+
+    return render_tabla(request, 'ordenes/list.html', 'ordenes/tabla.html', {
+        'tabla': tabla,
+        'filtros': tabla['filtros'],
+    })
+
+
+@login_required
+def orden_create(request):
+    proveedores = Provider.objects.filter(status='active').order_by('name')
+
+    if request.method == 'POST':
+        order_number = request.POST.get('order_number', '').strip()
+        provider_id = request.POST.get('provider', '')
+        codigos = [codigo.strip() for codigo in request.POST.getlist('codigo')]
+        cantidades = [cantidad.strip() for cantidad in request.POST.getlist('cantidad')]
+        costos = [costo.strip() for costo in request.POST.getlist('costo')]
+
+        errors = False
+
+        if not order_number:
+            messages.error(request, 'El numero de orden es requerido.')
+            errors = True
+        elif len(order_number) > 50:
+            messages.error(request, 'El numero de orden no puede exceder 50 caracteres.')
+            errors = True
+        elif PurchaseOrder.objects.filter(order_number__iexact=order_number).exists():
+            messages.error(request, 'Ya existe una orden con ese numero.')
+            errors = True
+
+        provider = proveedores.filter(pk=provider_id).first() if provider_id.isdigit() else None
+        if provider is None:
+            messages.error(request, 'El proveedor seleccionado no es valido.')
+            errors = True
+
+        # Las filas en blanco del formulario se ignoran
+        filas = [
+            (numero, codigo, cantidad, costo)
+            for numero, (codigo, cantidad, costo) in enumerate(zip(codigos, cantidades, costos), start=1)
+            if codigo or cantidad or costo
+        ]
+        if not filas:
+            messages.error(request, 'La orden debe tener al menos una linea.')
+            errors = True
+
+        productos = resolver_productos(
+            [codigo for _, codigo, _, _ in filas if codigo],
+            campos=('id', 'code', 'status'),
+        )
+        lineas = []
+        vistos = set()
+        for numero, codigo, cantidad, costo in filas:
+            producto = productos.get(codigo.upper()) if codigo else None
+            if producto is None:
+                messages.error(request, f'Linea {numero}: no existe un producto con el codigo "{codigo}".')
+                errors = True
+                continue
+            if producto['status'] != 'active':
+                messages.error(request, f'Linea {numero}: el producto "{producto["code"]}" no esta activo.')
+                errors = True
+                continue
+            if producto['id'] in vistos:
+                messages.error(request, f'Linea {numero}: el producto "{producto["code"]}" esta repetido.')
+                errors = True
+                continue
+            vistos.add(producto['id'])
+
+            try:
+                cantidad_int = int(cantidad)
+                if cantidad_int <= 0:
+                    raise ValueError
+            except ValueError:
+                messages.error(request, f'Linea {numero}: la cantidad debe ser un numero entero mayor a cero.')
+                errors = True
+                continue
+
+            try:
+                costo_decimal = Decimal(costo) if costo else Decimal('0')
+                if costo_decimal < 0 or not costo_decimal.is_finite():
+                    raise InvalidOperation
+            except InvalidOperation:
+                messages.error(request, f'Linea {numero}: el costo unitario debe ser un numero valido.')
+                errors = True
+                continue
+
+            lineas.append(PurchaseOrderLine(
+                product_id=producto['id'],
+                quantity=cantidad_int,
+                unit_cost=costo_decimal.quantize(Decimal('0.01')),
+            ))
+
+        if not errors:
+            try:
+                with transaction.atomic():
+                    orden = PurchaseOrder.objects.create(
+                        order_number=order_number,
+                        provider=provider,
+                        user=request.user,
+                        total_cost=sum(linea.quantity * linea.unit_cost for linea in lineas),
+                        cantidad_pedida=sum(linea.quantity for linea in lineas),
+                        lineas_pendientes=len(lineas),
+                    )
+                    for linea in lineas:
+                        linea.order = orden
+                    PurchaseOrderLine.objects.bulk_create(lineas, batch_size=500)
+            except IntegrityError:
+                # Otra peticion creo una orden con el mismo numero despues de la validacion
+                if not PurchaseOrder.objects.filter(order_number__iexact=order_number).exists():
+                    raise
+                messages.error(request, 'Ya existe una orden con ese numero.')
+                errors = True
+
+        if errors:
+            return render(request, 'ordenes/form.html', {
+                'proveedores': proveedores,
+                'order_number': order_number,
+                'provider_id': provider_id,
+                'filas': list(zip(codigos, cantidades, costos)),
+            })
+
+        messages.success(request, f'Orden "{order_number}" creada con {len(lineas)} linea(s).')
+        return redirect('orden_detalle', pk=orden.pk)
+
+    return render(request, 'ordenes/form.html', {
+        'proveedores': proveedores,
+        'order_number': '',
+        'provider_id': '',
+        'filas': [('', '', '')] * 3,
+    })
+
+
+@login_required
+def orden_detalle(request, pk):
+    orden = get_object_or_404(PurchaseOrder.objects.select_related('provider', 'user'), pk=pk)
+    lineas = orden.lineas.select_related('product').order_by('product__name')
+    entradas = Entrada.objects.filter(
+        purchase_order_line__order=orden
+    ).select_related('product', 'user').order_by('-created_at', '-pk')
+
+    return render(request, 'ordenes/detalle.html', {
+        'orden': orden,
+        'lineas': lineas,
+        'entradas': entradas,
+    })
+
+
+@login_required
+def orden_recibir(request, pk):
+    """Registrar la entrega (total o parcial) de una orden de compra"""
+    orden = get_object_or_404(PurchaseOrder.objects.select_related('provider'), pk=pk)
+
+    if orden.status not in PurchaseOrder.ESTADOS_ABIERTOS:
+        messages.error(request, 'Solo se pueden recibir ordenes pendientes o recibidas parcialmente.')
+        return redirect('orden_detalle', pk=orden.pk)
+
+    lineas = orden.lineas.filter(
+        quantity_received__lt=F('quantity')
+    ).select_related('product').order_by('product__name')
+
+    if request.method == 'POST':
+        with transaction.atomic():
+            # Bloquear la orden para que dos recepciones no cuenten la misma cantidad
+            orden = PurchaseOrder.objects.select_for_update().select_related('provider').get(pk=orden.pk)
+            if orden.status not in PurchaseOrder.ESTADOS_ABIERTOS:
+                messages.error(request, 'La orden ya no esta abierta.')
+                return redirect('orden_detalle', pk=orden.pk)
+
+            errors = False
+            recibidas = {}
+            for linea in lineas:
+                valor = request.POST.get(f'recibir_{linea.pk}', '').strip()
+                linea.valor = valor
+                try:
+                    cantidad = int(valor) if valor else 0
+                except ValueError:
+                    messages.error(request, f'La cantidad de "{linea.product.code}" debe ser un numero entero.')
+                    errors = True
+                    continue
+                if cantidad < 0 or cantidad > linea.pendiente:
+                    messages.error(
+                        request,
+                        f'La cantidad de "{linea.product.code}" debe estar entre 0 y {linea.pendiente}.'
+                    )
+                    errors = True
+                    continue
+                if cantidad:
+                    recibidas[linea.pk] = (linea, cantidad)
+
+            if not errors and not recibidas:
+                messages.error(request, 'Indique la cantidad recibida de al menos una linea.')
+                errors = True
+
+            if errors:
+                return render(request, 'ordenes/recibir.html', {
+                    'orden': orden,
+                    'lineas': lineas,
+                })
+
+            ahora = timezone.now()
+            Entrada.objects.bulk_create([
+                Entrada(
+                    product_id=linea.product_id,
+                    provider=orden.provider,
+                    user=request.user,
+                    purchase_order_line=linea,
+                    quantity=cantidad,
+                    total_cost=linea.unit_cost * cantidad,
+                    created_at=ahora,
+                    updated_at=ahora,
+                )
+                for linea, cantidad in recibidas.values()
+            ], batch_size=500)
+
+            PurchaseOrderLine.objects.filter(pk__in=recibidas.keys()).update(
+                quantity_received=F('quantity_received') + Case(
+                    *[When(pk=pk, then=Value(cantidad)) for pk, (_, cantidad) in recibidas.items()],
+                    output_field=IntegerField(),
+                ),
+                updated_at=ahora,
+            )
+            cantidades = {linea.product_id: cantidad for linea, cantidad in recibidas.values()}
+            sumar_stock(cantidades)
+            registrar_entradas(cantidades, orden.provider_id, ahora)
+            _actualizar_estado(orden)
+
+        unidades = sum(cantidad for _, cantidad in recibidas.values())
+        if orden.status == 'recibida':
+            messages.success(request, f'Se recibieron {unidades} unidades. La orden "{orden.order_number}" esta completa.')
+        else:
+            messages.warning(
+                request,
+                f'Se recibieron {unidades} unidades. Quedan {orden.lineas_pendientes} linea(s) pendiente(s) por recibir.'
+            )
+        return redirect('orden_detalle', pk=orden.pk)
+
+    # Por defecto se propone recibir todo lo pendiente
+    for linea in lineas:
+        linea.valor = linea.pendiente
+
+    return render(request, 'ordenes/recibir.html', {
+        'orden': orden,
+        'lineas': lineas,
+    })
+
+
+@login_required
+def orden_cancelar(request, pk):
+    if request.method == 'POST':
+        with transaction.atomic():
+            # Bloquear la orden para no cancelarla a mitad de una recepcion
+            orden = get_object_or_404(PurchaseOrder.objects.select_for_update(), pk=pk)
+            if orden.status not in PurchaseOrder.ESTADOS_ABIERTOS:
+                messages.error(request, 'Solo se pueden cancelar ordenes abiertas.')
+                return redirect('orden_detalle', pk=orden.pk)
+            orden.status = 'cancelada'
+            orden.updated_at = timezone.now()
+            orden.save(update_fields=['status', 'updated_at'])
+        messages.success(request, f'Orden "{orden.order_number}" cancelada. Lo recibido se mantiene en el inventario.')
+        return redirect('orden_list')
+
+    orden = get_object_or_404(PurchaseOrder, pk=pk)
+    if orden.status not in PurchaseOrder.ESTADOS_ABIERTOS:
+        messages.error(request, 'Solo se pueden cancelar ordenes abiertas.')
+        return redirect('orden_detalle', pk=orden.pk)
+
+    return render(request, 'ordenes/cancelar.html', {'orden': orden})
@@ -2,17 +2,67 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
+from django.db.models import F, Q
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from datetime import datetime
+import time
 
+from .. import metricas
+from ..importacion import importar_catalogo, ArchivoInvalido
 from ..models import Product, Category, Entrada, InventoryAdjustment
+from ..replicas import lectura_replica
+from ..tablas import Tabla, render_tabla
+from ..versiones import condicional
+
+
+def filtrar_productos(productos, parametros):
+    """Aplica los filtros del listado de productos; retorna el queryset y los filtros usados"""
+    filtros = {
+        clave: parametros.get(clave, '')
+        for clave in ('q', 'category', 'status', 'stock')
+    }
+
+    if filtros['q']:
+        productos = productos.filter(
+            Q(code__icontains=filtros['q']) |
+            Q(name__icontains=filtros['q'])
+        )
+
+    if filtros['category']:
+        productos = productos.filter(category_id=filtros['category'])
+
+    if filtros['status']:
+        productos = productos.filter(status=filtros['status'])
+
+    if filtros['stock'] == 'bajo':
+        productos = productos.filter(stock_actual__lte=F('min_stock'))
+
+    return productos, filtros
+
+
+TABLA_PRODUCTOS = Tabla(
+    Product.objects.select_related('category', 'resumen__ultimo_proveedor'),
+    columnas={
+        'codigo': 'code',
+        'nombre': 'name',
+        'categoria': 'category__name',
+        'stock': 'stock_actual',
+        'minimo': 'min_stock',
+        'estado': 'status',
+    },
+    orden='nombre',
+    filtrar=filtrar_productos,
+)
 
 
 @login_required
+@condicional('productos')
 def producto_list(request):
-    productos = Product.objects.select_related('category').all().order_by('name')
-    return render(request, 'productos/list.html', {'productos': productos})
+    return render_tabla(request, 'productos/list.html', 'productos/tabla.html', {
+        'tabla': TABLA_PRODUCTOS.pagina(request),
+        'categorias': Category.objects.order_by('name'),
+    })
 
 
 @login_required
@@ -196,7 +246,10 @@ def producto_edit(request, pk):
         producto.category = category
         producto.location = location
         producto.status = status
-        producto.save()
+        # Sin stock_actual: lo mueven las entradas y salidas con UPDATE
+        producto.save(update_fields=[
+            'code', 'name', 'description', 'unit', 'min_stock', 'category', 'location', 'status',
+        ])
 
         messages.success(request, f'Producto "{name}" actualizado exitosamente.')
         return redirect('producto_list')
@@ -237,8 +290,40 @@ def producto_delete(request, pk):
 
 
 @login_required
+def producto_importar(request):
+    """Importar o actualizar el catalogo de productos desde un archivo CSV/XLSX"""
+    resultado = None
+
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            messages.error(request, 'Seleccione el archivo a importar.')
+        else:
+            try:
+                resultado = importar_catalogo(
+                    archivo,
+                    crear_categorias=request.POST.get('crear_categorias') == 'on',
+                    solo_nuevos=request.POST.get('solo_nuevos') == 'on',
+                )
+            except ArchivoInvalido as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(
+                    request,
+                    f'Importacion completada: {resultado["creados"]} producto(s) creado(s) y '
+                    f'{resultado["actualizados"]} actualizado(s) en {resultado["segundos"]:.1f} s.'
+                )
+                if resultado['invalidas']:
+                    messages.warning(request, f'{resultado["invalidas"]} fila(s) con errores no se importaron.')
+
+    return render(request, 'productos/importar.html', {'resultado': resultado})
+
+
+@login_required
+@lectura_replica
 def exportar_inventario_actual(request):
     """Exportar reporte de inventario actual a Excel"""
+    inicio = time.perf_counter()
     productos = Product.objects.select_related('category').filter(status='active').order_by('name')
 
     # Crear workbook
@@ -354,4 +439,5 @@ def exportar_inventario_actual(request):
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
     wb.save(response)
+    metricas.registrar_exportacion('inventario_actual', total_productos, time.perf_counter() - inicio)
     return response
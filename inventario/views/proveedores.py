@@ -1,14 +1,110 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Q, Count, Max, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+from decimal import Decimal
 
+from .. import metricas
 from ..models import Provider, Entrada, PurchaseOrder
+from ..tablas import Tabla, render_tabla
+from ..versiones import condicional, obtener_versiones
+
+# Segundos que se guarda el analisis; las versiones de entradas y proveedores lo invalidan antes
+TIEMPO_CACHE_ANALISIS = 3600
+
+
+def filtrar_proveedores(proveedores, parametros):
+    """Aplica los filtros del listado de proveedores; retorna el queryset y los filtros usados"""
+    filtros = {clave: parametros.get(clave, '') for clave in ('q', 'status')}
+
+    if filtros['q']:
+        proveedores = proveedores.filter(
+            Q(name__icontains=filtros['q']) |
+            Q(rif__icontains=filtros['q'])
+        )
+
+    if filtros['status']:
+        proveedores = proveedores.filter(status=filtros['status'])
+
+    return proveedores, filtros
+
+
+TABLA_PROVEEDORES = Tabla(
+    Provider.objects.all(),
+    columnas={
+        'id': 'id',
+        'nombre': 'name',
+        'rif': 'rif',
+        'estado': 'status',
+    },
+    orden='nombre',
+    filtrar=filtrar_proveedores,
+)
 
 
 @login_required
+@condicional('proveedores')
 def proveedor_list(request):
-    proveedores = Provider.objects.all().order_by('name')
-    return render(request, 'proveedores/list.html', {'proveedores': proveedores})
+    return render_tabla(request, 'proveedores/list.html', 'proveedores/tabla.html', {
+        'tabla': TABLA_PROVEEDORES.pagina(request),
+    })
+
+
+def analisis_proveedores():
+    """
+    Totales de entradas por proveedor con una sola consulta agrupada. Se guarda
+    en el cache con la version de entradas y proveedores, asi que solo se
+    recalcula despues de registrar una entrada o modificar un proveedor.
+    """
+    versiones = obtener_versiones('entradas', 'proveedores')
+    clave = 'analisis_proveedores:' + ':'.join(token for token, _ in versiones)
+    analisis = cache.get(clave)
+    metricas.incrementar(
+        'inventario_cache_total', uso='analisis_proveedores', resultado='fallo' if analisis is None else 'acierto'
+    )
+    if analisis is not None:
+        return analisis
+
+    filas = list(
+        Provider.objects.annotate(
+            total=Coalesce(
+                Sum('entrada__total_cost'),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            # Las entradas de una misma factura u orden se guardan con la misma
+            # fecha: cada fecha distinta es una entrega
+            entregas=Count('entrada__created_at', distinct=True),
+            lineas=Count('entrada'),
+            productos=Count('entrada__product', distinct=True),
+            ultima_entrega=Max('entrada__created_at'),
+        ).values(
+            'id', 'name', 'rif', 'status',
+            'total', 'entregas', 'lineas', 'productos', 'ultima_entrega',
+        ).order_by('-total', 'name')
+    )
+
+    gasto_total = sum(fila['total'] for fila in filas)
+    for fila in filas:
+        fila['participacion'] = float(fila['total'] * 100 / gasto_total) if gasto_total else 0
+
+    analisis = {
+        'proveedores': filas,
+        'gasto_total': gasto_total,
+        'con_entregas': sum(1 for fila in filas if fila['lineas']),
+        'entregas': sum(fila['entregas'] for fila in filas),
+    }
+    cache.set(clave, analisis, TIEMPO_CACHE_ANALISIS)
+    return analisis
+
+
+@login_required
+@condicional('entradas', 'proveedores')
+def proveedor_analisis(request):
+    """Valor recibido, entregas, productos y participacion en el gasto de cada proveedor"""
+    return render(request, 'proveedores/analisis.html', analisis_proveedores())
 
 
 @login_required
@@ -2,13 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
+from django.db import transaction
 from django.db.models import Q
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 from datetime import datetime
+import time
 
+from .. import metricas
 from ..models import Salida, Product
+from ..replicas import lectura_replica
+from ..resumen import registrar_salidas
+from ..tablas import Tabla, render_tabla
 
 
 @login_required
@@ -72,13 +78,34 @@ def salida_registrar(request):
                 'product': product if 'product' in dir() and product else None,
             })
 
-        salida = Salida.objects.create(
-            product=product,
-            user=request.user,
-            receptor=receptor,
-            quantity=quantity_int,
-            motivo=motivo
-        )
+        with transaction.atomic():
+            # Se valida de nuevo con la fila bloqueada: dos salidas simultaneas
+            # no pueden aprobarse con el mismo stock
+            product = Product.objects.select_for_update().get(pk=product.pk)
+            if product.stock_actual >= quantity_int:
+                salida = Salida.objects.create(
+                    product=product,
+                    user=request.user,
+                    receptor=receptor,
+                    quantity=quantity_int,
+                    motivo=motivo
+                )
+                registrar_salidas({product.pk: quantity_int}, salida.created_at)
+            else:
+                salida = None
+
+        if salida is None:
+            messages.error(
+                request,
+                f'Stock insuficiente. Stock actual: {product.stock_actual} {product.unit}'
+            )
+            return render(request, 'salidas/registrar.html', {
+                'product_code': product_code,
+                'receptor': receptor,
+                'quantity': quantity,
+                'motivo': motivo,
+                'product': product,
+            })
 
         stock_msg = ''
         if product.stock_actual <= product.min_stock:
@@ -98,38 +125,52 @@ def salida_registrar(request):
     })
 
 
-@login_required
-def salida_historial(request):
-    salidas = Salida.objects.select_related('product', 'user').order_by('-created_at')
+def filtrar_salidas(salidas, parametros):
+    """Aplica los filtros del historial de salidas; retorna el queryset y los filtros usados"""
+    filtros = {
+        clave: parametros.get(clave, '')
+        for clave in ('fecha_desde', 'fecha_hasta', 'producto', 'receptor')
+    }
 
-    fecha_desde = request.GET.get('fecha_desde', '')
-    fecha_hasta = request.GET.get('fecha_hasta', '')
-    producto = request.GET.get('producto', '')
-    receptor = request.GET.get('receptor', '')
-
-    if fecha_desde:
-        salidas = salidas.filter(created_at__date__gte=fecha_desde)
+    if filtros['fecha_desde']:
+        salidas = salidas.filter(created_at__date__gte=filtros['fecha_desde'])
 
-    if fecha_hasta:
-        salidas = salidas.filter(created_at__date__lte=fecha_hasta)
+    if filtros['fecha_hasta']:
+        salidas = salidas.filter(created_at__date__lte=filtros['fecha_hasta'])
 
-    if producto:
+    if filtros['producto']:
         salidas = salidas.filter(
-            Q(product__code__icontains=producto) |
-            Q(product__name__icontains=producto)
+            Q(product__code__icontains=filtros['producto']) |
+            Q(product__name__icontains=filtros['producto'])
         )
 
-    if receptor:
-        salidas = salidas.filter(receptor__icontains=receptor)
-
-    return render(request, 'salidas/historial.html', {
-        'salidas': salidas,
-        'filtros': {
-            'fecha_desde': fecha_desde,
-            'fecha_hasta': fecha_hasta,
-            'producto': producto,
-            'receptor': receptor,
-        }
+    if filtros['receptor']:
+        salidas = salidas.filter(receptor__icontains=filtros['receptor'])
+
+    return salidas, filtros
+
+
+TABLA_SALIDAS = Tabla(
+    Salida.objects.select_related('product', 'user'),
+    columnas={
+        'id': 'id',
+        'fecha': 'created_at',
+        'cantidad': 'quantity',
+        'receptor': 'receptor',
+    },
+    orden='-fecha',
+    filtrar=filtrar_salidas,
+)
+
+
+@login_required
+@lectura_replica
+def salida_historial(request):
+    tabla = TABLA_SALIDAS.pagina(request)
+
+    return render_tabla(request, 'salidas/historial.html', 'salidas/historial_tabla.html', {
+        'tabla': tabla,
+        'filtros': tabla['filtros'],
     })
 
 
@@ -143,28 +184,19 @@ def salida_detalle(request, pk):
 
 
 @login_required
+@lectura_replica
 def exportar_reporte_salidas(request):
     """Exportar reporte de salidas a Excel"""
-    # Obtener filtros
-    fecha_desde = request.GET.get('fecha_desde', '')
-    fecha_hasta = request.GET.get('fecha_hasta', '')
-    producto = request.GET.get('producto', '')
-    receptor = request.GET.get('receptor', '')
-
-    # Aplicar filtros
-    salidas = Salida.objects.select_related('product', 'user').order_by('-created_at')
-
-    if fecha_desde:
-        salidas = salidas.filter(created_at__date__gte=fecha_desde)
-    if fecha_hasta:
-        salidas = salidas.filter(created_at__date__lte=fecha_hasta)
-    if producto:
-        salidas = salidas.filter(
-            Q(product__code__icontains=producto) |
-            Q(product__name__icontains=producto)
-        )
-    if receptor:
-        salidas = salidas.filter(receptor__icontains=receptor)
+    inicio = time.perf_counter()
+    # Aplicar los mismos filtros del historial
+    salidas, filtros = filtrar_salidas(
+        Salida.objects.select_related('product', 'user').order_by('-created_at'),
+        request.GET
+    )
+    fecha_desde = filtros['fecha_desde']
+    fecha_hasta = filtros['fecha_hasta']
+    producto = filtros['producto']
+    receptor = filtros['receptor']
 
     # Crear workbook
     wb = Workbook()
@@ -236,6 +268,7 @@ def exportar_reporte_salidas(request):
         ws.cell(row=row_num, column=7, value=salida.user.get_full_name() or salida.user.username).border = border
         ws.cell(row=row_num, column=8, value=salida.motivo).border = border
         row_num += 1
+    filas = row_num - header_row - 1
 
     # Ajustar anchos de columna
     ws.column_dimensions['A'].width = 18
@@ -255,4 +288,5 @@ def exportar_reporte_salidas(request):
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
     wb.save(response)
+    metricas.registrar_exportacion('salidas', filas, time.perf_counter() - inicio)
     return response
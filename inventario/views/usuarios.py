@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Q
 from functools import wraps
 
 from ..models import User
+from ..tablas import Tabla, render_tabla
 
 
 def admin_required(view_func):
@@ -18,11 +20,46 @@ def admin_required(view_func):
     return wrapper
 
 
+def filtrar_usuarios(usuarios, parametros):
+    """Aplica los filtros del listado de usuarios; retorna el queryset y los filtros usados"""
+    filtros = {clave: parametros.get(clave, '') for clave in ('q', 'role', 'status')}
+
+    if filtros['q']:
+        usuarios = usuarios.filter(
+            Q(username__icontains=filtros['q']) |
+            Q(first_name__icontains=filtros['q']) |
+            Q(last_name__icontains=filtros['q']) |
+            Q(email__icontains=filtros['q'])
+        )
+
+    if filtros['role']:
+        usuarios = usuarios.filter(role=filtros['role'])
+
+    if filtros['status']:
+        usuarios = usuarios.filter(status=filtros['status'])
+
+    return usuarios, filtros
+
+
+TABLA_USUARIOS = Tabla(
+    User.objects.all(),
+    columnas={
+        'id': 'id',
+        'usuario': 'username',
+        'rol': 'role',
+        'estado': 'status',
+    },
+    orden='usuario',
+    filtrar=filtrar_usuarios,
+)
+
+
 @login_required
 @admin_required
 def usuario_list(request):
-    usuarios = User.objects.all().order_by('username')
-    return render(request, 'usuarios/list.html', {'usuarios': usuarios})
+    return render_tabla(request, 'usuarios/list.html', 'usuarios/tabla.html', {
+        'tabla': TABLA_USUARIOS.pagina(request),
+    })
 
 
 @login_required